@@ -0,0 +1,162 @@
+"""
+Local synthetic website for benchmarking the crawler offline.
+
+Serves `pages` deterministic HTML pages under /tech/support/research/ that
+look like the BU research support site: a header, nav menu, footer and
+scripts around a few paragraphs of content, and `links` internal links per
+page (plus a few external and fragment links the crawler must ignore).
+Every response can be delayed to mimic network latency.
+
+Responses carry an ETag and Last-Modified header and honor conditional
+requests with 304 Not Modified. Bumping `version` changes the content of
+every tenth page, to simulate a site update between two crawls.
+
+    python fixture_site.py --port 8765 --pages 2000 --latency 0.05
+
+then crawl http://127.0.0.1:8765/tech/support/research/.
+"""
+
+import argparse
+import hashlib
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = "/tech/support/research/"
+
+WORDS = (
+    "cluster node job queue module storage scratch project allocation gpu cpu "
+    "batch interactive ondemand software license python conda container "
+    "singularity mpi openmp memory quota backup transfer globus account "
+    "training workshop consulting research computing services"
+).split()
+
+
+def page_path(i: int) -> str:
+    return ROOT if i == 0 else f"{ROOT}topic-{i // 100}/page-{i}/"
+
+
+def render_page(i: int, pages: int, links: int, version: int = 0) -> str:
+    rng = random.Random(i)
+    targets = {rng.randrange(pages) for _ in range(links)}
+    if i + 1 < pages:
+        targets.add(i + 1)  # a chain guarantees every page is reachable
+    anchors = "\n".join(
+        f'<li><a href="{page_path(t)}{"#top" if t % 7 == 0 else ""}">Page {t}</a></li>'
+        for t in sorted(targets)
+    )
+    paragraphs = "\n".join(
+        "<p>" + " ".join(rng.choice(WORDS) for _ in range(60)) + "</p>"
+        for _ in range(4)
+    )
+    return f"""<!DOCTYPE html>
+<html><head><title>Research Support {i}</title>
+<style>body {{ font-family: sans-serif; }}</style>
+<script>var page = {i};</script></head>
+<body>
+<header><h1>Research Computing Services</h1></header>
+<nav><ul><li><a href="{ROOT}">Home</a></li><li><a href="https://www.example.org/">External</a></li></ul></nav>
+<main>
+<h2>Topic {i}</h2>
+{paragraphs}
+{f"<p>Updated in revision {version}.</p>" if version and i % 10 == 0 else ""}
+<ul>
+{anchors}
+</ul>
+</main>
+<aside>Related: <a href="{page_path((i + 3) % pages)}">see also</a></aside>
+<footer>Boston University Information Services &amp; Technology</footer>
+<noscript>Enable JavaScript</noscript>
+</body></html>
+"""
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    pages = 1000
+    links = 8
+    latency = 0.0
+    version = 0
+    last_modified = "Mon, 06 Jan 2025 12:00:00 GMT"
+    counter = 0
+    not_modified = 0
+    bytes_sent = 0
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        with self.lock:
+            FixtureHandler.counter += 1
+        if self.latency:
+            time.sleep(self.latency)
+        path = self.path.split("?")[0]
+        index = None
+        if path == ROOT:
+            index = 0
+        elif path.startswith(ROOT) and "/page-" in path:
+            try:
+                index = int(path.rstrip("/").rsplit("page-", 1)[1])
+            except ValueError:
+                index = None
+        if index is None or not 0 <= index < self.pages:
+            self.send_error(404)
+            return
+        body = render_page(index, self.pages, self.links, self.version).encode("utf-8")
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            with self.lock:
+                FixtureHandler.not_modified += 1
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", self.last_modified)
+        self.end_headers()
+        self.wfile.write(body)
+        with self.lock:
+            FixtureHandler.bytes_sent += len(body)
+
+
+def serve(host="127.0.0.1", port=8765, pages=1000, links=8, latency=0.0):
+    FixtureHandler.pages = pages
+    FixtureHandler.links = links
+    FixtureHandler.latency = latency
+    FixtureHandler.version = 0
+    FixtureHandler.counter = 0
+    FixtureHandler.not_modified = 0
+    FixtureHandler.bytes_sent = 0
+    server = ThreadingHTTPServer((host, port), FixtureHandler)
+    server.daemon_threads = True
+    server.request_queue_size = 128
+    return server
+
+
+def start_in_thread(**kwargs):
+    """Start the fixture site on a background thread; returns (server, base_url)."""
+    server = serve(**kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}{ROOT}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--links", type=int, default=8, help="internal links per page")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per response")
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port, args.pages, args.links, args.latency)
+    print(f"Fixture site on http://{args.host}:{args.port}{ROOT}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\nServed {FixtureHandler.counter} requests")
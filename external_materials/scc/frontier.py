@@ -0,0 +1,174 @@
+"""
+Crawl frontier with URL normalization and O(1) deduplication.
+
+The original crawler kept its queue in a list (`pop(0)` is O(n)) and
+checked `link not in visited and link not in to_visit` (two O(n) scans per
+link), so crawl time grew quadratically with the size of the site.
+`Frontier` keeps a FIFO deque of URLs to visit plus one set of every URL
+ever queued, so adding and popping are O(1).
+
+URLs are normalized before the duplicate check, so trivially different
+spellings of one page are fetched once:
+
+- scheme and host lowercased, default ports (:80, :443) dropped
+- fragments dropped, query parameters sorted, empty queries removed
+- directory-like paths (no file extension) get a trailing slash
+- percent-escapes uppercased
+
+Path case is left alone: servers treat /Research/ and /research/ as
+different resources.
+
+    python frontier.py --bench     # scaling on a synthetic 100k-link graph
+"""
+
+import argparse
+import random
+import re
+import time
+from collections import deque
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+DEFAULT_PORTS = {"http": "80", "https": "443"}
+_ESCAPE = re.compile(r"%[0-9a-fA-F]{2}")
+
+
+def normalize_url(url):
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and str(parts.port) != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    path = _ESCAPE.sub(lambda m: m.group().upper(), parts.path or "/")
+    last = path.rsplit("/", 1)[-1]
+    if last and "." not in last:
+        path += "/"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, path, query, ""))
+
+
+class Frontier:
+    """FIFO queue of URLs to visit that never hands out the same URL twice."""
+
+    def __init__(self, urls=(), normalize=normalize_url):
+        self.normalize = normalize
+        self._queue = deque()
+        self._seen = set()
+        for url in urls:
+            self.add(url)
+
+    def add(self, url):
+        """Queue `url` unless it was queued before; returns True if it is new."""
+        url = self.normalize(url)
+        if url in self._seen:
+            return False
+        self._seen.add(url)
+        self._queue.append(url)
+        return True
+
+    def extend(self, urls):
+        """Queue several URLs; returns how many were new."""
+        return sum(self.add(url) for url in urls)
+
+    def pop(self):
+        return self._queue.popleft()
+
+    def __len__(self):
+        return len(self._queue)
+
+    def __contains__(self, url):
+        return self.normalize(url) in self._seen
+
+    @property
+    def seen(self):
+        return len(self._seen)
+
+
+class ListFrontier:
+    """The original list-based queue, kept for the benchmark."""
+
+    def __init__(self, urls=()):
+        self.visited = set()
+        self.to_visit = list(urls)
+
+    def extend(self, urls):
+        new_links = 0
+        for link in urls:
+            if link not in self.visited and link not in self.to_visit:
+                self.to_visit.append(link)
+                new_links += 1
+        return new_links
+
+    def pop(self):
+        url = self.to_visit.pop(0)
+        self.visited.add(url)
+        return url
+
+    def __len__(self):
+        return len(self.to_visit)
+
+
+def synthetic_graph(pages, links_per_page, seed=0):
+    """Page URL -> outgoing links, with spelling variants of the same pages."""
+    rng = random.Random(seed)
+    base = "https://www.bu.edu/tech/support/research/"
+    urls = [f"{base}topic-{i // 100}/page-{i}/" for i in range(pages)]
+    graph = {}
+    for i, url in enumerate(urls):
+        links = [urls[(i + 1) % pages]]
+        for _ in range(links_per_page - 1):
+            target = urls[rng.randrange(pages)]
+            variant = rng.random()
+            if variant < 0.1:
+                target = target.rstrip("/")
+            elif variant < 0.2:
+                target += "#section"
+            elif variant < 0.25:
+                target = target.replace("www.bu.edu", "WWW.BU.EDU")
+            links.append(target)
+        graph[url] = links
+    return graph
+
+
+def simulate(frontier, graph):
+    """BFS over `graph` using `frontier`; returns (pages visited, seconds)."""
+    start = time.perf_counter()
+    visited = 0
+    while len(frontier):
+        url = frontier.pop()
+        visited += 1
+        frontier.extend(graph.get(url, ()))
+    return visited, time.perf_counter() - start
+
+
+def benchmark(total_links=100_000, links_per_page=10, max_list_links=50_000):
+    print(f"Synthetic link graphs, {links_per_page} links/page")
+    print(f"{'links':>8} {'pages':>7} {'frontier s':>11} {'us/link':>8} {'list s':>9} {'us/link':>8}")
+    links = total_links // 8
+    while links <= total_links:
+        pages = links // links_per_page
+        graph = synthetic_graph(pages, links_per_page)
+        start_url = next(iter(graph))
+        visited, fast = simulate(Frontier([start_url]), graph)
+        row = f"{links:8d} {visited:7d} {fast:11.3f} {fast / links * 1e6:8.2f}"
+        if links <= max_list_links:
+            # The list version has no normalization, so feed it normalized links
+            clean = {u: [normalize_url(v) for v in vs] for u, vs in graph.items()}
+            _, slow = simulate(ListFrontier([start_url]), clean)
+            row += f" {slow:9.3f} {slow / links * 1e6:8.2f}"
+        else:
+            row += f" {'(skipped)':>9}"
+        print(row)
+        links *= 2
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Crawl frontier benchmark")
+    parser.add_argument("--bench", action="store_true")
+    parser.add_argument("--links", type=int, default=100_000, help="largest graph size")
+    parser.add_argument("--max-list-links", type=int, default=50_000,
+                        help="largest graph to run the quadratic list frontier on")
+    args = parser.parse_args()
+    if args.bench:
+        benchmark(args.links, max_list_links=args.max_list_links)
+    else:
+        parser.print_help()
@@ -1,38 +1,91 @@
 import os
 import glob
 import json
-from llama_index import VectorStoreIndex, Document
-from llama_index.core import StorageContext
-from llama_index.storage.docstore.dynamodb import DynamoDBDocumentStore
-from llama_index.storage.index_store.dynamodb import DynamoDBIndexStore
-from llama_index.vector_stores.dynamodb import DynamoDBVectorStore
+import argparse
+import itertools
+from llama_index.core import VectorStoreIndex, load_index_from_storage
 
-# Ensure AWS credentials are set in your environment or ~/.aws/credentials
-TABLE_NAME = "llamaindex_scc"
+from index_storage import BACKENDS, DEFAULT_BACKEND, INDEX_DIR, TABLE_NAME, storage_context
+from page_chunks import DEFAULT_MAX_TOKENS, DEFAULT_OVERLAP, PageChunker, iter_store_documents, page_document
+from page_store import DEFAULT_PATH
 
 DATA_DIR = "/home/labadorf/computational_workshop_generator/external_materials/scc"
-INDEX_DIR = "/home/labadorf/computational_workshop_generator/external_materials/scc_index"
+PAGE_STORE = os.path.join(DATA_DIR, DEFAULT_PATH)
 
-def load_json_documents(data_dir):
-    docs = []
-    for filepath in glob.glob(os.path.join(data_dir, "*.json")):
+def iter_json_documents(data_dir):
+    # Old one-JSON-file-per-page layout, read one file at a time
+    for filepath in glob.iglob(os.path.join(data_dir, "*.json")):
         with open(filepath, "r") as f:
             data = json.load(f)
-            # If each file contains a list of records
-            if isinstance(data, list):
-                for record in data:
-                    docs.append(Document(text=json.dumps(record), metadata={"source": filepath}))
-            else:  # Single record per file
-                docs.append(Document(text=json.dumps(data), metadata={"source": filepath}))
-    return docs
+        # If each file contains a list of records
+        for record in data if isinstance(data, list) else [data]:
+            yield page_document(record, filepath)
+
+def build_index(index, documents, chunker, batch_size=64, refresh=False):
+    """
+    Feed `documents` (any iterable, consumed lazily) into `index` in batches.
+    With `refresh`, pages no longer in `documents` (removed by the crawler's
+    --refresh) have their chunks deleted from the index afterwards.
+    Returns (pages, pages re-indexed, chunks inserted, pages removed).
+    """
+    pages = changed = chunks = 0
+    seen = set()
+    for batch in itertools.batched(documents, batch_size):
+        pages += len(batch)
+        seen.update(doc.id_ for doc in batch)
+        if refresh:
+            # Pages whose id and text hash match the stored ones are skipped;
+            # changed pages have their old chunks deleted first
+            stale = [(doc, index.docstore.get_document_hash(doc.id_)) for doc in batch]
+            batch = [doc for doc, old in stale if old != doc.hash]
+            for doc, old in stale:
+                if old is not None and old != doc.hash:
+                    index.delete_ref_doc(doc.id_, delete_from_docstore=True)
+        nodes = chunker.get_nodes_from_documents(batch)
+        index.insert_nodes(nodes)
+        for doc in batch:
+            index.docstore.set_document_hash(doc.id_, doc.hash)
+        changed += len(batch)
+        chunks += len(nodes)
+        print(f"  {pages} pages read, {changed} indexed as {chunks} chunks")
+    removed = 0
+    if refresh:
+        indexed = index.docstore.get_all_ref_doc_info() or {}
+        for url in [ref for ref in indexed if ref not in seen]:
+            index.delete_ref_doc(url, delete_from_docstore=True)
+            removed += 1
+    return pages, changed, chunks, removed
 
 if __name__ == "__main__":
-    documents = load_json_documents(DATA_DIR)
-    # Set up DynamoDB storage context
-    storage_context = StorageContext.from_defaults(
-        docstore=DynamoDBDocumentStore.from_table_name(table_name=TABLE_NAME),
-        index_store=DynamoDBIndexStore.from_table_name(table_name=TABLE_NAME),
-        vector_store=DynamoDBVectorStore.from_table_name(table_name=TABLE_NAME)
-    )
-    index = VectorStoreIndex.from_documents(documents, storage_context=storage_context)
-    print(f"Index created and saved to DynamoDB table '{TABLE_NAME}'")
+    parser = argparse.ArgumentParser(description="Index scraped pages")
+    parser.add_argument("--refresh", action="store_true",
+                        help="update the existing index, re-embedding only changed pages")
+    parser.add_argument("--store", default=PAGE_STORE, help="crawler page store")
+    parser.add_argument("--json-dir", default=None,
+                        help="read the old one-JSON-file-per-page layout instead of the store")
+    parser.add_argument("--max-tokens", type=int, default=DEFAULT_MAX_TOKENS, help="tokens per chunk")
+    parser.add_argument("--overlap", type=int, default=DEFAULT_OVERLAP,
+                        help="tokens shared by consecutive chunks")
+    parser.add_argument("--batch-size", type=int, default=64, help="pages per insert batch")
+    parser.add_argument("--backend", choices=BACKENDS, default=DEFAULT_BACKEND,
+                        help="index storage (default from SCC_INDEX_BACKEND)")
+    parser.add_argument("--index-dir", default=INDEX_DIR, help="local backend directory")
+    args = parser.parse_args()
+
+    if args.json_dir:
+        documents = iter_json_documents(args.json_dir)
+    else:
+        documents = iter_store_documents(args.store)
+    chunker = PageChunker(max_tokens=args.max_tokens, overlap=args.overlap)
+    context = storage_context(args.backend, index_dir=args.index_dir)
+    if args.refresh:
+        index = load_index_from_storage(context)
+    else:
+        index = VectorStoreIndex(nodes=[], storage_context=context)
+    where = f"'{TABLE_NAME}'" if args.backend == "dynamodb" else args.index_dir
+    pages, changed, chunks, removed = build_index(index, documents, chunker, args.batch_size, args.refresh)
+    if args.refresh:
+        print(f"Re-indexed {changed} of {pages} pages ({chunks} chunks), "
+              f"removed {removed} deleted pages in {where}")
+    else:
+        print(f"Indexed {pages} pages as {chunks} chunks in {args.backend} index {where}")
@@ -0,0 +1,228 @@
+"""
+Visible-text and link extraction for crawled pages, with pluggable parsers.
+
+`extract_page(html, page_url, root)` returns `(text, links)`:
+
+- text: every text node outside script/style/nav/footer/header/aside/
+  noscript, one stripped line per line of text, blank lines removed
+- links: absolute, normalized URLs under `root` from every <a href>
+  (including the navigation menus that are dropped from the text)
+
+Backends:
+
+- "bs4": BeautifulSoup with the pure-Python html.parser; the reference
+  implementation the crawler always used
+- "lxml": libxml2 tree walked once, collecting links and text together
+- "selectolax": the Lexbor HTML5 parser
+
+"auto" picks the fastest installed one (selectolax, then lxml, then bs4).
+The C parsers can disagree with html.parser on malformed markup (e.g.
+stray text after </html>), but give the same output on well-formed pages:
+
+    python html_extract.py --parity    # compare every backend with bs4
+    python html_extract.py --bench     # ms per page for each backend
+"""
+
+import argparse
+import time
+from urllib.parse import urljoin, urlparse
+
+from bs4 import BeautifulSoup
+
+from frontier import normalize_url
+
+try:
+    import lxml.etree
+    import lxml.html
+except ImportError:
+    lxml = None
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+HIDDEN_TAGS = ["script", "style", "nav", "footer", "header", "aside", "noscript"]
+
+
+def is_valid(url, root):
+    parsed = urlparse(url)
+    return parsed.scheme in ("http", "https") and url.startswith(root)
+
+
+def clean_lines(texts):
+    """Split text nodes into stripped, non-empty lines."""
+    return "\n".join(
+        line for text in texts for line in (part.strip() for part in text.split("\n")) if line
+    )
+
+
+def resolve_links(hrefs, page_url, root):
+    links = set()
+    for href in hrefs:
+        try:
+            href = normalize_url(urljoin(page_url, href))  # also drops the fragment
+        except ValueError:  # malformed port or IPv6 host: skip just this link
+            continue
+        if is_valid(href, root):
+            links.add(href)
+    return links
+
+
+# --- bs4 (reference) ----------------------------------------------------------
+
+def extract_links(soup, base_url, root):
+    return resolve_links((a["href"] for a in soup.find_all("a", href=True)), base_url, root)
+
+
+def extract_visible_text(soup):
+    # Remove script, style, nav, footer, header, aside, and noscript
+    for tag in soup(HIDDEN_TAGS):
+        tag.decompose()
+    # Get visible text
+    text = soup.get_text(separator="\n", strip=True)
+    # Remove excessive blank lines
+    lines = [line.strip() for line in text.split("\n") if line.strip()]
+    return "\n".join(lines)
+
+
+def extract_bs4(html, page_url, root):
+    soup = BeautifulSoup(html, "html.parser")
+    links = extract_links(soup, page_url, root)
+    return extract_visible_text(soup), links
+
+
+# --- lxml ---------------------------------------------------------------------
+
+def extract_lxml(html, page_url, root):
+    tree = lxml.html.document_fromstring(html)
+    hidden = set(HIDDEN_TAGS)
+    texts, hrefs = [], []
+    hidden_depth = 0
+    # One walk: `start` sees an element's own text, `end` its tail, which
+    # belongs to the parent and is visible again once we leave a hidden tag
+    for event, el in lxml.etree.iterwalk(tree, events=("start", "end")):
+        tag = el.tag if isinstance(el.tag, str) else None  # comments, PIs
+        if event == "start":
+            if tag == "a" and el.get("href") is not None:
+                hrefs.append(el.get("href"))
+            if tag in hidden:
+                hidden_depth += 1
+            elif tag and not hidden_depth and el.text:
+                texts.append(el.text)
+        else:
+            if tag in hidden:
+                hidden_depth -= 1
+            if not hidden_depth and el.tail and el is not tree:
+                texts.append(el.tail)
+    return clean_lines(texts), resolve_links(hrefs, page_url, root)
+
+
+# --- selectolax -----------------------------------------------------------------
+
+def extract_selectolax(html, page_url, root):
+    tree = LexborHTMLParser(html)
+    hrefs = [a.attributes.get("href") for a in tree.css("a[href]")]
+    tree.strip_tags(HIDDEN_TAGS)
+    text = tree.root.text(separator="\n", strip=True) if tree.root else ""
+    return clean_lines([text]), resolve_links((h for h in hrefs if h is not None), page_url, root)
+
+
+BACKENDS = {"bs4": extract_bs4}
+if lxml is not None:
+    BACKENDS["lxml"] = extract_lxml
+if LexborHTMLParser is not None:
+    BACKENDS["selectolax"] = extract_selectolax
+
+
+def get_extractor(backend="auto"):
+    if backend == "auto":
+        for name in ("selectolax", "lxml", "bs4"):
+            if name in BACKENDS:
+                return BACKENDS[name]
+    if backend not in BACKENDS:
+        raise ValueError(f"HTML backend {backend!r} is not installed "
+                         f"(available: {', '.join(BACKENDS)})")
+    return BACKENDS[backend]
+
+
+def extract_page(html, page_url, root, backend="auto"):
+    return get_extractor(backend)(html, page_url, root)
+
+
+SAMPLE_PAGES = [
+    """<html><head><title>Entities &amp; spaces</title></head><body>
+    <p>Caf&eacute;&nbsp;hours:   9&ndash;5</p><!-- hidden comment -->
+    <div>line one<br>line two<br/>  <b>bold</b> tail text</div>
+    <nav><a href="/tech/support/research/a/">A</a> menu</nav>
+    <pre>  indented
+       code block  </pre>
+    <footer>footer <a href="b/#frag">B</a></footer> after footer
+    </body></html>""",
+    """<html><body><header><h1>Title</h1><script>var x = "<p>not text</p>";</script></header>
+    <main><table><tr><td>cell 1</td><td>cell 2</td></tr></table>
+    <ul><li><a href="https://www.bu.edu/tech/support/research/x?b=2&a=1">x</a></li>
+    <li><a href="https://example.org/">external</a></li></ul>
+    <aside><p>aside <noscript>nested</noscript></p></aside><p>end</p></main></body></html>""",
+]
+
+
+def parity_pages(n=50):
+    from fixture_site import render_page
+
+    pages = [("sample", html) for html in SAMPLE_PAGES]
+    pages += [("fixture", render_page(i, 1000, 8, version=1)) for i in range(n)]
+    return pages
+
+
+def check_parity(n=50):
+    root = "https://www.bu.edu/tech/support/research/"
+    page_url = root + "topic/page/"
+    pages = parity_pages(n)
+    ok = True
+    for name, fn in BACKENDS.items():
+        if name == "bs4":
+            continue
+        mismatches = 0
+        for kind, html in pages:
+            expected = extract_bs4(html, page_url, root)
+            got = fn(html, page_url, root)
+            if got != expected:
+                mismatches += 1
+                if mismatches == 1:
+                    print(f"  {name}: first mismatch on a {kind} page")
+                    print(f"    text equal: {got[0] == expected[0]}, links equal: {got[1] == expected[1]}")
+        ok &= mismatches == 0
+        print(f"{name:10s} {len(pages) - mismatches}/{len(pages)} pages identical to bs4")
+    return ok
+
+
+def benchmark(n=200, repeat=3):
+    root = "https://www.bu.edu/tech/support/research/"
+    pages = [html for _, html in parity_pages(n)]
+    size = sum(len(html) for html in pages) / len(pages)
+    print(f"{len(pages)} pages, {size / 1024:.1f} KB average")
+    base = None
+    for name, fn in BACKENDS.items():
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for html in pages:
+                fn(html, root, root)
+            best = min(best, time.perf_counter() - start)
+        per_page = best / len(pages) * 1000
+        base = base or per_page
+        print(f"  {name:10s} {per_page:6.3f} ms/page  ({base / per_page:4.1f}x vs bs4)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HTML extraction backends")
+    parser.add_argument("--parity", action="store_true", help="compare backends with bs4")
+    parser.add_argument("--bench", action="store_true", help="time each backend per page")
+    args = parser.parse_args()
+    if args.parity:
+        raise SystemExit(0 if check_parity() else 1)
+    if args.bench:
+        benchmark()
+    if not (args.parity or args.bench):
+        parser.print_help()
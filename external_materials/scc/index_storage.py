@@ -0,0 +1,538 @@
+"""
+Storage backends for the SCC index: DynamoDB or a local directory.
+
+The DynamoDB backend keeps documents, the index structure and every vector
+in one DynamoDB table, so building the index is a network round trip per
+node and each query fetches all vectors before ranking them in Python.
+The local backend keeps the same three stores in INDEX_DIR:
+
+- index.sqlite: docstore and index store as SQLite key/value tables (WAL)
+- vectors.f32: normalized float32 embeddings, appended row by row and
+  memory-mapped for queries (one matrix-vector product per query); the
+  row -> node id map and deletions live in index.sqlite
+- vectors.hnsw: with `ann="hnsw"` (or SCC_INDEX_ANN=hnsw), an hnswlib
+  graph over the same rows for approximate search. It is built on the
+  first query and afterwards only extended with rows added since, so an
+  index refresh does not rebuild it; `compact` drops it for a rebuild.
+
+Pick the backend with `--backend` or the SCC_INDEX_BACKEND environment
+variable ("dynamodb" by default). The DynamoDB integrations are only
+imported when that backend is used, so the local one works offline.
+
+    python index_storage.py migrate --from dynamodb --to local
+    python index_storage.py stats --backend local
+    python index_storage.py compact               # drop deleted vectors
+    python index_storage.py ann                   # build/update the HNSW graph
+    python index_storage.py --bench 50000         # query latency and HNSW recall
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, List
+
+import numpy as np
+
+try:
+    import hnswlib
+except ImportError:  # only needed for ann="hnsw"
+    hnswlib = None
+from llama_index.core import StorageContext, load_index_from_storage
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.schema import BaseNode
+from llama_index.core.storage.docstore.keyval_docstore import KVDocumentStore
+from llama_index.core.storage.index_store.keyval_index_store import KVIndexStore
+from llama_index.core.storage.kvstore.types import DEFAULT_COLLECTION, BaseKVStore
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    VectorStoreQuery,
+    VectorStoreQueryResult,
+)
+
+# Ensure AWS credentials are set in your environment or ~/.aws/credentials
+TABLE_NAME = "llamaindex_scc"
+INDEX_DIR = "/home/labadorf/computational_workshop_generator/external_materials/scc_index"
+
+BACKENDS = ("dynamodb", "local")
+DEFAULT_BACKEND = os.environ.get("SCC_INDEX_BACKEND", "dynamodb")
+ANN_MODES = ("exact", "hnsw")
+DEFAULT_ANN = os.environ.get("SCC_INDEX_ANN", "exact")
+HNSW_DEFAULTS = {"M": 16, "ef_construction": 200, "ef_search": 64}
+
+SQLITE_NAME = "index.sqlite"
+VECTORS_NAME = "vectors.f32"
+HNSW_NAME = "vectors.hnsw"
+
+
+def _connect(path):
+    db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    return db
+
+
+class SQLiteKVStore(BaseKVStore):
+    """llama_index key/value store over one SQLite table, for the docstore and index store."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.db = _connect(path)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS kv (collection TEXT, key TEXT, value TEXT, "
+            "PRIMARY KEY (collection, key))"
+        )
+
+    def put(self, key, val, collection=DEFAULT_COLLECTION):
+        self.put_all([(key, val)], collection=collection)
+
+    def put_all(self, kv_pairs, collection=DEFAULT_COLLECTION, batch_size=1):
+        with self._lock:
+            self.db.execute("BEGIN")
+            self.db.executemany(
+                "INSERT OR REPLACE INTO kv VALUES (?, ?, ?)",
+                [(collection, key, json.dumps(val)) for key, val in kv_pairs],
+            )
+            self.db.execute("COMMIT")
+
+    def get(self, key, collection=DEFAULT_COLLECTION):
+        row = self.db.execute(
+            "SELECT value FROM kv WHERE collection = ? AND key = ?", (collection, key)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_all(self, collection=DEFAULT_COLLECTION):
+        return {
+            key: json.loads(value)
+            for key, value in self.db.execute(
+                "SELECT key, value FROM kv WHERE collection = ?", (collection,)
+            )
+        }
+
+    def delete(self, key, collection=DEFAULT_COLLECTION):
+        with self._lock:
+            cursor = self.db.execute(
+                "DELETE FROM kv WHERE collection = ? AND key = ?", (collection, key)
+            )
+        return cursor.rowcount > 0
+
+    async def aput(self, key, val, collection=DEFAULT_COLLECTION):
+        self.put(key, val, collection)
+
+    async def aput_all(self, kv_pairs, collection=DEFAULT_COLLECTION, batch_size=1):
+        self.put_all(kv_pairs, collection, batch_size)
+
+    async def aget(self, key, collection=DEFAULT_COLLECTION):
+        return self.get(key, collection)
+
+    async def aget_all(self, collection=DEFAULT_COLLECTION):
+        return self.get_all(collection)
+
+    async def adelete(self, key, collection=DEFAULT_COLLECTION):
+        return self.delete(key, collection)
+
+
+class MmapVectorStore(BasePydanticVectorStore):
+    """
+    Embeddings in an append-only float32 file, memory-mapped for search.
+
+    Vectors are L2-normalized on insert, so a query is one matrix-vector
+    product over the mapped rows (cosine similarity) and an argpartition.
+    Deleting a document only marks its rows; `compact()` rewrites the file.
+
+    With `ann="hnsw"` queries go through an HNSW graph instead (M,
+    ef_construction and ef_search from `hnsw`, default HNSW_DEFAULTS),
+    except those restricted to given node ids, which stay exact.
+    """
+
+    stores_text: bool = False
+
+    _dir: str = PrivateAttr()
+    _db: Any = PrivateAttr()
+    _lock: Any = PrivateAttr()
+    _matrix: Any = PrivateAttr(default=None)
+    _live: Any = PrivateAttr(default=None)
+    _ids: Any = PrivateAttr(default=None)
+    _ann: Any = PrivateAttr(default=None)
+    _graph: Any = PrivateAttr(default=None)
+    _hnsw: Any = PrivateAttr(default=None)
+
+    def __init__(self, index_dir=INDEX_DIR, ann="exact", hnsw=None):
+        super().__init__()
+        if ann not in ANN_MODES:
+            raise ValueError(f"Unknown ann mode {ann!r} (choose from {', '.join(ANN_MODES)})")
+        if ann == "hnsw" and hnswlib is None:
+            raise ImportError("ann='hnsw' needs hnswlib (pip install hnswlib)")
+        os.makedirs(index_dir, exist_ok=True)
+        self._dir = index_dir
+        self._ann = ann
+        self._hnsw = {**HNSW_DEFAULTS, **(hnsw or {})}
+        self._lock = threading.Lock()
+        self._db = _connect(os.path.join(index_dir, SQLITE_NAME))
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS vectors (row INTEGER PRIMARY KEY, node_id TEXT NOT NULL, "
+            "ref_doc_id TEXT, deleted INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS vectors_node ON vectors (node_id)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS vectors_ref_doc ON vectors (ref_doc_id)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS vector_meta (key TEXT PRIMARY KEY, value)")
+
+    @classmethod
+    def class_name(cls):
+        return "MmapVectorStore"
+
+    @property
+    def client(self):
+        return None
+
+    @property
+    def vectors_path(self):
+        return os.path.join(self._dir, VECTORS_NAME)
+
+    @property
+    def hnsw_path(self):
+        return os.path.join(self._dir, HNSW_NAME)
+
+    def _meta(self, key):
+        row = self._db.execute("SELECT value FROM vector_meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    @property
+    def dim(self):
+        row = self._db.execute("SELECT value FROM vector_meta WHERE key = 'dim'").fetchone()
+        return int(row[0]) if row else None
+
+    def _rows(self):
+        return self._db.execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+
+    def add(self, nodes: List[BaseNode], **add_kwargs: Any) -> List[str]:
+        if not nodes:
+            return []
+        matrix = np.asarray([node.get_embedding() for node in nodes], dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms == 0, 1, norms)
+        with self._lock:
+            dim = self.dim
+            if dim is None:
+                self._db.execute("INSERT INTO vector_meta VALUES ('dim', ?)", (matrix.shape[1],))
+            elif dim != matrix.shape[1]:
+                raise ValueError(f"Embedding size {matrix.shape[1]} does not match the store ({dim})")
+            start = self._rows()
+            # Rows are numbered by their position in the file, so write the
+            # vectors first: a crash leaves unreferenced bytes, not bad rows
+            with open(self.vectors_path, "r+b" if start else "wb") as f:
+                f.seek(start * matrix.shape[1] * 4)
+                f.write(matrix.tobytes())
+            self._db.execute("BEGIN")
+            self._db.executemany(
+                "UPDATE vectors SET deleted = 1 WHERE node_id = ?",
+                [(node.node_id,) for node in nodes],
+            )
+            self._db.executemany(
+                "INSERT INTO vectors (row, node_id, ref_doc_id) VALUES (?, ?, ?)",
+                [(start + i, node.node_id, node.ref_doc_id) for i, node in enumerate(nodes)],
+            )
+            self._db.execute("COMMIT")
+            self._matrix = None
+        return [node.node_id for node in nodes]
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        with self._lock:
+            self._db.execute("UPDATE vectors SET deleted = 1 WHERE ref_doc_id = ?", (ref_doc_id,))
+            self._matrix = None
+
+    def get(self, text_id):
+        """Embedding of one node (normalized), as a list."""
+        row = self._db.execute(
+            "SELECT row FROM vectors WHERE node_id = ? AND deleted = 0", (text_id,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(text_id)
+        return self._load()[0][row[0]].tolist()
+
+    def node_ids(self):
+        return [r[0] for r in self._db.execute(
+            "SELECT node_id FROM vectors WHERE deleted = 0 ORDER BY row")]
+
+    def _load(self):
+        """(memory-mapped matrix, live row mask, node id per row), cached until the next write."""
+        with self._lock:
+            if self._matrix is None:
+                rows = [(node_id, deleted) for node_id, deleted in self._db.execute(
+                    "SELECT node_id, deleted FROM vectors ORDER BY row")]
+                if rows:
+                    self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r",
+                                             shape=(len(rows), self.dim))
+                else:
+                    self._matrix = np.zeros((0, self.dim or 1), dtype=np.float32)
+                self._ids = [node_id for node_id, _ in rows]
+                self._live = np.array([not deleted for _, deleted in rows], dtype=bool)
+                if self._ann == "hnsw" and rows:
+                    self._graph = self._update_graph(self._matrix, self._live)
+            return self._matrix, self._live, self._ids
+
+    def _update_graph(self, matrix, live):
+        """Load the HNSW graph, add rows appended since it was saved, hide deleted rows."""
+        rows, dim = matrix.shape
+        graph = self._graph
+        indexed = int(self._meta("hnsw_rows") or 0)
+        if graph is not None and graph.get_current_count() == indexed <= rows:
+            graph.resize_index(max(rows, graph.get_max_elements()))
+        elif indexed and os.path.exists(self.hnsw_path) and indexed <= rows:
+            graph = hnswlib.Index(space="ip", dim=dim)  # rows are unit vectors: ip = cosine
+            graph.load_index(self.hnsw_path, max_elements=rows)
+        else:
+            graph = hnswlib.Index(space="ip", dim=dim)
+            indexed = 0
+            graph.init_index(max_elements=rows, M=self._hnsw["M"],
+                             ef_construction=self._hnsw["ef_construction"])
+        changed = indexed < rows
+        for start in range(indexed, rows, 65536):
+            end = min(start + 65536, rows)
+            graph.add_items(np.asarray(matrix[start:end]), np.arange(start, end))
+        for row in np.flatnonzero(~live):
+            try:
+                graph.mark_deleted(int(row))
+                changed = True
+            except RuntimeError:  # already marked in the saved graph
+                pass
+        if changed:
+            graph.save_index(self.hnsw_path)
+            self._db.execute("INSERT OR REPLACE INTO vector_meta VALUES ('hnsw_rows', ?)", (rows,))
+        graph.set_ef(self._hnsw["ef_search"])
+        return graph
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        if query.filters is not None:
+            raise ValueError("Metadata filters are not supported by the local vector store")
+        matrix, live, ids = self._load()
+        if query.node_ids is not None:
+            wanted = set(query.node_ids)
+            live = live & np.array([node_id in wanted for node_id in ids], dtype=bool)
+        candidates = int(live.sum())
+        k = min(query.similarity_top_k, candidates)
+        if k == 0:
+            return VectorStoreQueryResult(nodes=[], similarities=[], ids=[])
+        q = np.asarray(query.query_embedding, dtype=np.float32)
+        q /= np.linalg.norm(q) or 1
+        if self._graph is not None and query.node_ids is None:
+            try:  # hnswlib searches with max(ef_search, k) candidates
+                labels, distances = self._graph.knn_query(q, k=k)
+                return VectorStoreQueryResult(
+                    similarities=(1 - distances[0]).tolist(), ids=[ids[i] for i in labels[0]]
+                )
+            except RuntimeError:
+                pass  # fewer than k reachable live rows (many deletions): search exactly
+        scores = matrix @ q
+        scores[~live] = -np.inf
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return VectorStoreQueryResult(
+            similarities=scores[top].tolist(), ids=[ids[i] for i in top]
+        )
+
+    def compact(self):
+        """Rewrite the vector file without deleted rows; returns rows dropped."""
+        matrix, live, ids = self._load()
+        dropped = int((~live).sum())
+        if not dropped:
+            return 0
+        with self._lock:
+            kept = np.flatnonzero(live)
+            tmp = self.vectors_path + ".tmp"
+            with open(tmp, "wb") as f:
+                for start in range(0, len(kept), 65536):
+                    f.write(np.ascontiguousarray(matrix[kept[start:start + 65536]]).tobytes())
+            refs = dict(self._db.execute("SELECT node_id, ref_doc_id FROM vectors WHERE deleted = 0"))
+            self._db.execute("BEGIN")
+            self._db.execute("DELETE FROM vectors")
+            self._db.executemany(
+                "INSERT INTO vectors (row, node_id, ref_doc_id) VALUES (?, ?, ?)",
+                [(i, ids[row], refs[ids[row]]) for i, row in enumerate(kept)],
+            )
+            os.replace(tmp, self.vectors_path)
+            # Row numbers changed: the HNSW graph is rebuilt on the next query
+            self._db.execute("DELETE FROM vector_meta WHERE key = 'hnsw_rows'")
+            self._db.execute("COMMIT")
+            if os.path.exists(self.hnsw_path):
+                os.remove(self.hnsw_path)
+            self._matrix = self._graph = None
+        return dropped
+
+
+def storage_context(backend=None, table_name=TABLE_NAME, index_dir=INDEX_DIR, ann=None, hnsw=None):
+    backend = backend or DEFAULT_BACKEND
+    if backend == "local":
+        os.makedirs(index_dir, exist_ok=True)
+        kvstore = SQLiteKVStore(os.path.join(index_dir, SQLITE_NAME))
+        return StorageContext.from_defaults(
+            docstore=KVDocumentStore(kvstore, batch_size=256),
+            index_store=KVIndexStore(kvstore),
+            vector_store=MmapVectorStore(index_dir, ann=ann or DEFAULT_ANN, hnsw=hnsw),
+        )
+    if backend == "dynamodb":
+        from llama_index.storage.docstore.dynamodb import DynamoDBDocumentStore
+        from llama_index.storage.index_store.dynamodb import DynamoDBIndexStore
+        from llama_index.vector_stores.dynamodb import DynamoDBVectorStore
+
+        return StorageContext.from_defaults(
+            docstore=DynamoDBDocumentStore.from_table_name(table_name=table_name),
+            index_store=DynamoDBIndexStore.from_table_name(table_name=table_name),
+            vector_store=DynamoDBVectorStore.from_table_name(table_name=table_name),
+        )
+    raise ValueError(f"Unknown index backend {backend!r} (choose from {', '.join(BACKENDS)})")
+
+
+def load_index(backend=None, **kwargs):
+    return load_index_from_storage(storage_context(backend, **kwargs))
+
+
+def migrate(source, target, batch_size=256):
+    """
+    Copy documents, hashes, index structures and vectors between two
+    StorageContexts. Both vector stores must expose `get(node_id)`, which
+    DynamoDBVectorStore and MmapVectorStore do.
+    """
+    # Page hashes drive --refresh; node hashes are rewritten by add_documents
+    hashes = {ref_doc_id: source.docstore.get_document_hash(ref_doc_id)
+              for ref_doc_id in source.docstore.get_all_ref_doc_info() or {}}
+    structs = source.index_store.index_structs()
+    node_ids = [node_id for struct in structs
+                for node_id in getattr(struct, "nodes_dict", {}).values()]
+    copied = 0
+    for start in range(0, len(node_ids), batch_size):
+        nodes = source.docstore.get_nodes(node_ids[start:start + batch_size])
+        for node in nodes:
+            node.embedding = source.vector_store.get(node.node_id)
+        # Nodes carry their ref_doc_id, so the docstore rebuilds ref doc info
+        target.docstore.add_documents(nodes)
+        target.vector_store.add(nodes)
+        copied += len(nodes)
+        print(f"  {copied}/{len(node_ids)} nodes")
+    target.docstore.set_document_hashes(hashes)
+    for struct in structs:
+        target.index_store.add_index_struct(struct)
+    return {"index_structs": len(structs), "nodes": copied, "documents": len(hashes)}
+
+
+def benchmark(vectors=50_000, dim=1536, queries=50, top_k=5, hnsw=None):
+    """
+    Query latency of the local store (exact and HNSW) vs the DynamoDB
+    store's scan-and-rank path; HNSW recall@k is measured against exact.
+    """
+    import shutil
+    import tempfile
+
+    from llama_index.core.schema import TextNode
+    from llama_index.core.storage.kvstore import SimpleKVStore
+
+    # Embeddings cluster by topic; uniform random vectors would be a worst
+    # case for the HNSW graph that real pages never produce
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((max(vectors // 50, 1), dim), dtype=np.float32)
+
+    def around_centers(count):
+        noise = rng.standard_normal((count, dim), dtype=np.float32)
+        return centers[rng.integers(len(centers), size=count)] + noise
+
+    data = around_centers(vectors)
+    nodes = [TextNode(id_=f"node-{i}", text="", embedding=data[i].tolist()) for i in range(vectors)]
+    query_vectors = around_centers(queries)
+    tmp = tempfile.mkdtemp(prefix="index_storage_bench_")
+    try:
+        start = time.perf_counter()
+        local = MmapVectorStore(tmp)
+        for i in range(0, vectors, 4096):
+            local.add(nodes[i:i + 4096])
+        add_seconds = time.perf_counter() - start
+        local_store = MmapVectorStore(tmp)  # reopen: the first query maps the file
+        stores = [("local (mmap)", local_store)]
+        if hnswlib is not None:
+            ann_store = MmapVectorStore(tmp, ann="hnsw", hnsw=hnsw)
+            start = time.perf_counter()
+            ann_store._load()
+            build_seconds = time.perf_counter() - start
+            stores.append((f"local (hnsw, ef {ann_store._hnsw['ef_search']})", ann_store))
+        else:
+            print("(hnswlib not installed, skipping the HNSW store)")
+        try:
+            from llama_index.vector_stores.dynamodb import DynamoDBVectorStore
+
+            # Same code path as DynamoDB, over an in-memory key/value store:
+            # the Python-side cost of a query, before any network time
+            scan = DynamoDBVectorStore(dynamodb_kvstore=SimpleKVStore())
+            scan.add(nodes)
+            stores.append(("dynamodb path, no network", scan))
+        except ImportError:
+            print("(llama-index-vector-stores-dynamodb not installed, skipping the DynamoDB path)")
+
+        print(f"{vectors} vectors x {dim} dims, top {top_k}, {queries} queries")
+        print(f"  local add: {add_seconds:.2f}s ({vectors / add_seconds:.0f} vectors/s)")
+        if hnswlib is not None:
+            print(f"  hnsw build: {build_seconds:.2f}s (M {ann_store._hnsw['M']}, "
+                  f"ef_construction {ann_store._hnsw['ef_construction']})")
+        reference = None
+        for name, store in stores:
+            timings, results = [], []
+            # The scan path takes about a second per query, so it gets a few
+            for q in query_vectors if isinstance(store, MmapVectorStore) else query_vectors[:5]:
+                start = time.perf_counter()
+                result = store.query(VectorStoreQuery(query_embedding=q.tolist(), similarity_top_k=top_k))
+                timings.append(time.perf_counter() - start)
+                results.append(result.ids)
+            reference = reference or results
+            recall = np.mean([len(set(r) & set(ref)) / len(ref) for r, ref in zip(results, reference)])
+            print(f"  {name:26s} first {timings[0] * 1000:8.1f} ms, median "
+                  f"{sorted(timings)[len(timings) // 2] * 1000:8.1f} ms  (recall@{top_k}: {recall:.3f})")
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SCC index storage backends")
+    parser.add_argument("command", nargs="?", default="stats",
+                        choices=["stats", "migrate", "compact", "ann"])
+    parser.add_argument("--backend", choices=BACKENDS, default=DEFAULT_BACKEND, help="for stats")
+    parser.add_argument("--from", dest="source", choices=BACKENDS, default="dynamodb")
+    parser.add_argument("--to", dest="target", choices=BACKENDS, default="local")
+    parser.add_argument("--table-name", default=TABLE_NAME)
+    parser.add_argument("--index-dir", default=INDEX_DIR)
+    parser.add_argument("--ann", choices=ANN_MODES, default=DEFAULT_ANN,
+                        help="local vector search (default from SCC_INDEX_ANN)")
+    parser.add_argument("--M", type=int, default=HNSW_DEFAULTS["M"], help="HNSW links per node")
+    parser.add_argument("--ef-construction", type=int, default=HNSW_DEFAULTS["ef_construction"],
+                        help="HNSW build-time candidate list")
+    parser.add_argument("--ef-search", type=int, default=HNSW_DEFAULTS["ef_search"],
+                        help="HNSW query-time candidate list: higher is slower, better recall")
+    parser.add_argument("--bench", type=int, nargs="?", const=50_000, default=None,
+                        metavar="VECTORS", help="query latency on random vectors")
+    args = parser.parse_args()
+    locations = {"table_name": args.table_name, "index_dir": args.index_dir}
+    hnsw = {"M": args.M, "ef_construction": args.ef_construction, "ef_search": args.ef_search}
+
+    if args.bench:
+        benchmark(args.bench, hnsw=hnsw)
+    elif args.command == "migrate":
+        if args.source == args.target:
+            parser.error("--from and --to must differ")
+        counts = migrate(storage_context(args.source, **locations),
+                         storage_context(args.target, **locations))
+        print(f"Migrated {counts} from {args.source} to {args.target}")
+    elif args.command == "compact":
+        print(f"Dropped {MmapVectorStore(args.index_dir).compact()} deleted vectors")
+    elif args.command == "ann":
+        store = MmapVectorStore(args.index_dir, ann="hnsw", hnsw=hnsw)
+        start = time.perf_counter()
+        store._load()
+        print(f"HNSW graph over {len(store.node_ids())} vectors up to date in "
+              f"{time.perf_counter() - start:.1f}s ({store.hnsw_path})")
+    else:
+        context = storage_context(args.backend, **locations)
+        print(f"backend: {args.backend}")
+        print(f"index structs: {len(context.index_store.index_structs())}")
+        print(f"documents: {len(context.docstore.get_all_ref_doc_info() or {})}")
+        if args.backend == "local":
+            print(f"vectors: {len(context.vector_store.node_ids())} (dim {context.vector_store.dim})")
@@ -0,0 +1,264 @@
+"""
+Streaming page loader and token-bounded chunker for the SCC index.
+
+The index used to be built from one `Document` per page, holding the whole
+page `json.dumps`'d into a single blob, after loading every page into a
+list. Here pages stream out of the page store one at a time and are split
+into overlapping chunks of at most `max_tokens` tokens:
+
+- the page text is cut into sections at heading-like lines (short, no
+  closing punctuation, followed by a longer line); the first line, the
+  page title, names the preamble
+- each section is packed line by line into chunks; a line longer than a
+  chunk is split into sentences, and a sentence that is still too long
+  between words
+- consecutive chunks of a section share up to `overlap` tokens of trailing
+  lines or sentences
+
+Every chunk is a node with the page URL and its section in the metadata,
+a stable id (`<url>#<n>`), character offsets into the page text and the
+page as its source document, so `generate_index.py --refresh` can still
+replace all of a changed page's chunks.
+
+    for batch in itertools.batched(iter_store_documents(path), 64):
+        index.insert_nodes(PageChunker().get_nodes_from_documents(batch))
+
+    python page_chunks.py --bench 20000    # throughput and peak memory
+"""
+
+import argparse
+import itertools
+import os
+import re
+import shutil
+import tempfile
+import time
+import tracemalloc
+from typing import Any, List, Sequence
+
+from llama_index.core import Document
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from llama_index.core.node_parser import NodeParser
+from llama_index.core.node_parser.node_utils import build_nodes_from_splits
+from llama_index.core.schema import BaseNode, MetadataMode
+from llama_index.core.utils import get_tokenizer
+
+from page_store import PageStore
+
+DEFAULT_MAX_TOKENS = 256
+DEFAULT_OVERLAP = 32
+
+_CLOSING = re.compile(r"[.,;:!?)\]]$")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9(\"'])")
+
+
+def is_heading(line, next_line):
+    return (
+        len(line) <= 80
+        and len(line.split()) <= 10
+        and not _CLOSING.search(line)
+        and len(next_line) > max(80, 2 * len(line))
+    )
+
+
+def split_sections(text):
+    """Yield (section title, lines) for a page's extracted text."""
+    lines = text.split("\n")
+    title = lines[0] if lines else ""
+    current, has_body = [], False
+    for i, line in enumerate(lines):
+        next_line = lines[i + 1] if i + 1 < len(lines) else ""
+        heading = i > 0 and is_heading(line, next_line)
+        if heading and has_body:
+            yield title, current
+            current, has_body = [], False
+        if heading:
+            title = line  # headings with no text of their own lead into the next section
+        elif i > 0:
+            has_body = True
+        current.append(line)
+    if current:
+        yield title, current
+
+
+def page_document(page, source):
+    """One page from the store (or an old JSON file) as a llama_index Document."""
+    # Only URL and text are indexed; links and HTTP validators are crawl state.
+    # The URL is the document id, so --refresh can match pages to stored ones.
+    return Document(
+        text=page["text"], id_=page["url"],
+        metadata={"url": page["url"], "source": source},
+        excluded_embed_metadata_keys=["source"],
+        excluded_llm_metadata_keys=["source"],
+    )
+
+
+def iter_store_documents(store_path):
+    """Stream Documents out of the page store without loading all pages."""
+    for page in PageStore(store_path).iter_pages():
+        yield page_document(page, store_path)
+
+
+class PageChunker(NodeParser):
+    """Split page Documents into token-bounded, overlapping, section-tagged chunks."""
+
+    max_tokens: int = Field(default=DEFAULT_MAX_TOKENS, gt=0)
+    overlap: int = Field(default=DEFAULT_OVERLAP, ge=0)
+    _tokenize: Any = PrivateAttr()
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        if self.overlap >= self.max_tokens:
+            raise ValueError(f"overlap ({self.overlap}) must be smaller than "
+                             f"max_tokens ({self.max_tokens})")
+        self._tokenize = get_tokenizer()
+
+    @classmethod
+    def class_name(cls):
+        return "PageChunker"
+
+    def count(self, text):
+        return len(self._tokenize(text))
+
+    def _cost(self, text):
+        return self.count(text) + 1  # plus the separator that joins it to a chunk
+
+    def _units(self, line):
+        """
+        (text, tokens, separator) pieces of a line: the line itself, or for a
+        line over the token limit its sentences, cut between words if needed.
+        """
+        n = self._cost(line)
+        if n <= self.max_tokens:
+            yield line, n, "\n"
+            return
+        sep = "\n"
+        for sentence in _SENTENCE_END.split(line):
+            n = self._cost(sentence)
+            if n <= self.max_tokens:
+                yield sentence, n, sep
+                sep = " "
+                continue
+            piece, size = [], 1
+            for word in sentence.split(" "):
+                n = self.count(" " + word)
+                if piece and size + n > self.max_tokens:
+                    yield " ".join(piece), size, sep
+                    sep, piece, size = " ", [], 1
+                piece.append(word)
+                size += n
+            if piece:
+                yield " ".join(piece), size, sep
+                sep = " "
+
+    @staticmethod
+    def _join(units):
+        return units[0][0] + "".join(sep + text for text, _, sep in units[1:])
+
+    def chunk_lines(self, lines):
+        """Pack lines into chunks of at most max_tokens with `overlap` carried over."""
+        chunk, size = [], 0
+        fresh = False  # does the chunk hold anything beyond the carried overlap?
+        for unit in (unit for line in lines for unit in self._units(line)):
+            n = unit[1]
+            if chunk and size + n > self.max_tokens:
+                yield self._join(chunk)
+                carried, carried_size = [], 0
+                for prev in reversed(chunk):
+                    total = carried_size + prev[1]
+                    if total > self.overlap or total + n > self.max_tokens:
+                        break
+                    carried.insert(0, prev)
+                    carried_size += prev[1]
+                chunk, size, fresh = carried, carried_size, False
+            chunk.append(unit)
+            size += n
+            fresh = True
+        if chunk and fresh:
+            yield self._join(chunk)
+
+    def chunk_text(self, text):
+        """Yield (section, chunk text) for one page."""
+        for section, lines in split_sections(text):
+            for chunk in self.chunk_lines(lines):
+                yield section, chunk
+
+    def _parse_nodes(self, nodes: Sequence[BaseNode], show_progress: bool = False,
+                     **kwargs: Any) -> List[BaseNode]:
+        out = []
+        for node in nodes:
+            chunks = list(self.chunk_text(node.get_content(metadata_mode=MetadataMode.NONE)))
+            page_nodes = build_nodes_from_splits(
+                [text for _, text in chunks], node,
+                id_func=lambda i, doc: f"{doc.node_id}#{i}",
+            )
+            for page_node, (section, _) in zip(page_nodes, chunks):
+                page_node.metadata["section"] = section
+            out.extend(page_nodes)
+        return out
+
+
+def benchmark(pages=20_000, batch_size=64, max_tokens=DEFAULT_MAX_TOKENS, overlap=DEFAULT_OVERLAP):
+    """Chunk a synthetic page store in batches; report throughput and peak memory."""
+    from fixture_site import WORDS
+    import random
+
+    rng = random.Random(0)
+    base = "https://www.bu.edu/tech/support/research/"
+    tmp = tempfile.mkdtemp(prefix="page_chunks_bench_")
+    try:
+        store = PageStore(os.path.join(tmp, "pages.sqlite"))
+        for start in range(0, pages, 5000):
+            batch = []
+            for i in range(start, min(start + 5000, pages)):
+                sections = [f"Research Support {i}"]
+                for s in range(rng.randint(1, 4)):
+                    sections.append(f"Topic {i}.{s}")
+                    sections += [" ".join(rng.choice(WORDS) for _ in range(rng.randint(20, 120))) + "."
+                                 for _ in range(rng.randint(1, 6))]
+                batch.append({"url": f"{base}topic-{i // 100}/page-{i}/",
+                              "text": "\n".join(sections), "links": []})
+            store.put_many(batch)
+
+        chunker = PageChunker(max_tokens=max_tokens, overlap=overlap)
+        print(f"{pages} pages, {max_tokens}-token chunks, {overlap}-token overlap, "
+              f"batches of {batch_size}")
+        print(f"{'pages':>8} {'chunks':>8} {'seconds':>8} {'pages/s':>8} {'peak MB':>8}")
+        checkpoints = {pages // 8, pages // 4, pages // 2, pages}
+        tracemalloc.start()
+        start = time.perf_counter()
+        done = chunks = 0
+        for batch in itertools.batched(iter_store_documents(store.path), batch_size):
+            nodes = chunker.get_nodes_from_documents(batch)
+            assert all(chunker.count(n.get_content(MetadataMode.NONE)) <= max_tokens for n in nodes)
+            chunks += len(nodes)
+            prev, done = done, done + len(batch)
+            for mark in sorted(checkpoints):
+                if prev < mark <= done:
+                    seconds = time.perf_counter() - start
+                    peak = tracemalloc.get_traced_memory()[1] / 1e6
+                    print(f"{done:8d} {chunks:8d} {seconds:8.2f} {done / seconds:8.0f} {peak:8.1f}")
+        tracemalloc.stop()
+
+        # The old loader: every page as one Document in a list before indexing
+        tracemalloc.start()
+        documents = list(iter_store_documents(store.path))
+        peak = tracemalloc.get_traced_memory()[1] / 1e6
+        tracemalloc.stop()
+        print(f"whole-corpus Document list for {len(documents)} pages: peak {peak:.1f} MB")
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Page chunker")
+    parser.add_argument("--bench", type=int, nargs="?", const=20_000, default=None,
+                        metavar="PAGES", help="chunk a synthetic page store")
+    parser.add_argument("--max-tokens", type=int, default=DEFAULT_MAX_TOKENS)
+    parser.add_argument("--overlap", type=int, default=DEFAULT_OVERLAP)
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+    if args.bench:
+        benchmark(args.bench, args.batch_size, args.max_tokens, args.overlap)
+    else:
+        parser.print_help()
@@ -0,0 +1,269 @@
+"""
+Single-file page store for crawled pages.
+
+Replaces one pretty-printed JSON file per URL in scraped_pages/ with one
+SQLite database (WAL mode) keyed by URL. The `pages` table holds each
+page's links, HTTP validators and content hash; the zlib-compressed text
+lives in a separate `texts` table, so resuming a crawl reads the small URL
+index in one sequential scan without paging through the text.
+
+The old JSON files hold only url and text, so imported pages have
+`links=None` (unknown, as opposed to `[]`); the crawler fetches them once
+more to learn their links instead of skipping them.
+
+    store = PageStore("scraped_pages.sqlite")
+    store.put({"url": ..., "text": ..., "links": [...], "etag": ..., ...})
+    known = store.index()          # url -> links/validators/hash, no text
+    for page in store.iter_pages():
+        ...
+
+    python page_store.py import scraped_pages/          # migrate JSON files
+    python page_store.py stats
+    python page_store.py --bench 50000                  # startup time vs JSON files
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+
+from frontier import normalize_url
+
+DEFAULT_PATH = "scraped_pages.sqlite"
+META_FIELDS = ("etag", "last_modified", "content_hash")
+PAGES_TABLE = """
+    CREATE TABLE IF NOT EXISTS pages (
+        url TEXT PRIMARY KEY,
+        links TEXT,
+        etag TEXT,
+        last_modified TEXT,
+        content_hash TEXT,
+        updated REAL NOT NULL
+    )
+"""
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def compress_text(text):
+    return zlib.compress(text.encode("utf-8"), 6)
+
+
+def decompress_text(blob):
+    return zlib.decompress(blob).decode("utf-8")
+
+
+def _links(value):
+    """Stored links column -> list, or None when the links are unknown (NULL)."""
+    if value is None:
+        return None
+    return value.split("\n") if value else []
+
+
+class PageStore:
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(PAGES_TABLE)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS texts (url TEXT PRIMARY KEY, text BLOB NOT NULL)"
+        )
+        self._allow_unknown_links()
+
+    def _allow_unknown_links(self):
+        """Stores created before links could be unknown declared the column NOT NULL."""
+        notnull = {row[1]: row[3] for row in self.db.execute("PRAGMA table_info(pages)")}
+        if not notnull.get("links"):
+            return
+        with self._lock:
+            self.db.execute("BEGIN")
+            self.db.execute("ALTER TABLE pages RENAME TO pages_old")
+            self.db.execute(PAGES_TABLE)
+            self.db.execute("INSERT INTO pages SELECT * FROM pages_old")
+            self.db.execute("DROP TABLE pages_old")
+            self.db.execute("COMMIT")
+
+    @staticmethod
+    def _rows(page, now):
+        text = page["text"]
+        blob = compress_text(text) if isinstance(text, str) else text
+        links = page.get("links", [])
+        meta = (page["url"], None if links is None else "\n".join(links),
+                *(page.get(k) for k in META_FIELDS), now)
+        return meta, (page["url"], blob)
+
+    def put(self, page):
+        """
+        Insert or replace a page. `page["text"]` may be a str or text already
+        compressed with `compress_text` (e.g. by a parse worker process).
+        """
+        self.put_many([page])
+
+    def put_many(self, pages):
+        now = time.time()
+        rows = [self._rows(page, now) for page in pages]
+        with self._lock:
+            self.db.execute("BEGIN")
+            self.db.executemany(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?)", [m for m, _ in rows]
+            )
+            self.db.executemany(
+                "INSERT OR REPLACE INTO texts VALUES (?, ?)", [t for _, t in rows]
+            )
+            self.db.execute("COMMIT")
+
+    def get(self, url):
+        row = self.db.execute(
+            "SELECT p.url, t.text, p.links, p.etag, p.last_modified, p.content_hash "
+            "FROM pages p JOIN texts t ON t.url = p.url WHERE p.url = ?",
+            (url,),
+        ).fetchone()
+        return self._page(row) if row else None
+
+    def delete(self, url):
+        with self._lock:
+            self.db.execute("BEGIN")
+            self.db.execute("DELETE FROM pages WHERE url = ?", (url,))
+            self.db.execute("DELETE FROM texts WHERE url = ?", (url,))
+            self.db.execute("COMMIT")
+
+    def index(self):
+        """
+        URL -> {url, links, etag, last_modified, content_hash}, without text.
+        `links` is None for pages whose links are unknown (imported from JSON).
+        """
+        return {
+            url: {"url": url, "links": _links(links), "etag": etag,
+                  "last_modified": last_modified, "content_hash": content_hash}
+            for url, links, etag, last_modified, content_hash in self.db.execute(
+                "SELECT url, links, etag, last_modified, content_hash FROM pages"
+            )
+        }
+
+    def iter_pages(self):
+        """Every stored page with its text, in URL order."""
+        for row in self.db.execute(
+            "SELECT p.url, t.text, p.links, p.etag, p.last_modified, p.content_hash "
+            "FROM pages p JOIN texts t ON t.url = p.url ORDER BY p.url"
+        ):
+            yield self._page(row)
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    @staticmethod
+    def _page(row):
+        url, blob, links, etag, last_modified, content_hash = row
+        return {"url": url, "text": decompress_text(blob), "links": _links(links),
+                "etag": etag, "last_modified": last_modified, "content_hash": content_hash}
+
+    def import_json_dir(self, json_dir):
+        """
+        Load pages from the old one-JSON-file-per-URL layout; returns the count.
+        Those files have no links, so the pages are stored with links unknown.
+        """
+        pages = []
+        for fname in os.listdir(json_dir):
+            if not fname.endswith(".json"):
+                continue
+            fpath = os.path.join(json_dir, fname)
+            try:
+                with open(fpath, "r", encoding="utf-8") as f:
+                    page = json.load(f)
+            except Exception as e:
+                print(f"Warning: Failed to load {fpath}: {e}")
+                continue
+            page["url"] = normalize_url(page["url"])
+            page.setdefault("links", None)
+            page.setdefault("content_hash", text_hash(page["text"]))
+            pages.append(page)
+        self.put_many(pages)
+        return len(pages)
+
+    def stats(self):
+        count, text_bytes = self.db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(text)), 0) FROM texts"
+        ).fetchone()
+        unknown = self.db.execute("SELECT COUNT(*) FROM pages WHERE links IS NULL").fetchone()[0]
+        return {"path": self.path, "pages": count, "links_unknown": unknown,
+                "compressed_text_mb": text_bytes / 1e6,
+                "file_mb": os.path.getsize(self.path) / 1e6}
+
+
+def benchmark(pages=50_000):
+    """Startup cost of rebuilding the visited set: JSON files vs the store."""
+    from fixture_site import WORDS
+    import random
+
+    rng = random.Random(0)
+    base = "https://www.bu.edu/tech/support/research/"
+    records = []
+    for i in range(pages):
+        text = "\n".join(" ".join(rng.choice(WORDS) for _ in range(40)) for _ in range(20))
+        links = [f"{base}topic-{j // 100}/page-{j}/" for j in rng.sample(range(pages), 10)]
+        records.append({"url": f"{base}topic-{i // 100}/page-{i}/", "text": text,
+                        "links": links, "content_hash": str(i)})
+
+    tmp = tempfile.mkdtemp(prefix="page_store_bench_")
+    try:
+        json_dir = os.path.join(tmp, "scraped_pages")
+        os.makedirs(json_dir)
+        for i, record in enumerate(records):
+            # The old crawler saved only url and text per file
+            with open(os.path.join(json_dir, f"{i:064x}.json"), "w", encoding="utf-8") as f:
+                json.dump({"url": record["url"], "text": record["text"]}, f,
+                          ensure_ascii=False, indent=2)
+        store = PageStore(os.path.join(tmp, DEFAULT_PATH))
+        store.put_many(records)
+        json_mb = sum(os.path.getsize(os.path.join(json_dir, f)) for f in os.listdir(json_dir)) / 1e6
+
+        start = time.perf_counter()
+        visited = set()
+        for fname in os.listdir(json_dir):
+            with open(os.path.join(json_dir, fname), "r", encoding="utf-8") as f:
+                visited.add(json.load(f)["url"])
+        json_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        index = PageStore(store.path).index()
+        store_seconds = time.perf_counter() - start
+        assert set(index) == visited
+
+        print(f"{pages} pages")
+        print(f"  JSON files  {json_mb:7.1f} MB in {pages} files, startup scan {json_seconds:.2f}s")
+        print(f"  page store  {store.stats()['file_mb']:7.1f} MB in 1 file, "
+              f"startup scan {store_seconds:.2f}s")
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Crawled page store")
+    parser.add_argument("command", nargs="?", default="stats", choices=["stats", "import"])
+    parser.add_argument("json_dir", nargs="?", default="scraped_pages",
+                        help="directory of per-URL JSON files for 'import'")
+    parser.add_argument("--store", default=DEFAULT_PATH)
+    parser.add_argument("--bench", type=int, nargs="?", const=50_000, default=None,
+                        metavar="PAGES", help="benchmark startup time on a synthetic corpus")
+    args = parser.parse_args()
+
+    if args.bench:
+        benchmark(args.bench)
+    elif args.command == "import":
+        store = PageStore(args.store)
+        print(f"Imported {store.import_json_dir(args.json_dir)} pages into {args.store}")
+    else:
+        for name, value in PageStore(args.store).stats().items():
+            print(f"{name}: {value}")
@@ -1,24 +1,35 @@
-from llama_index.core import StorageContext, load_index_from_storage
-from llama_index.storage.docstore.dynamodb import DynamoDBDocumentStore
-from llama_index.storage.index_store.dynamodb import DynamoDBIndexStore
-from llama_index.vector_stores.dynamodb import DynamoDBVectorStore
+import argparse
 
-# Ensure AWS credentials are set in your environment or ~/.aws/credentials
-TABLE_NAME = "llamaindex_scc"
+from index_storage import ANN_MODES, BACKENDS, DEFAULT_ANN, DEFAULT_BACKEND, INDEX_DIR, load_index
 
-def query_index(query, top_k=5):
-    storage_context = StorageContext.from_defaults(
-        docstore=DynamoDBDocumentStore.from_table_name(table_name=TABLE_NAME),
-        index_store=DynamoDBIndexStore.from_table_name(table_name=TABLE_NAME),
-        vector_store=DynamoDBVectorStore.from_table_name(table_name=TABLE_NAME)
-    )
-    index = load_index_from_storage(storage_context)
+def query_index(query, top_k=5, backend=None, index_dir=INDEX_DIR, ann=None):
+    index = load_index(backend, index_dir=index_dir, ann=ann)
     query_engine = index.as_query_engine(similarity_top_k=top_k)
     response = query_engine.query(query)
     return response
 
 if __name__ == "__main__":
-    query = "Describe the main computational resources available at the BU SCC."
-    result = query_index(query)
-    print("Query:", query)
-    print("Response:", result)
+    parser = argparse.ArgumentParser(description="Query the SCC index")
+    parser.add_argument("query", nargs="?",
+                        default="Describe the main computational resources available at the BU SCC.")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--backend", choices=BACKENDS, default=DEFAULT_BACKEND,
+                        help="index storage (default from SCC_INDEX_BACKEND)")
+    parser.add_argument("--index-dir", default=INDEX_DIR, help="local backend directory")
+    parser.add_argument("--ann", choices=ANN_MODES, default=DEFAULT_ANN,
+                        help="local backend vector search (default from SCC_INDEX_ANN)")
+    parser.add_argument("--server", default=None, metavar="URL",
+                        help="ask a running query_server.py instead of loading the index")
+    args = parser.parse_args()
+
+    print("Query:", args.query)
+    if args.server:
+        from query_server import ask
+
+        answer = ask(args.server, args.query, args.top_k)
+        print("Response:", answer["response"])
+        for source in answer["sources"]:
+            print(f"  {source['score']:.3f} {source['url']} ({source['section']})")
+        print(f"Timing: {', '.join(f'{k} {v:.1f}' for k, v in answer['timing'].items())}")
+    else:
+        print("Response:", query_index(args.query, args.top_k, args.backend, args.index_dir, args.ann))
@@ -0,0 +1,297 @@
+"""
+Long-lived query service for the SCC index.
+
+`query_index()` rebuilds the storage context and reloads the index for
+every question. This server loads the index and the response synthesizer
+once and answers questions over HTTP, on a TCP port or a Unix socket:
+
+    python query_server.py --backend local --workers 4
+    python query_server.py --unix /tmp/scc_query.sock
+    python query_server.py --backend local --ann hnsw --ef-search 128
+
+    curl -s localhost:8400/query -d '{"query": "How do I request a GPU?"}'
+    python query_index.py --server http://127.0.0.1:8400 "How do I request a GPU?"
+
+Endpoints:
+
+- POST /query  {"query": ..., "top_k": 5, "retrieve_only": false}
+  -> {"response", "sources": [{"url", "section", "score"}], "timing"}
+- GET /health  -> index size, uptime
+- GET /stats   -> requests served, rejected, latency percentiles
+
+Each question runs on a pool of `--workers` threads (retrieval is local;
+synthesis waits on the LLM, so threads overlap well). At most
+`--max-queue` questions wait for a worker; beyond that the server answers
+503 rather than letting latency grow without bound. Every response
+carries per-stage timing in milliseconds: queue wait, retrieval,
+synthesis and total.
+
+    python query_server.py --bench    # server vs reloading per query
+"""
+
+import argparse
+import json
+import os
+import socketserver
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.request import Request, urlopen
+
+from llama_index.core import get_response_synthesizer
+
+from index_storage import ANN_MODES, BACKENDS, DEFAULT_ANN, DEFAULT_BACKEND, INDEX_DIR, load_index
+
+DEFAULT_PORT = 8400
+DEFAULT_TOP_K = 5
+
+
+class QueryService:
+    """The loaded index plus a worker pool; shared by every request handler."""
+
+    def __init__(self, index, workers=4, max_queue=32, default_top_k=DEFAULT_TOP_K):
+        self.index = index
+        self.synthesizer = get_response_synthesizer()
+        self.default_top_k = default_top_k
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="query")
+        self.slots = threading.BoundedSemaphore(workers + max_queue)
+        self.started = time.time()
+        self.lock = threading.Lock()
+        self.served = 0
+        self.rejected = 0
+        self.errors = 0
+        self.latencies = []  # total ms of the last 1000 requests
+
+    def answer(self, query, top_k=None, retrieve_only=False, submitted=None):
+        start = time.perf_counter()
+        timing = {"queue_ms": (start - submitted) * 1000 if submitted else 0.0}
+        nodes = self.index.as_retriever(similarity_top_k=top_k or self.default_top_k).retrieve(query)
+        retrieved = time.perf_counter()
+        timing["retrieve_ms"] = (retrieved - start) * 1000
+        response = None
+        if not retrieve_only:
+            response = str(self.synthesizer.synthesize(query, nodes))
+        timing["synthesize_ms"] = (time.perf_counter() - retrieved) * 1000
+        sources = [{"url": n.node.metadata.get("url"), "section": n.node.metadata.get("section"),
+                    "score": n.score} for n in nodes]
+        return {"query": query, "response": response, "sources": sources, "timing": timing}
+
+    def submit(self, query, top_k=None, retrieve_only=False):
+        """Run one question on the pool; None if the queue is full."""
+        if not self.slots.acquire(blocking=False):
+            with self.lock:
+                self.rejected += 1
+            return None
+        submitted = time.perf_counter()
+        try:
+            result = self.pool.submit(self.answer, query, top_k, retrieve_only, submitted).result()
+        except Exception:
+            with self.lock:
+                self.errors += 1
+            raise
+        finally:
+            self.slots.release()
+        result["timing"]["total_ms"] = (time.perf_counter() - submitted) * 1000
+        with self.lock:
+            self.served += 1
+            self.latencies = self.latencies[-999:] + [result["timing"]["total_ms"]]
+        return result
+
+    def stats(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            stats = {"served": self.served, "rejected": self.rejected, "errors": self.errors,
+                     "uptime_s": time.time() - self.started}
+        if len(latencies) >= 2:
+            q = statistics.quantiles(latencies, n=100)
+            stats.update(p50_ms=q[49], p95_ms=q[94], p99_ms=q[98])
+        return stats
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    service = None  # set by make_server
+    log_queries = True
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def address_string(self):
+        return self.client_address[0] if self.client_address else "unix"
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send(200, {"status": "ok",
+                             "nodes": len(self.service.index.index_struct.nodes_dict),
+                             "uptime_s": time.time() - self.service.started})
+        elif self.path == "/stats":
+            self._send(200, self.service.stats())
+        else:
+            self._send(404, {"error": f"unknown path {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/query":
+            self._send(404, {"error": f"unknown path {self.path}"})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            query = request["query"]
+        except (ValueError, KeyError, TypeError):
+            self._send(400, {"error": 'expected a JSON body with a "query" field'})
+            return
+        try:
+            result = self.service.submit(query, request.get("top_k"),
+                                         bool(request.get("retrieve_only")))
+        except Exception as e:
+            self._send(500, {"error": f"{type(e).__name__}: {e}"})
+            return
+        if result is None:
+            self._send(503, {"error": "too many queries waiting, try again"})
+            return
+        t = result["timing"]
+        if self.log_queries:
+            print(f"[QUERY] {t['total_ms']:7.1f} ms (queue {t['queue_ms']:.1f}, retrieve "
+                  f"{t['retrieve_ms']:.1f}, synthesize {t['synthesize_ms']:.1f}) {query[:60]!r}")
+        self._send(200, result)
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(service, host="127.0.0.1", port=DEFAULT_PORT, unix_socket=None, log_queries=True):
+    handler = type("BoundQueryHandler", (QueryHandler,),
+                   {"service": service, "log_queries": log_queries})
+    if unix_socket:
+        if os.path.exists(unix_socket):
+            os.unlink(unix_socket)
+        return ThreadingUnixHTTPServer(unix_socket, handler)
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def ask(server_url, query, top_k=None, retrieve_only=False, timeout=120):
+    """Client helper: POST one question to a running server and return its JSON."""
+    body = json.dumps({"query": query, "top_k": top_k, "retrieve_only": retrieve_only}).encode()
+    request = Request(server_url.rstrip("/") + "/query", data=body,
+                      headers={"Content-Type": "application/json"})
+    with urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+def benchmark(pages=500, queries=40, workers=4, concurrency=8, llm_latency=0.2):
+    """Reload-per-query vs a warm server, on a local index with mock models."""
+    import shutil
+    import tempfile
+
+    from llama_index.core import Settings, VectorStoreIndex
+    from llama_index.core.embeddings import MockEmbedding
+    from llama_index.core.llms import MockLLM
+
+    from index_storage import storage_context
+    from page_chunks import PageChunker, page_document
+
+    class SlowMockLLM(MockLLM):
+        """Stands in for a remote LLM: a fixed wait per completion."""
+
+        def complete(self, prompt, formatted=False, **kwargs):
+            time.sleep(llm_latency)
+            return super().complete(prompt, formatted=formatted, **kwargs)
+
+    Settings.embed_model = MockEmbedding(embed_dim=384)
+    Settings.llm = SlowMockLLM(max_tokens=16)
+    tmp = tempfile.mkdtemp(prefix="query_server_bench_")
+    try:
+        index = VectorStoreIndex(nodes=[], storage_context=storage_context("local", index_dir=tmp))
+        docs = [page_document({"url": f"https://example.org/page-{i}/",
+                               "text": f"Page {i}\n" + f"Cluster topic {i} details. " * 80}, "bench")
+                for i in range(pages)]
+        index.insert_nodes(PageChunker().get_nodes_from_documents(docs))
+        questions = [f"How do I use cluster topic {i}?" for i in range(queries)]
+
+        print(f"{pages} pages ({len(index.index_struct.nodes_dict)} chunks), "
+              f"{queries} questions, LLM {llm_latency * 1000:.0f} ms per call")
+        load = answer = 0.0
+        for q in questions[:10]:
+            start = time.perf_counter()
+            engine = load_index("local", index_dir=tmp).as_query_engine(similarity_top_k=DEFAULT_TOP_K)
+            loaded = time.perf_counter()
+            engine.query(q)
+            load, answer = load + loaded - start, answer + time.perf_counter() - loaded
+        print(f"  reload per query (query_index)   {(load + answer) * 100:7.1f} ms/question, serial "
+              f"({load * 100:.1f} ms of it loading the index)")
+
+        service = QueryService(load_index("local", index_dir=tmp), workers=workers)
+        server = make_server(service, port=0, log_queries=False)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        for retrieve_only in (True, False):
+            start = time.perf_counter()
+            with ThreadPoolExecutor(concurrency) as clients:
+                results = list(clients.map(lambda q: ask(url, q, retrieve_only=retrieve_only), questions))
+            wall = time.perf_counter() - start
+            totals = sorted(r["timing"]["total_ms"] for r in results)
+            retrieve = statistics.median(r["timing"]["retrieve_ms"] for r in results)
+            label = "retrieve only" if retrieve_only else "full answer"
+            print(f"  server, {label:13s} {wall / queries * 1000:7.1f} ms/question wall "
+                  f"({concurrency} clients, {workers} workers), p50 {totals[len(totals) // 2]:.1f} ms, "
+                  f"retrieve p50 {retrieve:.1f} ms")
+        server.shutdown()
+        service.close()
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SCC index query server")
+    parser.add_argument("--backend", choices=BACKENDS, default=DEFAULT_BACKEND,
+                        help="index storage (default from SCC_INDEX_BACKEND)")
+    parser.add_argument("--index-dir", default=INDEX_DIR, help="local backend directory")
+    parser.add_argument("--ann", choices=ANN_MODES, default=DEFAULT_ANN,
+                        help="local backend vector search (default from SCC_INDEX_ANN)")
+    parser.add_argument("--ef-search", type=int, default=None,
+                        help="HNSW candidate list per query (recall vs latency)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix", default=None, metavar="PATH", help="serve on a Unix socket")
+    parser.add_argument("--workers", type=int, default=4, help="questions answered at once")
+    parser.add_argument("--max-queue", type=int, default=32,
+                        help="questions allowed to wait for a worker before 503")
+    parser.add_argument("--top-k", type=int, default=DEFAULT_TOP_K)
+    parser.add_argument("--bench", action="store_true",
+                        help="compare with reloading the index per query (mock models)")
+    args = parser.parse_args()
+
+    if args.bench:
+        benchmark(workers=args.workers)
+    else:
+        start = time.perf_counter()
+        hnsw = {"ef_search": args.ef_search} if args.ef_search else None
+        index = load_index(args.backend, index_dir=args.index_dir, ann=args.ann, hnsw=hnsw)
+        if args.ann == "hnsw" and args.backend == "local":
+            index.vector_store._load()  # build or extend the graph before the first question
+        service = QueryService(index, args.workers, args.max_queue, args.top_k)
+        server = make_server(service, args.host, args.port, args.unix)
+        where = args.unix or f"http://{args.host}:{args.port}"
+        print(f"Loaded {args.backend} index in {time.perf_counter() - start:.1f}s, "
+              f"serving on {where} with {args.workers} workers")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print(f"\n{service.stats()}")
+        finally:
+            service.close()
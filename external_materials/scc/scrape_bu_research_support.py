@@ -1,115 +1,358 @@
-import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse, quote
-import json
-import time
-import os
-import hashlib
+"""
+Crawl the BU research support site into a page store for indexing.
+
+Pages are fetched concurrently with asyncio/aiohttp over a shared
+connection pool. A per-host scheduler caps the number of requests in
+flight to one host and spaces out request starts by a politeness delay,
+without blocking other fetches the way `time.sleep()` did.
+
+URLs are normalized (host case, trailing slash, query order, fragments)
+and deduplicated in O(1) by the `Frontier` before they are queued.
+
+Every page is saved in scraped_pages.sqlite (see page_store.py) with its
+URL, compressed visible text, outgoing links, the server's
+ETag/Last-Modified validators and a hash of the text. On restart the URL
+index is read in one scan; already scraped pages are not fetched again and
+their stored links are followed, so the crawl continues where it stopped.
+Pages from the old scraped_pages/*.json layout are imported on first run;
+those files have no links, so the imported pages are fetched once more to
+recover them.
+
+Fetching and parsing are separate pipeline stages: fetchers hand raw HTML
+to a bounded backlog, and a process pool extracts text and links and
+compresses the text for the store, so network I/O and CPU-bound parsing scale
+independently (`--concurrency` fetchers, `--parse-workers` processes).
+Discovered links go back to the frontier from the parse stage.
+
+`--refresh` re-crawls incrementally: stored pages are requested with
+If-None-Match/If-Modified-Since, a 304 or an unchanged text hash leaves the
+stored page alone, and only changed pages are rewritten (and so re-indexed by
+`generate_index.py --refresh`). Pages that now return 404/410 are removed.
+
+    python scrape_bu_research_support.py
+    python scrape_bu_research_support.py --refresh
+    python scrape_bu_research_support.py --concurrency 32 --per-host 4 --delay 0.25
+    python scrape_bu_research_support.py --bench     # against fixture_site.py
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import functools
 import logging
+import os
+import shutil
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from urllib.parse import urlparse
+
+import aiohttp
+
+from frontier import Frontier, normalize_url
+from html_extract import extract_page
+from page_store import DEFAULT_PATH, PageStore, compress_text, text_hash
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
 
 BASE_URL = "https://www.bu.edu/tech/support/research/"
-SCRAPED_DIR = "scraped_pages"
-
-if not os.path.exists(SCRAPED_DIR):
-    os.makedirs(SCRAPED_DIR)
-
-visited = set()
-pages = []
-
-
-def is_valid(url):
-    parsed = urlparse(url)
-    return parsed.netloc.endswith("bu.edu") and \
-           parsed.scheme in ("http", "https") and \
-           url.startswith(BASE_URL)
-
-
-def extract_links(soup, base_url):
-    links = set()
-    for a in soup.find_all("a", href=True):
-        href = urljoin(base_url, a["href"])
-        if is_valid(href):
-            links.add(href.split("#")[0])  # Remove fragment
-    return links
-
-
-def extract_visible_text(soup):
-    # Remove script, style, nav, footer, header, aside, and noscript
-    for tag in soup(["script", "style", "nav", "footer", "header", "aside", "noscript"]):
-        tag.decompose()
-    # Get visible text
-    text = soup.get_text(separator="\n", strip=True)
-    # Remove excessive blank lines
-    lines = [line.strip() for line in text.split("\n") if line.strip()]
-    return "\n".join(lines)
-
-
-def url_to_filename(url):
-    # Use SHA256 hash for uniqueness and filesystem safety
-    url_hash = hashlib.sha256(url.encode("utf-8")).hexdigest()
-    return f"{url_hash}.json"
-
-def crawl(url):
-    to_visit = [url]
-    while to_visit:
-        curr_url = to_visit.pop(0)
-        fname = url_to_filename(curr_url)
-        fpath = os.path.join(SCRAPED_DIR, fname)
-        if os.path.exists(fpath):
+SCRAPED_DIR = "scraped_pages"  # old one-JSON-file-per-page layout, imported on first run
+
+
+def conditional_headers(page):
+    headers = {}
+    if page.get("etag"):
+        headers["If-None-Match"] = page["etag"]
+    if page.get("last_modified"):
+        headers["If-Modified-Since"] = page["last_modified"]
+    return headers
+
+
+def parse_page(html, url, root, parser, etag, last_modified, old=None):
+    """
+    Parse stage (runs in a worker process): extract text and links and
+    compare with the stored page.
+
+    `old` is the stored page's index entry (links, validators, hash).
+    Returns `(status, page, write)`: status is "fetched", "changed" or
+    "unchanged", page holds the text compressed for the store, and write
+    says whether the stored copy needs updating.
+    """
+    text, links = extract_page(html, url, root, parser)
+    page_data = {"url": url, "text": compress_text(text), "links": sorted(links),
+                 "etag": etag, "last_modified": last_modified,
+                 "content_hash": text_hash(text)}
+    if old is not None and old["content_hash"] == page_data["content_hash"]:
+        # Same text; only rewrite if the validators changed, so the next
+        # refresh can be answered with a 304, or the links were unknown
+        write = (old.get("links") is None
+                 or (old.get("etag"), old.get("last_modified")) != (etag, last_modified))
+        return "unchanged", page_data, write
+    return ("changed" if old is not None else "fetched"), page_data, True
+
+
+class HostScheduler:
+    """
+    Per-host politeness: at most `per_host` requests in flight to one host,
+    and consecutive request starts to that host at least `delay` seconds
+    apart. Waiting fetches yield to the event loop instead of sleeping.
+    """
+
+    def __init__(self, per_host=4, delay=0.25):
+        self.per_host = per_host
+        self.delay = delay
+        self._slots = {}
+        self._next_start = {}
+
+    @asynccontextmanager
+    async def slot(self, url):
+        host = urlparse(url).netloc
+        sem = self._slots.setdefault(host, asyncio.Semaphore(self.per_host))
+        async with sem:
+            loop = asyncio.get_running_loop()
+            now = loop.time()
+            start = max(now, self._next_start.get(host, now))
+            self._next_start[host] = start + self.delay
+            if start > now:
+                await asyncio.sleep(start - now)
+            yield
+
+
+async def crawl(
+    url=BASE_URL,
+    store=None,
+    root=None,
+    concurrency=16,
+    per_host=4,
+    delay=0.25,
+    timeout=10,
+    scraped=None,
+    refresh=False,
+    parser="auto",
+    parse_workers=None,
+    parse_backlog=64,
+):
+    """
+    Crawl everything under `root` (default: the start URL) reachable from `url`.
+
+    Pages go to `store` (a PageStore, default scraped_pages.sqlite). With
+    `refresh`, pages already in the store are revalidated with
+    conditional requests instead of skipped. `parser` selects the
+    html_extract backend (bs4, lxml, selectolax or auto). Pages are parsed
+    in `parse_workers` processes (default: one per CPU; 0 parses in the
+    event loop), with at most `parse_backlog` fetched pages waiting.
+
+    Returns a stats dict with fetched/changed/unchanged/skipped/removed/errors
+    counts and timing.
+    """
+    url = normalize_url(url)
+    root = normalize_url(root) if root else url
+    store = store if store is not None else PageStore(DEFAULT_PATH)
+    scraped = store.index() if scraped is None else scraped
+    scheduler = HostScheduler(per_host=per_host, delay=delay)
+    frontier = Frontier([url])
+    pool = None
+    if parse_workers is None or parse_workers > 0:
+        pool = concurrent.futures.ProcessPoolExecutor(max_workers=parse_workers)
+    backlog = asyncio.Semaphore(parse_backlog)
+    parsing = set()
+    stats = {"fetched": 0, "changed": 0, "unchanged": 0, "skipped": 0,
+             "removed": 0, "errors": 0, "non_200": 0}
+    start = time.perf_counter()
+
+    async def visit(session, curr_url):
+        old = scraped.get(curr_url)
+        # Pages imported from the old JSON layout have unknown links: fetch them again
+        links_known = old is not None and old.get("links") is not None
+        if links_known and not refresh:
             logging.info(f"[SKIP] Already scraped: {curr_url}")
-            visited.add(curr_url)
-            continue
+            stats["skipped"] += 1
+            frontier.extend(old["links"])
+            return
         try:
-            logging.info(f"[VISIT] {curr_url}")
-            resp = requests.get(curr_url, timeout=10)
-            if resp.status_code != 200:
-                logging.info(f"[WARN] Non-200 status code for {curr_url}: {resp.status_code}")
-                continue
-            soup = BeautifulSoup(resp.text, "html.parser")
-            text = extract_visible_text(soup)
-            page_data = {"url": curr_url, "text": text}
-            with open(fpath, "w", encoding="utf-8") as f:
-                json.dump(page_data, f, ensure_ascii=False, indent=2)
-            logging.info(f"[SAVE] {curr_url} -> {fpath}")
-            visited.add(curr_url)
-            pages.append(page_data)
-            # Find new links
-            links = extract_links(soup, curr_url)
-            new_links = 0
-            for link in links:
-                if link not in visited and link not in to_visit:
-                    to_visit.append(link)
-                    new_links += 1
-            logging.info(f"[LINKS] Found {len(links)} links, {new_links} new links queued. {len(to_visit)} pages in queue.")
-            time.sleep(0.5)  # Be polite
+            async with scheduler.slot(curr_url):
+                logging.info(f"[VISIT] {curr_url}")
+                headers = conditional_headers(old) if links_known else {}
+                async with session.get(curr_url, headers=headers) as resp:
+                    if resp.status == 304 and old is not None:
+                        logging.info(f"[UNCHANGED] {curr_url}")
+                        stats["unchanged"] += 1
+                        frontier.extend(old.get("links") or [])
+                        return
+                    if resp.status in (404, 410) and old is not None:
+                        store.delete(curr_url)
+                        del scraped[curr_url]
+                        logging.info(f"[REMOVED] {curr_url}: {resp.status}")
+                        stats["removed"] += 1
+                        return
+                    if resp.status != 200:
+                        logging.info(f"[WARN] Non-200 status code for {curr_url}: {resp.status}")
+                        stats["non_200"] += 1
+                        return
+                    html = await resp.text()
+                    etag = resp.headers.get("ETag")
+                    last_modified = resp.headers.get("Last-Modified")
         except Exception as e:
             logging.info(f"[ERROR] Failed to fetch {curr_url}: {e}")
-    logging.info(f"[DONE] Crawl finished. {len(visited)} total pages visited.")
+            stats["errors"] += 1
+            return
 
+        # Hand off to the parse stage; blocks this fetcher while the backlog is full
+        await backlog.acquire()
+        job = functools.partial(parse_page, html, curr_url, root, parser,
+                                etag, last_modified, old)
+        parsing.add(asyncio.create_task(parse(curr_url, job)))
 
-def main():
-    global pages, visited
-    # Resume support: scan scraped_pages for existing files
-    if not os.path.exists(SCRAPED_DIR):
-        os.makedirs(SCRAPED_DIR)
-    scraped_files = os.listdir(SCRAPED_DIR)
-    visited = set()
-    pages.clear()
-    for fname in scraped_files:
-        if fname.endswith(".json"):
-            fpath = os.path.join(SCRAPED_DIR, fname)
+    async def parse(curr_url, job):
+        try:
+            if pool is None:
+                status, page_data, write = job()
+            else:
+                status, page_data, write = await asyncio.get_running_loop().run_in_executor(pool, job)
+        except Exception as e:
+            logging.info(f"[ERROR] Failed to parse {curr_url}: {e}")
+            stats["errors"] += 1
+            return
+        finally:
+            backlog.release()
+        stats[status] += 1
+        if write:
+            store.put(page_data)
+        del page_data["text"]
+        scraped[curr_url] = page_data
+        if status == "unchanged":
+            logging.info(f"[UNCHANGED] {curr_url}")
+        else:
+            logging.info(f"[SAVE] {curr_url}")
+        new_links = frontier.extend(page_data["links"])
+        logging.info(f"[LINKS] Found {len(page_data['links'])} links, {new_links} new links "
+                     f"queued. {len(frontier)} pages in queue.")
+
+    connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=per_host)
+    async with aiohttp.ClientSession(
+        connector=connector, timeout=aiohttp.ClientTimeout(total=timeout)
+    ) as session:
+        # Keep up to `concurrency` fetches running; the parse stage feeds
+        # new links back into the frontier as pages are processed
+        in_flight = set()
+        try:
+            while frontier or in_flight or parsing:
+                while frontier and len(in_flight) < concurrency:
+                    in_flight.add(asyncio.create_task(visit(session, frontier.pop())))
+                done, _ = await asyncio.wait(in_flight | parsing,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                in_flight -= done
+                parsing -= done
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+
+    stats["seconds"] = time.perf_counter() - start
+    requests = stats["fetched"] + stats["changed"] + stats["unchanged"]
+    stats["pages_per_sec"] = requests / stats["seconds"] if stats["seconds"] else 0.0
+    logging.info(f"[DONE] Crawl finished. {len(scraped)} total pages visited.")
+    return stats
+
+
+def benchmark(pages=500, links=8, latency=0.02, concurrency=32):
+    """Crawl the synthetic fixture site serially and concurrently."""
+    from fixture_site import start_in_thread
+
+    logging.getLogger().setLevel(logging.WARNING)
+    server, base_url = start_in_thread(port=0, pages=pages, links=links, latency=latency)
+    print(f"Fixture site: {pages} pages, {links} links/page, {latency * 1000:.0f} ms latency")
+    try:
+        for label, kwargs in [
+            ("serial", dict(concurrency=1, per_host=1, parser="bs4", parse_workers=0)),
+            (f"x{concurrency} bs4", dict(parser="bs4", parse_workers=0)),
+            (f"x{concurrency} auto", dict(parse_workers=0)),
+            (f"x{concurrency} bs4 pool", dict(parser="bs4")),
+            (f"x{concurrency} auto pool", dict()),
+        ]:
+            kwargs = {"concurrency": concurrency, "per_host": concurrency, "delay": 0, **kwargs}
+            tmp = tempfile.mkdtemp(prefix="crawl_bench_")
             try:
-                with open(fpath, "r", encoding="utf-8") as f:
-                    page = json.load(f)
-                    visited.add(page["url"])
-                    pages.append(page)
-            except Exception as e:
-                print(f"Warning: Failed to load {fpath}: {e}")
-    print(f"Loaded {len(pages)} previously scraped pages from {SCRAPED_DIR}.")
-    crawl(BASE_URL)
-    print(f"Total unique pages scraped: {len(pages)}.")
+                store = PageStore(os.path.join(tmp, DEFAULT_PATH))
+                stats = asyncio.run(crawl(base_url, store=store, **kwargs))
+            finally:
+                shutil.rmtree(tmp)
+            print(f"  {label:20s} {stats['fetched']} pages in {stats['seconds']:.2f}s "
+                  f"({stats['pages_per_sec']:.1f} pages/sec, {stats['errors']} errors)")
+    finally:
+        server.shutdown()
+
+
+def benchmark_refresh(pages=500, links=8, latency=0.02, concurrency=32):
+    """Full crawl, then a refresh after 10% of the fixture pages changed."""
+    from fixture_site import FixtureHandler, start_in_thread
+
+    logging.getLogger().setLevel(logging.WARNING)
+    server, base_url = start_in_thread(port=0, pages=pages, links=links, latency=latency)
+    tmp = tempfile.mkdtemp(prefix="crawl_bench_")
+    store = PageStore(os.path.join(tmp, DEFAULT_PATH))
+    kwargs = dict(store=store, concurrency=concurrency, per_host=concurrency, delay=0)
+    print(f"Fixture site: {pages} pages, {links} links/page, {latency * 1000:.0f} ms latency")
+    try:
+        stats = asyncio.run(crawl(base_url, **kwargs))
+        full_bytes = FixtureHandler.bytes_sent
+        print(f"  full crawl  {stats['seconds']:.2f}s, {stats['fetched']} pages written, "
+              f"{full_bytes / 1e6:.1f} MB transferred")
+
+        FixtureHandler.version += 1
+        FixtureHandler.bytes_sent = 0
+        stats = asyncio.run(crawl(base_url, refresh=True, **kwargs))
+        print(f"  refresh     {stats['seconds']:.2f}s, {stats['changed']} pages rewritten, "
+              f"{stats['unchanged']} unchanged ({FixtureHandler.not_modified} answered 304), "
+              f"{FixtureHandler.bytes_sent / 1e6:.1f} MB transferred")
+    finally:
+        server.shutdown()
+        shutil.rmtree(tmp)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl the BU research support site")
+    parser.add_argument("--start-url", default=BASE_URL)
+    parser.add_argument("--store", default=DEFAULT_PATH, help="page store (SQLite)")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent fetches")
+    parser.add_argument("--per-host", type=int, default=4, help="max in-flight requests per host")
+    parser.add_argument("--delay", type=float, default=0.25,
+                        help="min seconds between request starts to the same host")
+    parser.add_argument("--parser", default="auto",
+                        help="HTML backend: bs4, lxml, selectolax or auto (fastest installed)")
+    parser.add_argument("--parse-workers", type=int, default=None,
+                        help="processes for parsing (default: one per CPU, 0: in-process)")
+    parser.add_argument("--refresh", action="store_true",
+                        help="revalidate stored pages and rewrite only the changed ones")
+    parser.add_argument("--bench", nargs="?", const="crawl", choices=["crawl", "refresh"],
+                        help="benchmark against fixture_site.py")
+    args = parser.parse_args()
+
+    if args.bench == "crawl":
+        benchmark()
+        return
+    if args.bench == "refresh":
+        benchmark_refresh()
+        return
+
+    store = PageStore(args.store)
+    if not len(store) and os.path.isdir(SCRAPED_DIR):
+        print(f"Imported {store.import_json_dir(SCRAPED_DIR)} pages from {SCRAPED_DIR}/.")
+    scraped = store.index()
+    print(f"Loaded {len(scraped)} previously scraped pages from {args.store}.")
+    stats = asyncio.run(crawl(
+        args.start_url,
+        store=store,
+        concurrency=args.concurrency,
+        per_host=args.per_host,
+        delay=args.delay,
+        scraped=scraped,
+        refresh=args.refresh,
+        parser=args.parser,
+        parse_workers=args.parse_workers,
+    ))
+    print(f"Total unique pages scraped: {len(scraped)} "
+          f"({stats['fetched']} new, {stats['changed']} changed, {stats['unchanged']} "
+          f"unchanged, {stats['removed']} removed this run in {stats['seconds']:.1f}s).")
 
 
 if __name__ == "__main__":
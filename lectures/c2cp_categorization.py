@@ -1,16 +1,57 @@
-from litellm import completion
+from llm_cache import cache_key, completion
 import os
 import dotenv
 import random
+import argparse
+import asyncio
+
+from job_store import JobStore, default_worker_id
+from llm_batch import run_batch
 
 dotenv.load_dotenv()
 
 import json
 
-with open('c2.cp.v2025.1.Hs.json') as f:
-    c2cp = json.load(f)
-
-print(f"{len(c2cp)} gene sets in the database")
+parser = argparse.ArgumentParser(
+    description="Categorize MSigDB C2:CP gene sets with an LLM"
+)
+parser.add_argument("--gmt-json", default="c2.cp.v2025.1.Hs.json")
+parser.add_argument("--model", default="anthropic/claude-4-sonnet-20250514")
+parser.add_argument("-n", "--sample", type=int, default=10,
+                    help="number of random gene sets to categorize (ignored with --all)")
+parser.add_argument("--all", action="store_true", help="categorize every gene set")
+parser.add_argument("--batch", action="store_true",
+                    help="run concurrently with the async batch runner")
+parser.add_argument("--out", default="c2cp_categories.jsonl",
+                    help="JSON Lines output file for --batch")
+parser.add_argument("--concurrency", type=int, default=16, help="max requests in flight")
+parser.add_argument("--rpm", type=float, default=None, help="requests/min limit")
+parser.add_argument("--tpm", type=float, default=None, help="tokens/min limit")
+parser.add_argument("--api-base", default=None,
+                    help="override endpoint, e.g. http://127.0.0.1:8080/v1 for mock_llm_server.py")
+parser.add_argument("--api-key", default=None)
+parser.add_argument("--store", default="c2cp_jobs.sqlite",
+                    help="job store for --batch; completed gene sets are never re-run")
+parser.add_argument("--resume", action="store_true",
+                    help="only work on jobs already in the store (no new sampling); "
+                         "run this in several processes to share the work")
+parser.add_argument("--retry-failed", action="store_true",
+                    help="move failed jobs in the store back to pending first")
+parser.add_argument("--status", action="store_true", help="print job store counts and exit")
+parser.add_argument("--lease", type=float, default=600,
+                    help="seconds before a job claimed by a dead worker is handed out again")
+args = parser.parse_args()
+
+if args.status:
+    for status, n in JobStore(args.store).counts().items():
+        print(f"{status}: {n}")
+    raise SystemExit
+
+if not args.resume:
+    with open(args.gmt_json) as f:
+        c2cp = json.load(f)
+
+    print(f"{len(c2cp)} gene sets in the database")
 
 system_prompt = {
         "content": ("You are an expect at molecular biology and genetics. "
@@ -53,29 +94,98 @@ Make sure to provide a rationale based on the content of the gene set
 description.
 """
 
-gsets = random.sample(list(c2cp.items()), 10)
-
-for k, gset in gsets:
 
+def build_messages(k, gset):
     gset_prompt = user_prompt.format(
             gset_name=k,
             gset=json.dumps(gset)
     )
+    return [
+        system_prompt,
+        {"content": gset_prompt, "role": "user"}
+    ]
 
-    response = completion(
-      model="anthropic/claude-4-sonnet-20250514",
-      messages=[
-          system_prompt,
-          {"content": gset_prompt, "role": "user"}
-      ]
-    )
 
-    resp_json = response['choices'][0]['message']['content']
+def parse_category(k, resp_json, error):
+    """Parse the model's JSON reply into the fields stored per gene set."""
+    if error:
+        return {"category": None, "rationale": None}
     try:
         response = json.loads(resp_json)
-        category = response.get('category')
-        rationale = response.get('rationale')
-        print(f"{category}: {k}, {rationale}")
-    except:
-        print("JSON malform")
-        print(resp_json)
+        return {"category": response.get('category'),
+                "rationale": response.get('rationale')}
+    except (json.JSONDecodeError, TypeError, AttributeError):
+        return {"category": None, "rationale": None, "error": "JSON malform"}
+
+
+completion_kwargs = {}
+if args.api_base:
+    completion_kwargs["api_base"] = args.api_base
+if args.api_key:
+    completion_kwargs["api_key"] = args.api_key
+
+if args.resume:
+    gsets = []
+elif args.all:
+    gsets = list(c2cp.items())
+else:
+    gsets = random.sample(list(c2cp.items()), min(args.sample, len(c2cp)))
+
+if args.batch:
+    # Every gene set is a row in the job store, so an interrupted run resumes
+    # where it stopped and a larger sample only adds the new gene sets.
+    store = JobStore(args.store, lease_seconds=args.lease)
+    if args.retry_failed:
+        print(f"{store.retry_failed()} failed gene sets queued for retry")
+    jobs = []
+    for k, gset in gsets:
+        messages = build_messages(k, gset)
+        jobs.append((k, cache_key(args.model, messages), messages))
+    added = store.add(jobs)
+    print(f"Job store {args.store}: {added['added']} new, {added['changed']} "
+          f"changed, {added['unchanged']} already known; {store.counts()}")
+
+    def record_result(k, resp_json, error):
+        fields = parse_category(k, resp_json, error)
+        if error:
+            store.fail(k, error, resp_json, fields)
+        elif "error" in fields:
+            store.fail(k, fields["error"], resp_json, fields)
+        else:
+            store.complete(k, resp_json, fields)
+        return fields
+
+    worker_id = default_worker_id()
+    print(f"Worker {worker_id}: categorizing with up to {args.concurrency} "
+          f"requests in flight -> {args.out}")
+    stats = asyncio.run(run_batch(
+        store.iter_claims(worker_id, batch_size=args.concurrency),
+        model=args.model,
+        out_path=args.out,
+        max_concurrency=args.concurrency,
+        requests_per_minute=args.rpm,
+        tokens_per_minute=args.tpm,
+        on_result=record_result,
+        **completion_kwargs,
+    ))
+    print(stats.summary())
+    print(f"{stats.throughput:.2f} gene sets/sec")
+    print(f"Job store: {store.counts()}")
+else:
+    for k, gset in gsets:
+
+        response = completion(
+          model=args.model,
+          messages=build_messages(k, gset),
+          **completion_kwargs
+        )
+
+        resp_json = response['choices'][0]['message']['content']
+        try:
+            response = json.loads(resp_json)
+            category = response.get('category')
+            rationale = response.get('rationale')
+            print(f"{category}: {k}, {rationale}")
+        except:
+            print("JSON malform")
+            print(resp_json)
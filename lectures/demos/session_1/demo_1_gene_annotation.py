@@ -5,10 +5,16 @@ This demo shows the iterative improvement of prompts for gene annotation.
 We'll go from a naive prompt to a sophisticated structured output with examples.
 """
 
-from litellm import completion
+import sys
+from pathlib import Path
 import dotenv
 import json
 
+# Shared helpers live in lectures/
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from json_stream import extract_json
+from llm_stream import format_metrics, print_metrics, stream_completion
+
 dotenv.load_dotenv()
 
 # Test gene
@@ -27,15 +33,14 @@ v1_messages = [
     {"role": "user", "content": f"What does the {GENE_SYMBOL} gene do?"}
 ]
 
-response = completion(
-    model="anthropic/claude-sonnet-4-20250514",
-    messages=v1_messages
-)
-
 print("PROMPT:")
 print(v1_messages[0]["content"])
 print("\nRESPONSE:")
-print(response['choices'][0]['message']['content'])
+result = stream_completion(
+    model="anthropic/claude-sonnet-4-20250514",
+    messages=v1_messages
+)
+print(format_metrics(result))
 
 print("\n💡 ISSUES:")
 print("- Unstructured output (hard to parse)")
@@ -64,17 +69,16 @@ v2_messages = [
     }
 ]
 
-response = completion(
-    model="anthropic/claude-sonnet-4-20250514",
-    messages=v2_messages
-)
-
 print("SYSTEM PROMPT:")
 print(v2_messages[0]["content"])
 print("\nUSER PROMPT:")
 print(v2_messages[1]["content"])
 print("\nRESPONSE:")
-print(response['choices'][0]['message']['content'])
+result = stream_completion(
+    model="anthropic/claude-sonnet-4-20250514",
+    messages=v2_messages
+)
+print(format_metrics(result))
 
 print("\n✅ IMPROVEMENTS:")
 print("- More focused on relevant information")
@@ -118,32 +122,25 @@ Annotate the {GENE_SYMBOL} gene. Return ONLY valid JSON in this format:
     }
 ]
 
-response = completion(
+print("USER PROMPT:")
+print(v3_messages[1]["content"])
+print("\nRESPONSE:")
+result = stream_completion(
     model="anthropic/claude-sonnet-4-20250514",
     messages=v3_messages
 )
+print(format_metrics(result))
+response_text = result.text
 
-print("USER PROMPT:")
-print(v3_messages[1]["content"])
-print("\nRESPONSE:")
-response_text = response['choices'][0]['message']['content']
-print(response_text)
-
-# Try to parse the JSON
-try:
-    # Remove potential markdown code fences
-    if "```json" in response_text:
-        response_text = response_text.split("```json")[1].split("```")[0].strip()
-    elif "```" in response_text:
-        response_text = response_text.split("```")[1].split("```")[0].strip()
-    
-    parsed_json = json.loads(response_text)
+# Try to parse the JSON (code fences and surrounding prose are skipped)
+parsed_json = extract_json(response_text)
+if isinstance(parsed_json, dict):
     print("\n✅ JSON PARSED SUCCESSFULLY!")
     print("\nParsed data:")
     for key, value in parsed_json.items():
         print(f"  {key}: {value}")
-except json.JSONDecodeError as e:
-    print(f"\n❌ JSON parsing failed: {e}")
+else:
+    print("\n❌ JSON parsing failed: no JSON object found in response")
 
 print("\n✅ IMPROVEMENTS:")
 print("- Structured, consistent format")
@@ -198,30 +195,24 @@ Gene: BRCA1
     }
 ]
 
-response = completion(
-    model="anthropic/claude-sonnet-4-20250514",
-    messages=v4_messages
-)
-
 print("USER PROMPT (with examples):")
 print(v4_messages[1]["content"])
 print("\nRESPONSE:")
-response_text = response['choices'][0]['message']['content']
-print(response_text)
+result = stream_completion(
+    model="anthropic/claude-sonnet-4-20250514",
+    messages=v4_messages
+)
+print(format_metrics(result))
+response_text = result.text
 
 # Parse JSON
-try:
-    if "```json" in response_text:
-        response_text = response_text.split("```json")[1].split("```")[0].strip()
-    elif "```" in response_text:
-        response_text = response_text.split("```")[1].split("```")[0].strip()
-    
-    parsed_json = json.loads(response_text)
+parsed_json = extract_json(response_text)
+if parsed_json is not None:
     print("\n✅ JSON PARSED SUCCESSFULLY!")
     print("\nParsed data:")
     print(json.dumps(parsed_json, indent=2))
-except json.JSONDecodeError as e:
-    print(f"\n❌ JSON parsing failed: {e}")
+else:
+    print("\n❌ JSON parsing failed: no JSON found in response")
 
 print("\n✅ FINAL IMPROVEMENTS:")
 print("- Consistent format learned from examples")
@@ -238,3 +229,5 @@ print("V3: JSON request → structured, but may vary")
 print("V4: Few-shot → consistent, accurate, structured")
 print("\n💡 Key lesson: Examples > Descriptions")
 print("=" * 80)
+
+print_metrics()
@@ -5,10 +5,16 @@ This demo shows how few-shot learning helps classify DNA regulatory motifs
 by their function, using biological examples to train the model in-context.
 """
 
-from litellm import completion
+import sys
+from pathlib import Path
 import dotenv
 import json
 
+# Shared helpers live in lectures/
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from json_stream import extract_all_json
+from llm_stream import format_metrics, print_metrics, stream_completion
+
 dotenv.load_dotenv()
 
 print("=" * 80)
@@ -54,14 +60,13 @@ Provide classification in JSON format:
 """,
     }
 
-    response = completion(
+    print(f"Motif: {motif}")
+    print("Response:")
+    result = stream_completion(
         model="anthropic/claude-sonnet-4-20250514",
         messages=[system_prompt, user_prompt],
     )
-
-    print(f"Motif: {motif}")
-    print("Response:")
-    print(response["choices"][0]["message"]["content"])
+    print(format_metrics(result))
     print()
 
 print("❌ ISSUES with zero-shot:")
@@ -122,13 +127,22 @@ For each motif, provide the same JSON format as shown in examples.
 """,
 }
 
-response = completion(
+print("RESPONSE:")
+result = stream_completion(
     model="anthropic/claude-sonnet-4-20250514",
     messages=[system_prompt, few_shot_prompt],
 )
+print(format_metrics(result))
 
-print("RESPONSE:")
-print(response["choices"][0]["message"]["content"])
+# One JSON object per motif, whether the model wrote them separately or as an array
+classifications = [
+    item
+    for item in extract_all_json(result.text, unwrap_arrays=True)
+    if isinstance(item, dict)
+]
+print(f"\nParsed {len(classifications)} motif classifications:")
+for item in classifications:
+    print(f"  {item.get('motif', '?')}: {item.get('function', '')}")
 
 print("\n✅ IMPROVEMENTS with few-shot:")
 print("- More specific biological terminology")
@@ -151,11 +165,10 @@ zero_shot_msg = {
     "content": "Classify the TATAAA DNA motif. Return JSON with: motif, function, location, binding_factors.",
 }
 
-response_zero = completion(
+result_zero = stream_completion(
     model="anthropic/claude-sonnet-4-20250514", messages=[system_prompt, zero_shot_msg]
 )
-
-print(response_zero["choices"][0]["message"]["content"])
+print(format_metrics(result_zero))
 
 print("\n" + "-" * 80 + "\n")
 
@@ -190,12 +203,11 @@ Motif: TATAAA
 """,
 }
 
-response_few = completion(
+result_few = stream_completion(
     model="anthropic/claude-sonnet-4-20250514",
     messages=[system_prompt, few_shot_single],
 )
-
-print(response_few["choices"][0]["message"]["content"])
+print(format_metrics(result_few))
 
 print("\n" + "=" * 80)
 print("Summary: Few-Shot Learning Impact")
@@ -208,3 +220,5 @@ print("  - Pattern matching from examples")
 print("\n💡 Key insight: Examples teach the model your specific needs")
 print("   better than lengthy instructions ever could")
 print("=" * 80)
+
+print_metrics()
@@ -5,9 +5,16 @@ This demo extracts structured data from PubMed abstracts using
 chain-of-thought prompting combined with JSON schema enforcement.
 """
 
-from litellm import completion
+import sys
+from pathlib import Path
 import dotenv
 import json
+import time
+
+# Shared helpers live in lectures/
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from json_stream import JsonStreamParser, extract_json
+from llm_stream import format_metrics, print_metrics, stream_completion
 
 dotenv.load_dotenv()
 
@@ -49,27 +56,21 @@ Abstract:
 {ABSTRACT}
 """
 
-response = completion(
+print("Response:")
+result = stream_completion(
     model="anthropic/claude-sonnet-4-20250514",
     messages=[{"role": "user", "content": direct_prompt}],
 )
-
-print("Response:")
-response_text = response["choices"][0]["message"]["content"]
-print(response_text)
+print(format_metrics(result))
+response_text = result.text
 
 # Try to parse
-try:
-    if "```json" in response_text:
-        response_text = response_text.split("```json")[1].split("```")[0].strip()
-    elif "```" in response_text:
-        response_text = response_text.split("```")[1].split("```")[0].strip()
-
-    parsed = json.loads(response_text)
+parsed = extract_json(response_text)
+if parsed is not None:
     print("\n✅ Parsed successfully")
     print(json.dumps(parsed, indent=2))
-except json.JSONDecodeError as e:
-    print(f"\n❌ Parsing failed: {e}")
+else:
+    print("\n❌ Parsing failed: no JSON found in response")
 
 print("\n💭 This works, but might miss nuances or make extraction errors")
 print("   for complex abstracts with multiple findings.")
@@ -122,45 +123,30 @@ Abstract:
 Let's think through this step by step:
 """
 
-response = completion(
+print("Response (with reasoning):")
+result = stream_completion(
     model="anthropic/claude-sonnet-4-20250514",
     messages=[{"role": "user", "content": cot_prompt}],
 )
-
-print("Response (with reasoning):")
-response_text = response["choices"][0]["message"]["content"]
-print(response_text)
+print(format_metrics(result))
+response_text = result.text
 
 # Extract JSON from response
 print("\n" + "=" * 80)
 print("Attempting to parse final JSON...")
 print("=" * 80)
 
-try:
-    # The response might contain reasoning text before the JSON
-    if "```json" in response_text:
-        json_text = response_text.split("```json")[1].split("```")[0].strip()
-    elif "```" in response_text:
-        json_text = response_text.split("```")[1].split("```")[0].strip()
-    else:
-        # Try to find JSON object in text
-        import re
-
-        json_match = re.search(r"\{[\s\S]*\}", response_text)
-        if json_match:
-            json_text = json_match.group()
-        else:
-            json_text = response_text
-
-    parsed = json.loads(json_text)
+# The response contains reasoning text before the JSON; the final JSON
+# value is the answer
+parsed = extract_json(response_text)
+if parsed is not None:
     print("\n✅ Parsed successfully!")
     print("\nExtracted structured data:")
     print(json.dumps(parsed, indent=2))
-
-except json.JSONDecodeError as e:
-    print(f"\n❌ Parsing failed: {e}")
-    print("Raw JSON attempt:")
-    print(json_text if "json_text" in locals() else response_text)
+else:
+    print("\n❌ Parsing failed: no JSON found in response")
+    print("Raw response:")
+    print(response_text)
 
 print("\n✅ ADVANTAGES of Chain-of-Thought:")
 print("  - More thorough extraction")
@@ -221,39 +207,42 @@ Abstracts:
 for i, abstract in enumerate(abstracts, 1):
     batch_prompt += f"\n\nAbstract {i}: {abstract['title']}\n{abstract['text']}"
 
-response = completion(
+# Parse the array while it streams: each abstract's object is available as
+# soon as its closing brace arrives, not after the whole response
+parser = JsonStreamParser(unwrap_arrays=True)
+parsed = []
+completed_at = []
+
+
+def collect(delta: str):
+    for item in parser.feed(delta):
+        if isinstance(item, dict):
+            parsed.append(item)
+            completed_at.append(time.perf_counter())
+
+
+print("Batch extraction results:")
+start = time.perf_counter()
+result = stream_completion(
     model="anthropic/claude-sonnet-4-20250514",
     messages=[{"role": "user", "content": batch_prompt}],
+    on_token=collect,
 )
+print(format_metrics(result))
+for item in parser.close():
+    if isinstance(item, dict):
+        parsed.append(item)
+        completed_at.append(time.perf_counter())
 
-print("Batch extraction results:")
-response_text = response["choices"][0]["message"]["content"]
-print(response_text)
-
-# Parse the array
-try:
-    if "```json" in response_text:
-        json_text = response_text.split("```json")[1].split("```")[0].strip()
-    elif "```" in response_text:
-        json_text = response_text.split("```")[1].split("```")[0].strip()
-    else:
-        import re
-
-        json_match = re.search(r"\[[\s\S]*\]", response_text)
-        if json_match:
-            json_text = json_match.group()
-        else:
-            json_text = response_text
-
-    parsed = json.loads(json_text)
+if parsed:
     print("\n✅ Batch parsing successful!")
     print("\nExtracted from", len(parsed), "abstracts:")
-    for i, item in enumerate(parsed, 1):
-        print(f"\nAbstract {i}:")
+    for i, (item, done) in enumerate(zip(parsed, completed_at), 1):
+        ready = done - start
+        print(f"\nAbstract {i} (ready at {ready:.2f}s of {result.total:.2f}s):")
         print(json.dumps(item, indent=2))
-
-except json.JSONDecodeError as e:
-    print(f"\n❌ Parsing failed: {e}")
+else:
+    print("\n❌ Parsing failed: no JSON objects found in response")
 
 print("\n" + "=" * 80)
 print("Summary: Literature Extraction Best Practices")
@@ -265,3 +254,5 @@ print("✅ Make reasoning explicit ('step by step')")
 print("✅ Handle missing fields gracefully (null values)")
 print("\n💡 Real-world application: Automated systematic reviews")
 print("=" * 80)
+
+print_metrics()
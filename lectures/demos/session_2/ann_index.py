@@ -0,0 +1,291 @@
+"""
+Approximate nearest neighbor (HNSW) settings for the paper index, and a
+recall-vs-latency benchmark against exact search.
+
+ChromaDB searches every collection with an HNSW graph, but the demo left
+its parameters (and the distance, L2) at the defaults. The knobs:
+
+- M (`max_neighbors`): graph links per vector. More links: higher recall,
+  more memory, slower builds.
+- ef_construction: candidate list size while building. Higher: a better
+  graph, slower builds.
+- ef_search: candidate list size per query. The recall/latency dial;
+  unlike the other two it can be changed on an existing collection.
+
+`hnsw_configuration()` turns these into a ChromaDB collection configuration
+(cosine distance, so `1 - distance` is the cosine similarity the demo
+prints). `open_collection(..., hnsw=...)` in rag_index.py applies it and
+rebuilds a persistent index when a build parameter changes. The demo reads
+them from PAPER_QA_HNSW_M, PAPER_QA_HNSW_EF_CONSTRUCTION and
+PAPER_QA_HNSW_EF_SEARCH.
+
+For corpora too large to keep float32 vectors in memory,
+`ProductQuantizer` compresses each vector to `m` one-byte codes (384 dims:
+1536 bytes -> 48 bytes at m=48) and searches the codes with asymmetric
+distance tables, optionally re-scoring the best candidates exactly.
+
+The benchmark builds an hnswlib graph (the library under ChromaDB's index)
+over synthetic clustered unit vectors and measures recall@k and query
+latency for several ef_search values against brute-force search:
+
+    python ann_index.py --bench                          # 1M x 128
+    python ann_index.py --bench --vectors 200000 --dim 384 --pq-m 48
+"""
+
+import argparse
+import os
+import time
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+try:
+    import hnswlib
+except ImportError:  # only the benchmark and HnswIndex need it
+    hnswlib = None
+
+HNSW_DEFAULTS = {"space": "cosine", "M": 16, "ef_construction": 200, "ef_search": 64}
+BUILD_PARAMS = ("space", "M", "ef_construction")
+
+
+def hnsw_params(**overrides) -> Dict:
+    """HNSW_DEFAULTS with any non-None overrides applied."""
+    return {**HNSW_DEFAULTS, **{k: v for k, v in overrides.items() if v is not None}}
+
+
+def hnsw_from_env() -> Dict:
+    """HNSW parameters from PAPER_QA_HNSW_* environment variables."""
+    env = {
+        "M": os.environ.get("PAPER_QA_HNSW_M"),
+        "ef_construction": os.environ.get("PAPER_QA_HNSW_EF_CONSTRUCTION"),
+        "ef_search": os.environ.get("PAPER_QA_HNSW_EF_SEARCH"),
+    }
+    return hnsw_params(**{k: int(v) for k, v in env.items() if v})
+
+
+def hnsw_configuration(params: Dict) -> Dict:
+    """ChromaDB `configuration=` for a collection with these HNSW parameters."""
+    return {
+        "hnsw": {
+            "space": params["space"],
+            "max_neighbors": params["M"],
+            "ef_construction": params["ef_construction"],
+            "ef_search": params["ef_search"],
+        }
+    }
+
+
+def set_ef_search(collection, ef_search: int):
+    """Change the query-time candidate list size of an existing collection."""
+    collection.modify(configuration={"hnsw": {"ef_search": ef_search}})
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def exact_knn(data: np.ndarray, queries: np.ndarray, k: int, block: int = 65536) -> np.ndarray:
+    """Brute-force top-k ids by inner product (cosine on unit vectors), in row blocks."""
+    best_ids = np.zeros((len(queries), 0), dtype=np.int64)
+    best_scores = np.zeros((len(queries), 0), dtype=np.float32)
+    for start in range(0, len(data), block):
+        scores = queries @ data[start:start + block].T
+        top = np.argpartition(-scores, min(k, scores.shape[1]) - 1, axis=1)[:, :k]
+        best_scores = np.hstack([best_scores, np.take_along_axis(scores, top, axis=1)])
+        best_ids = np.hstack([best_ids, top + start])
+        keep = np.argsort(-best_scores, axis=1)[:, :k]
+        best_scores = np.take_along_axis(best_scores, keep, axis=1)
+        best_ids = np.take_along_axis(best_ids, keep, axis=1)
+    return best_ids
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found.tolist(), truth.tolist()))
+    return hits / truth.size
+
+
+class HnswIndex:
+    """Thin hnswlib wrapper: the same HNSW parameters outside ChromaDB."""
+
+    def __init__(self, dim: int, max_elements: int, params: Optional[Dict] = None, threads: int = -1):
+        if hnswlib is None:
+            raise ImportError("HnswIndex needs hnswlib (pip install hnswlib)")
+        self.params = hnsw_params(**(params or {}))
+        space = {"cosine": "cosine", "l2": "l2", "ip": "ip"}[self.params["space"]]
+        self.index = hnswlib.Index(space=space, dim=dim)
+        self.index.init_index(max_elements=max_elements, M=self.params["M"],
+                              ef_construction=self.params["ef_construction"])
+        self.index.set_ef(self.params["ef_search"])
+        self.index.set_num_threads(threads if threads > 0 else os.cpu_count() or 1)
+
+    def add(self, vectors: np.ndarray, ids: Optional[Sequence[int]] = None):
+        start = self.index.get_current_count()
+        ids = np.arange(start, start + len(vectors)) if ids is None else np.asarray(ids)
+        self.index.add_items(vectors, ids)
+
+    def set_ef_search(self, ef_search: int):
+        self.params["ef_search"] = ef_search
+        self.index.set_ef(ef_search)
+
+    def search(self, queries: np.ndarray, k: int) -> np.ndarray:
+        ids, _ = self.index.knn_query(queries, k=k)
+        return ids.astype(np.int64)
+
+    def memory_bytes(self) -> int:
+        n, dim, m = self.index.get_current_count(), self.index.dim, self.params["M"]
+        # vectors plus ~2M level-0 links of 4 bytes each (upper levels are small)
+        return n * (dim * 4 + 2 * m * 4)
+
+
+class ProductQuantizer:
+    """
+    Product quantization: split vectors into `m` sub-vectors and replace each
+    by the id of its nearest of 256 centroids learned with k-means.
+    """
+
+    def __init__(self, m: int = 48, iterations: int = 15, seed: int = 0):
+        self.m = m
+        self.iterations = iterations
+        self.seed = seed
+        self.codebooks = None  # (m, 256, dim / m)
+
+    def train(self, sample: np.ndarray):
+        n, dim = sample.shape
+        if dim % self.m:
+            raise ValueError(f"dim {dim} is not divisible by m={self.m}")
+        sub = dim // self.m
+        rng = np.random.default_rng(self.seed)
+        self.codebooks = np.zeros((self.m, 256, sub), dtype=np.float32)
+        for j in range(self.m):
+            x = sample[:, j * sub:(j + 1) * sub]
+            centroids = x[rng.choice(n, 256, replace=n < 256)].copy()
+            for _ in range(self.iterations):
+                assign = self._nearest(x, centroids)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, assign, x)
+                counts = np.bincount(assign, minlength=256)
+                filled = counts > 0
+                centroids[filled] = sums[filled] / counts[filled, None]
+            self.codebooks[j] = centroids
+        return self
+
+    @staticmethod
+    def _nearest(x: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        d = (x * x).sum(1)[:, None] - 2 * x @ centroids.T + (centroids * centroids).sum(1)[None, :]
+        return d.argmin(axis=1)
+
+    def encode(self, vectors: np.ndarray, block: int = 65536) -> np.ndarray:
+        sub = self.codebooks.shape[2]
+        codes = np.empty((len(vectors), self.m), dtype=np.uint8)
+        for start in range(0, len(vectors), block):
+            x = vectors[start:start + block]
+            for j in range(self.m):
+                codes[start:start + block, j] = self._nearest(x[:, j * sub:(j + 1) * sub], self.codebooks[j])
+        return codes
+
+    def search(self, codes: np.ndarray, query: np.ndarray, k: int,
+               rerank: Optional[np.ndarray] = None, candidates: int = 100) -> np.ndarray:
+        """
+        Top-k ids by approximate inner product from the codes. With
+        `rerank` (the original vectors, e.g. a memory-mapped file) the best
+        `candidates` are re-scored exactly.
+        """
+        sub = self.codebooks.shape[2]
+        # table[j, c] = <query sub-vector j, centroid c>
+        table = np.einsum("jcs,js->jc", self.codebooks, query.reshape(self.m, sub))
+        scores = np.zeros(len(codes), dtype=np.float32)
+        for j in range(self.m):
+            scores += table[j][codes[:, j]]
+        n = candidates if rerank is not None else k
+        top = np.argpartition(-scores, min(n, len(scores)) - 1)[:n]
+        if rerank is not None:
+            exact = rerank[np.sort(top)] @ query
+            top = np.sort(top)[np.argsort(-exact)]
+        else:
+            top = top[np.argsort(-scores[top])]
+        return top[:k]
+
+
+def synthetic_vectors(n: int, dim: int, clusters: int = 1000, seed: int = 0,
+                      block: int = 100_000) -> np.ndarray:
+    """Unit vectors scattered around `clusters` random centers, like topic-clustered chunks."""
+    rng = np.random.default_rng(seed)
+    centers = normalize(rng.standard_normal((clusters, dim), dtype=np.float32))
+    data = np.empty((n, dim), dtype=np.float32)
+    for start in range(0, n, block):
+        size = min(block, n - start)
+        noise = rng.standard_normal((size, dim), dtype=np.float32) * (1.2 / np.sqrt(dim))
+        data[start:start + size] = normalize(centers[rng.integers(clusters, size=size)] + noise)
+    return data
+
+
+def benchmark(n: int = 1_000_000, dim: int = 128, queries: int = 200, k: int = 10,
+              M: int = 16, ef_construction: int = 200,
+              ef_values: Sequence[int] = (10, 20, 40, 80, 160, 320), pq_m: int = 0):
+    print(f"{n} synthetic vectors x {dim} dims, {queries} queries, recall@{k}")
+    data = synthetic_vectors(n, dim)
+    rng = np.random.default_rng(1)
+    query_vectors = normalize(data[rng.integers(n, size=queries)]
+                              + rng.standard_normal((queries, dim), dtype=np.float32) * 0.05)
+
+    start = time.perf_counter()
+    truth = exact_knn(data, query_vectors, k)
+    exact_ms = (time.perf_counter() - start) / queries * 1000
+    # a single query at a time, as rag_query() issues them
+    start = time.perf_counter()
+    for q in query_vectors[:20]:
+        exact_knn(data, q[None, :], k)
+    exact_single_ms = (time.perf_counter() - start) / 20 * 1000
+    print(f"  exact (brute force)   {exact_single_ms:8.2f} ms/query "
+          f"({exact_ms:.2f} ms/query batched), {data.nbytes / 1e6:.0f} MB of vectors")
+
+    if hnswlib is not None:
+        start = time.perf_counter()
+        index = HnswIndex(dim, n, {"M": M, "ef_construction": ef_construction})
+        index.add(data)
+        build = time.perf_counter() - start
+        print(f"  HNSW M={M} ef_construction={ef_construction}: built in {build:.0f}s, "
+              f"~{index.memory_bytes() / 1e6:.0f} MB")
+        print(f"  {'ef_search':>9} {'recall':>7} {'ms/query':>9} {'speedup':>8}")
+        for ef in ef_values:
+            index.set_ef_search(max(ef, k))
+            start = time.perf_counter()
+            found = np.vstack([index.search(q[None, :], k) for q in query_vectors])
+            ms = (time.perf_counter() - start) / queries * 1000
+            print(f"  {ef:9d} {recall_at_k(found, truth):7.3f} {ms:9.3f} {exact_single_ms / ms:7.0f}x")
+        del index
+    else:
+        print("  (hnswlib not installed: skipping HNSW)")
+
+    if pq_m:
+        start = time.perf_counter()
+        pq = ProductQuantizer(pq_m).train(data[rng.choice(n, min(n, 20_000), replace=False)])
+        codes = pq.encode(data)
+        print(f"  PQ m={pq_m}: trained and encoded in {time.perf_counter() - start:.0f}s, "
+              f"{codes.nbytes / 1e6:.0f} MB of codes ({data.nbytes // codes.nbytes}x smaller)")
+        for rerank, label in ((None, "codes only"), (data, "re-rank top 100")):
+            start = time.perf_counter()
+            found = np.vstack([pq.search(codes, q, k, rerank=rerank) for q in query_vectors])
+            ms = (time.perf_counter() - start) / queries * 1000
+            print(f"  PQ {label:16s} recall {recall_at_k(found, truth):.3f}, {ms:.2f} ms/query")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HNSW recall/latency benchmark")
+    parser.add_argument("--bench", action="store_true")
+    parser.add_argument("--vectors", type=int, default=1_000_000)
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--M", type=int, default=HNSW_DEFAULTS["M"])
+    parser.add_argument("--ef-construction", type=int, default=HNSW_DEFAULTS["ef_construction"])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[10, 20, 40, 80, 160, 320])
+    parser.add_argument("--pq-m", type=int, default=0, help="also benchmark PQ with m sub-vectors")
+    args = parser.parse_args()
+    if args.bench:
+        benchmark(args.vectors, args.dim, args.queries, args.k, args.M,
+                  args.ef_construction, args.ef_search, args.pq_m)
+    else:
+        parser.print_help()
@@ -0,0 +1,380 @@
+"""
+Semantic answer cache for the paper Q&A RAG pipeline.
+
+In a workshop many attendees ask nearly the same question ("What sequencing
+methods were used?"), and without a cache each one pays for retrieval and
+a full completion. `SemanticAnswerCache` keeps recent answers with their
+sources and question embeddings:
+
+- a question whose normalized text was answered before is a hit without an
+  embedding call
+- otherwise the question is embedded and compared (cosine) with cached
+  questions; the best one above `threshold` is a hit, provided both name
+  the same identifiers and numbers (gene symbols, platforms, years), so
+  "SVs in CYP2D6?" never returns the answer about HBA1
+- entries expire after `ttl` seconds and the least recently used entry is
+  dropped beyond `max_entries`
+- every entry belongs to one collection version (see
+  `rag_index.collection_version`); when the collection is re-synced the
+  version changes and the whole cache is invalidated
+
+    cache = SemanticAnswerCache(embed_fn, version_fn=lambda: collection_version(collection))
+    lookup = cache.lookup(question)
+    if lookup.hit:
+        return lookup.hit.answer, lookup.hit.sources
+    ...retrieve with lookup.embedding, generate...
+    cache.store(lookup, answer, sources, seconds=elapsed)
+
+Benchmark (a simulated workshop against a local mock LLM):
+
+    python answer_cache.py --bench --questions 200
+"""
+
+import argparse
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from hybrid_search import identifier_terms
+
+DEFAULT_THRESHOLD = 0.92
+DEFAULT_TTL = 3600.0
+DEFAULT_MAX_ENTRIES = 1000
+
+_WORDS = re.compile(r"\w+")
+_NUMBERS = re.compile(r"\b\d+(?:\.\d+)?\b")
+
+
+def normalize_question(question: str) -> str:
+    """Case, punctuation and spacing removed: the exact-match key."""
+    return " ".join(_WORDS.findall(question.lower()))
+
+
+def key_terms(question: str) -> frozenset:
+    """Identifiers and numbers that must agree for two questions to share an answer."""
+    return frozenset(identifier_terms(question)) | frozenset(_NUMBERS.findall(question))
+
+
+@dataclass
+class CachedAnswer:
+    question: str
+    answer: str
+    sources: List[Dict]
+    version: str
+    terms: frozenset
+    seconds: float = 0.0  # what producing the answer cost
+    created: float = field(default_factory=time.time)
+    hits: int = 0
+
+
+@dataclass
+class Lookup:
+    """Result of `lookup()`; pass it back to `store()` after a miss."""
+
+    question: str
+    key: str
+    version: str
+    embedding: Optional[List[float]] = None
+    hit: Optional[CachedAnswer] = None
+    match: Optional[str] = None  # "exact" or "semantic"
+    similarity: float = 0.0
+
+
+class SemanticAnswerCache:
+    """In-memory LRU + TTL cache of answers, keyed by question embedding."""
+
+    def __init__(
+        self,
+        embed_fn: Optional[Callable[[List[str]], List[List[float]]]] = None,
+        version_fn: Callable[[], str] = lambda: "",
+        threshold: float = DEFAULT_THRESHOLD,
+        ttl: float = DEFAULT_TTL,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        version_check_interval: float = 0.0,
+    ):
+        self.embed_fn = embed_fn
+        self.version_fn = version_fn
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.version_check_interval = version_check_interval
+        self.version: Optional[str] = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        # slot -> entry in LRU order; question vectors live in row `slot` of _matrix
+        self._entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()
+        self._exact: Dict[str, int] = {}
+        self._keys: Dict[int, str] = {}
+        self._matrix: Optional[np.ndarray] = None
+        self._has_vector = np.zeros(max_entries, dtype=bool)
+        self._free = list(range(max_entries - 1, -1, -1))
+        self.counts = dict.fromkeys(
+            ["lookups", "exact_hits", "semantic_hits", "misses", "term_mismatches",
+             "expired", "evicted", "invalidations", "stored"], 0)
+        self.saved_seconds = 0.0
+
+    def _check_version(self):
+        """Drop every entry if the collection changed (at most one check per interval)."""
+        now = time.monotonic()
+        if self.version is not None and now - self._checked < self.version_check_interval:
+            return
+        self._checked = now
+        version = self.version_fn()
+        if version != self.version:
+            if self._entries:
+                self.counts["invalidations"] += 1
+                self._clear_locked()
+            self.version = version
+
+    def _remove(self, slot: int):
+        self._entries.pop(slot, None)
+        key = self._keys.pop(slot)
+        if self._exact.get(key) == slot:
+            del self._exact[key]
+        self._has_vector[slot] = False
+        self._free.append(slot)
+
+    def _alive(self, slot: int, now: float) -> bool:
+        if now - self._entries[slot].created > self.ttl:
+            self._remove(slot)
+            self.counts["expired"] += 1
+            return False
+        return True
+
+    def _hit(self, lookup: Lookup, slot: int, match: str, similarity: float) -> Lookup:
+        entry = self._entries[slot]
+        self._entries.move_to_end(slot)
+        entry.hits += 1
+        self.counts[f"{match}_hits"] += 1
+        self.saved_seconds += entry.seconds
+        lookup.hit, lookup.match, lookup.similarity = entry, match, similarity
+        return lookup
+
+    def lookup(self, question: str, embedding: Optional[List[float]] = None) -> Lookup:
+        """
+        Find a cached answer for `question`. `embedding` skips the embedding
+        call when the caller already has one; without either an `embed_fn`
+        or an embedding only exact (normalized) repeats can hit.
+        """
+        key = normalize_question(question)
+        with self._lock:
+            self._check_version()
+            self.counts["lookups"] += 1
+            lookup = Lookup(question, key, self.version, embedding)
+            now = time.time()
+            slot = self._exact.get(key)
+            if slot is not None and self._alive(slot, now):
+                return self._hit(lookup, slot, "exact", 1.0)
+            has_vectors = self._has_vector.any()
+
+        # Embedded even with nothing to compare yet: store() and retrieval reuse it
+        if embedding is None and self.embed_fn is not None:
+            lookup.embedding = self.embed_fn([question])[0]
+        if lookup.embedding is None or not has_vectors:
+            with self._lock:
+                self.counts["misses"] += 1
+            return lookup
+
+        q = np.asarray(lookup.embedding, dtype=np.float32)
+        q /= np.linalg.norm(q) or 1.0
+        terms = key_terms(question)
+        with self._lock:
+            if self._matrix is not None and self.version == lookup.version:
+                scores = self._matrix @ q
+                scores[~self._has_vector] = -np.inf
+                for slot in np.argsort(-scores):
+                    slot = int(slot)
+                    if scores[slot] < self.threshold:
+                        break
+                    if not self._alive(slot, now):
+                        continue
+                    if self._entries[slot].terms != terms:
+                        self.counts["term_mismatches"] += 1
+                        continue
+                    return self._hit(lookup, slot, "semantic", float(scores[slot]))
+            self.counts["misses"] += 1
+        return lookup
+
+    def store(self, lookup: Lookup, answer: str, sources: List[Dict], seconds: float = 0.0):
+        """Cache the answer to a missed lookup (ignored if the collection changed meanwhile)."""
+        with self._lock:
+            self._check_version()
+            if lookup.hit is not None or lookup.version != self.version:
+                return
+            if lookup.key in self._exact:
+                self._remove(self._exact[lookup.key])
+            if not self._free:
+                self._remove(next(iter(self._entries)))  # least recently used
+                self.counts["evicted"] += 1
+            slot = self._free.pop()
+            self._entries[slot] = CachedAnswer(lookup.question, answer, sources, lookup.version,
+                                               key_terms(lookup.question), seconds)
+            self._exact[lookup.key] = slot
+            self._keys[slot] = lookup.key
+            if lookup.embedding is not None:
+                v = np.asarray(lookup.embedding, dtype=np.float32)
+                if self._matrix is None:
+                    self._matrix = np.zeros((self.max_entries, len(v)), dtype=np.float32)
+                self._matrix[slot] = v / (np.linalg.norm(v) or 1.0)
+                self._has_vector[slot] = True
+            self.counts["stored"] += 1
+
+    def _clear_locked(self):
+        for slot in list(self._entries):
+            self._remove(slot)
+
+    def clear(self):
+        with self._lock:
+            self._clear_locked()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            hits = self.counts["exact_hits"] + self.counts["semantic_hits"]
+            lookups = self.counts["lookups"]
+            return dict(self.counts, entries=len(self._entries), version=self.version,
+                        hit_rate=hits / lookups if lookups else 0.0,
+                        saved_seconds=self.saved_seconds)
+
+    def format_stats(self) -> str:
+        s = self.stats()
+        return (f"answer cache: {s['hit_rate']:.0%} hit rate ({s['exact_hits']} exact, "
+                f"{s['semantic_hits']} semantic, {s['misses']} misses), {s['entries']} entries, "
+                f"{s['invalidations']} invalidations, ~{s['saved_seconds']:.1f}s of generation saved")
+
+
+class _HashingEmbedder:
+    """Hashed word and word-pair counts: a lexical stand-in for a sentence embedding model."""
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def __call__(self, texts: List[str]) -> List[List[float]]:
+        import zlib
+
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = [w for w in _WORDS.findall(text.lower()) if len(w) > 2 or w.isdigit()]
+            for gram in words + [" ".join(p) for p in zip(words, words[1:])]:
+                vectors[row, zlib.crc32(gram.encode("utf-8")) % self.dim] += 1.0
+        return vectors.tolist()
+
+
+# Paraphrases per intent; the CYP2D6 / HBA1 pair checks the identifier guard
+WORKSHOP_QUESTIONS = {
+    "methods": ["What sequencing methods were used?", "What sequencing methods were used in these studies?",
+                "Which sequencing methods were used in the studies?", "what sequencing methods were used"],
+    "variants": ["How many variants were identified per individual?",
+                 "How many variants were identified in each individual?",
+                 "How many variants per individual were identified?"],
+    "long_read": ["What are the advantages of long-read sequencing?",
+                  "What advantages does long-read sequencing have?",
+                  "What are the main advantages of long-read sequencing?"],
+    "platforms": ["Which sequencing platforms were used?", "Which sequencing platforms were used in the papers?",
+                  "which sequencing platforms were used?"],
+    "cyp2d6": ["Were structural variants found in CYP2D6?", "Were any structural variants found in CYP2D6?"],
+    "hba1": ["Were structural variants found in HBA1?", "Were any structural variants found in HBA1?"],
+}
+
+
+def benchmark(n_questions: int = 200, threshold: float = 0.8, latency: float = 0.15,
+              prefill: float = 0.1, resync_at: float = 0.5):
+    import random
+    import sys
+    from pathlib import Path
+
+    import chromadb
+    import litellm
+    from chromadb.config import Settings
+
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))  # lectures/mock_llm_server.py
+    import mock_llm_server
+    from rag_index import collection_version, sync_chunks
+    from rag_ingest import synthetic_chunks
+    from rag_prompt import assemble_context
+
+    try:
+        from local_embedder import OnnxEmbedder
+
+        embed_fn, embedder = OnnxEmbedder(), "local ONNX model"
+    except (FileNotFoundError, ImportError):
+        embed_fn, embedder = _HashingEmbedder(), "hashed bag-of-words embedder (no model installed)"
+
+    server = mock_llm_server.serve(port=0, latency=latency, jitter=0.0, prefill=prefill)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    completion = {"model": "openai/mock", "api_key": "mock",
+                  "api_base": f"http://127.0.0.1:{server.server_address[1]}/v1"}
+
+    client = chromadb.Client(Settings(anonymized_telemetry=False, is_persistent=False))
+    collection = client.create_collection("bench_answer_cache", configuration={"hnsw": {"space": "cosine"}})
+    chunks = synthetic_chunks(2000)
+    sync_chunks(collection, chunks, embed_fn=embed_fn, verbose=False)
+
+    rng = random.Random(0)
+    intents = list(WORKSHOP_QUESTIONS)
+    workload = []
+    for _ in range(n_questions):
+        intent = rng.choice(intents)
+        workload.append((intent, rng.choice(WORKSHOP_QUESTIONS[intent])))
+
+    def run(cache: Optional[SemanticAnswerCache]):
+        timings, wrong, calls = {"hit": [], "miss": []}, 0, 0
+        for i, (intent, question) in enumerate(workload):
+            if cache is not None and i == int(len(workload) * resync_at):
+                # Re-ingest one edited chunk halfway through: the version changes
+                chunks[0] = dict(chunks[0], text=chunks[0]["text"] + " (erratum)")
+                sync_chunks(collection, chunks, embed_fn=embed_fn, verbose=False)
+            start = time.perf_counter()
+            lookup = cache.lookup(question) if cache is not None else None
+            if lookup is not None and lookup.hit:
+                wrong += lookup.hit.sources[0]["intent"] != intent
+                timings["hit"].append(time.perf_counter() - start)
+                continue
+            embedding = lookup.embedding if lookup and lookup.embedding else embed_fn([question])[0]
+            results = collection.query(query_embeddings=[embedding], n_results=5)
+            prompt, _ = assemble_context(question, results["documents"][0], results["metadatas"][0],
+                                         model="openai/mock")
+            response = litellm.completion(messages=[{"role": "user", "content": prompt}], **completion)
+            calls += 1
+            elapsed = time.perf_counter() - start
+            timings["miss"].append(elapsed)
+            if cache is not None:
+                sources = [dict(m, intent=intent) for m in results["metadatas"][0]]
+                cache.store(lookup, response.choices[0].message.content, sources, elapsed)
+        return timings, wrong, calls
+
+    print(f"{n_questions} workshop questions over {len(intents)} intents, {embedder}, "
+          f"threshold {threshold}; mock LLM {latency * 1000:.0f} ms + {prefill * 1000:.0f} ms/1k tokens")
+    for name, cache in (("no cache", None),
+                        ("answer cache", SemanticAnswerCache(
+                            embed_fn, lambda: collection_version(collection), threshold=threshold))):
+        start = time.perf_counter()
+        timings, wrong, calls = run(cache)
+        wall = time.perf_counter() - start
+        p50 = {k: sorted(v)[len(v) // 2] * 1000 if v else 0.0 for k, v in timings.items()}
+        print(f"  {name:12s} {wall:6.1f}s total, {calls} LLM calls, miss p50 {p50['miss']:.0f} ms, "
+              f"hit p50 {p50['hit']:.2f} ms, wrong answers {wrong}")
+        if cache is not None:
+            print(f"  {cache.format_stats()}; {cache.counts['term_mismatches']} near matches "
+                  f"rejected for different identifiers")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Semantic answer cache")
+    parser.add_argument("--bench", action="store_true", help="simulated workshop vs a mock LLM")
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--threshold", type=float, default=0.8,
+                        help="cosine threshold (the default embedder is lexical; use "
+                             f"{DEFAULT_THRESHOLD} with sentence embeddings)")
+    parser.add_argument("--latency", type=float, default=0.15, help="mock LLM seconds per call")
+    args = parser.parse_args()
+
+    if args.bench:
+        benchmark(args.questions, args.threshold, args.latency)
+    else:
+        parser.print_help()
@@ -0,0 +1,353 @@
+"""
+Structure-aware chunking of parsed papers for the paper Q&A index.
+
+One chunk per section makes a long methods section one huge embedding and a
+three-sentence abstract its own index slot. `chunk_paper()` instead:
+
+1. keeps section boundaries (a chunk never spans two sections)
+2. splits each section into sentences, without breaking on "et al.",
+   "Fig.", "e.g.", decimals like "2.5" or gene names like "p.V600E"
+3. packs whole sentences into windows of at most `max_tokens` tokens
+   (`rag_ingest.count_tokens`), repeating the last `overlap` tokens' worth
+   of sentences at the start of the next window, and merging a trailing
+   window shorter than `min_tokens` into the one before it
+4. records paper/section metadata plus the chunk's position
+   (`chunk_index`), character offsets in the section (`start_char`,
+   `end_char`) and size (`tokens`), so a retrieved chunk can be traced
+   back to its source
+
+`chunk_papers()` streams papers through a process pool and yields chunks in
+paper order. `ChunkStats` collects the chunk-size histogram and throughput.
+
+    chunks = list(chunk_papers(papers, max_tokens=256, overlap=32, processes=4))
+
+Benchmark (synthetic papers; section-per-chunk vs sentence windows):
+
+    python chunker.py --bench --papers 2000 --processes 1 4
+"""
+
+import argparse
+import bisect
+import os
+import random
+import re
+import time
+from functools import partial
+from multiprocessing import Pool
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from rag_ingest import count_tokens
+
+DEFAULT_MAX_TOKENS = 256
+DEFAULT_OVERLAP = 32
+DEFAULT_MIN_TOKENS = 32
+PAPER_FIELDS = ("title", "authors", "year")
+HISTOGRAM_BINS = (32, 64, 128, 256, 512, 1024, 2048)
+
+# A sentence ends at . ! or ? (optionally followed by a closing quote or
+# bracket) before whitespace and an upper-case letter, digit or bracket
+_BOUNDARY = re.compile(r"""[.!?]["')\]]*\s+(?=["'(\[]?[A-Z0-9])""")
+_ABBREVIATIONS = {
+    "al", "fig", "figs", "eq", "eqs", "ref", "refs", "e.g", "i.e", "vs", "cf", "approx",
+    "ca", "no", "nos", "vol", "dr", "mr", "mrs", "ms", "prof", "sp", "spp", "suppl", "tab",
+    "st", "resp", "min", "max", "incl", "etc",
+}
+_LAST_WORD = re.compile(r"(\S+)\s*$")
+_WORD = re.compile(r"\S+")
+
+
+def split_sentences(text: str) -> List[Tuple[int, int]]:
+    """(start, end) character spans of the sentences in `text`, whitespace trimmed."""
+    spans, start = [], 0
+    for match in _BOUNDARY.finditer(text):
+        word = _LAST_WORD.search(text, start, match.start() + 1)
+        token = word.group(1).rstrip(".!?\"')]").lstrip("(\"'[").lower() if word else ""
+        # "et al. Smith", "Fig. 2", "e.g. BWA" and initials ("J. Smith") do not end a sentence
+        if token in _ABBREVIATIONS or (len(token) == 1 and token.isalpha()):
+            continue
+        spans.append((start, match.start() + 1))
+        start = match.end()
+    spans.append((start, len(text)))
+    trimmed = []
+    for begin, end in spans:
+        segment = text[begin:end]
+        stripped = segment.strip()
+        if stripped:
+            begin += len(segment) - len(segment.lstrip())
+            trimmed.append((begin, begin + len(stripped)))
+    return trimmed
+
+
+def _split_long(text: str, span: Tuple[int, int], max_tokens: int) -> List[Tuple[int, int]]:
+    """Cut a sentence longer than `max_tokens` into word-aligned pieces that fit."""
+    words = [(m.start() + span[0], m.end() + span[0]) for m in _WORD.finditer(text, *span)]
+    pieces, first = [], 0
+    while first < len(words):
+        # Longest run of words from `first` within the budget (at least one word)
+        low, high = first + 1, len(words)
+        while low < high:
+            mid = (low + high + 1) // 2
+            if count_tokens(text[words[first][0]:words[mid - 1][1]]) <= max_tokens:
+                low = mid
+            else:
+                high = mid - 1
+        pieces.append((words[first][0], words[low - 1][1]))
+        first = low
+    return pieces
+
+
+def _tokens(text: str, sentences: List[Tuple[int, int]], first: int, last: int) -> int:
+    return count_tokens(text[sentences[first][0]:sentences[last - 1][1]])
+
+
+def window_spans(
+    text: str,
+    max_tokens: int = DEFAULT_MAX_TOKENS,
+    overlap: int = DEFAULT_OVERLAP,
+    min_tokens: int = DEFAULT_MIN_TOKENS,
+) -> List[Tuple[int, int]]:
+    """(start, end) character spans of the sentence windows for one section."""
+    sentences, sizes = [], []
+    for span in split_sentences(text):
+        tokens = count_tokens(text[span[0]:span[1]])
+        if tokens > max_tokens:
+            for piece in _split_long(text, span, max_tokens):
+                sentences.append(piece)
+                sizes.append(count_tokens(text[piece[0]:piece[1]]))
+        else:
+            sentences.append(span)
+            sizes.append(tokens)
+    if not sentences:
+        return []
+
+    windows = []  # [first sentence, last sentence + 1)
+    first = 0
+    while first < len(sentences):
+        last, used = first, 0
+        while last < len(sentences) and (last == first or used + sizes[last] <= max_tokens):
+            used += sizes[last]
+            last += 1
+        # Sentence counts are not exactly additive (separators, merges across them)
+        while last - first > 1 and _tokens(text, sentences, first, last) > max_tokens:
+            last -= 1
+        windows.append([first, last])
+        if last == len(sentences):
+            break
+        # Start the next window with the trailing sentences that fit in `overlap`
+        # (always advancing by at least one sentence)
+        back, carried = last, 0
+        while back - 1 > first and carried + sizes[back - 1] <= overlap:
+            back -= 1
+            carried += sizes[back]
+        first = back
+
+    if len(windows) > 1 and sum(sizes[windows[-1][0]:windows[-1][1]]) < min_tokens:
+        tail = windows.pop()
+        if _tokens(text, sentences, windows[-1][0], tail[1]) <= max_tokens:
+            windows[-1][1] = tail[1]
+        else:
+            windows.append(tail)
+    return [(sentences[a][0], sentences[b - 1][1]) for a, b in windows]
+
+
+def chunk_paper(
+    paper: Dict,
+    max_tokens: int = DEFAULT_MAX_TOKENS,
+    overlap: int = DEFAULT_OVERLAP,
+    min_tokens: int = DEFAULT_MIN_TOKENS,
+) -> List[Dict]:
+    """
+    Chunks (id/text/metadata) for a paper dict with `id`, `sections`
+    ({name: text}) and the `PAPER_FIELDS`.
+    """
+    chunks = []
+    for section_name, section_text in paper["sections"].items():
+        for index, (start, end) in enumerate(window_spans(section_text, max_tokens, overlap, min_tokens)):
+            chunks.append({
+                "id": f"{paper['id']}_{section_name}_{index}",
+                "text": section_text[start:end],
+                "metadata": {
+                    "paper_id": paper["id"],
+                    **{field: paper[field] for field in PAPER_FIELDS if field in paper},
+                    "section": section_name,
+                    "chunk_index": index,
+                    "start_char": start,
+                    "end_char": end,
+                    "tokens": count_tokens(section_text[start:end]),
+                },
+            })
+    return chunks
+
+
+def chunk_papers(
+    papers: Iterable[Dict],
+    max_tokens: int = DEFAULT_MAX_TOKENS,
+    overlap: int = DEFAULT_OVERLAP,
+    min_tokens: int = DEFAULT_MIN_TOKENS,
+    processes: int = 1,
+    stats: Optional["ChunkStats"] = None,
+) -> Iterator[Dict]:
+    """
+    Chunks of each paper in order, as a stream. With `processes > 1` papers
+    are chunked in a worker pool while earlier results are consumed.
+    """
+    chunk_one = partial(chunk_paper, max_tokens=max_tokens, overlap=overlap, min_tokens=min_tokens)
+    if stats is not None:
+        stats.start()
+    if processes <= 1:
+        results, pool = map(chunk_one, papers), None
+    else:
+        pool = Pool(processes)
+        results = pool.imap(chunk_one, papers, chunksize=16)
+    try:
+        for paper_chunks in results:
+            if stats is not None:
+                stats.add(paper_chunks)
+            yield from paper_chunks
+    finally:
+        if pool is not None:
+            pool.terminate()
+        if stats is not None:
+            stats.stop()
+
+
+class ChunkStats:
+    """Chunk counts, token-size histogram and throughput of a chunking run."""
+
+    def __init__(self, bins: Sequence[int] = HISTOGRAM_BINS):
+        self.bins = list(bins)
+        self.counts = [0] * (len(self.bins) + 1)
+        self.papers = self.chunks = self.tokens = self.chars = 0
+        self.sizes: List[int] = []
+        self.seconds = 0.0
+        self._started = None
+
+    def start(self):
+        self._started = time.perf_counter()
+
+    def stop(self):
+        if self._started is not None:
+            self.seconds += time.perf_counter() - self._started
+            self._started = None
+
+    def add(self, chunks: List[Dict]):
+        self.papers += 1
+        for chunk in chunks:
+            tokens = chunk["metadata"].get("tokens") or count_tokens(chunk["text"])
+            self.chunks += 1
+            self.tokens += tokens
+            self.chars += len(chunk["text"])
+            self.sizes.append(tokens)
+            self.counts[bisect.bisect_left(self.bins, tokens)] += 1
+
+    def percentile(self, q: float) -> int:
+        ordered = sorted(self.sizes)
+        return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))] if ordered else 0
+
+    def summary(self) -> Dict:
+        seconds = self.seconds or float("nan")
+        return {
+            "papers": self.papers,
+            "chunks": self.chunks,
+            "tokens": self.tokens,
+            "p50_tokens": self.percentile(50),
+            "p95_tokens": self.percentile(95),
+            "max_tokens": max(self.sizes, default=0),
+            "seconds": self.seconds,
+            "papers_per_sec": self.papers / seconds,
+            "chunks_per_sec": self.chunks / seconds,
+            "mb_per_sec": self.chars / 1e6 / seconds,
+        }
+
+    def format_histogram(self, width: int = 40) -> str:
+        labels = [f"<= {b}" for b in self.bins] + [f"> {self.bins[-1]}"]
+        peak = max(self.counts) or 1
+        return "\n".join(
+            f"  {label:>8s} tokens {count:8d} {'#' * round(width * count / peak)}"
+            for label, count in zip(labels, self.counts)
+        )
+
+
+def section_chunks(paper: Dict) -> List[Dict]:
+    """The previous scheme: one chunk per section."""
+    return [{"id": f"{paper['id']}_{name}", "text": text.strip(),
+             "metadata": {"paper_id": paper["id"], "section": name}}
+            for name, text in paper["sections"].items()]
+
+
+_TEMPLATES = [
+    "We sequenced {n} samples on the {platform} platform at {x}x mean coverage.",
+    "Reads were aligned to GRCh38 with {aligner} and variants were called with {caller}.",
+    "As reported by Smith et al. in {year}, {gene} mutations were enriched in the cohort (Fig. {fig}).",
+    "Expression of {gene} differed between clusters (p < 0.{p}; see Suppl. Table {fig}).",
+    "Samples with fewer than {n} reads, e.g. failed libraries, were removed before analysis.",
+    "The {gene} p.V600E variant was detected in {x}% of tumors, vs. {fig}% in controls.",
+    "Cells were clustered with Seurat and annotated using known markers such as {gene} and CD{fig}.",
+    "Pathway enrichment identified {n} significant gene sets after FDR correction.",
+]
+_SECTION_SENTENCES = {"abstract": (3, 6), "introduction": (8, 20), "methods": (30, 120),
+                      "results": (20, 80), "discussion": (10, 30)}
+
+
+def synthetic_papers(n: int, seed: int = 0) -> Iterator[Dict]:
+    """Parsed-paper dicts with realistic sentence mixes and section lengths."""
+    rng = random.Random(seed)
+    for i in range(n):
+        sections = {}
+        for name, (low, high) in _SECTION_SENTENCES.items():
+            sentences = [rng.choice(_TEMPLATES).format(
+                n=rng.randint(10, 5000), platform=rng.choice(["NovaSeq", "PacBio", "ONT"]),
+                x=rng.randint(5, 95), aligner=rng.choice(["BWA", "minimap2"]),
+                caller=rng.choice(["GATK", "DeepVariant"]), year=rng.randint(2010, 2024),
+                gene=rng.choice(["BRCA1", "TP53", "KRAS", "EGFR", "CYP2D6", "HBA1"]),
+                fig=rng.randint(1, 9), p=rng.randint(1, 49),
+            ) for _ in range(rng.randint(low, high))]
+            sections[name] = "\n" + " ".join(sentences) + "\n"
+        yield {"id": f"paper{i}", "title": f"Synthetic paper {i}", "authors": "Bench et al.",
+               "year": 2015 + i % 10, "sections": sections}
+
+
+def benchmark(n_papers: int, processes: Sequence[int], max_tokens: int, overlap: int, min_tokens: int):
+    print(f"{n_papers} synthetic papers, windows of <= {max_tokens} tokens, {overlap} overlap, "
+          f"tail merge < {min_tokens}")
+
+    baseline = ChunkStats()
+    baseline.start()
+    for paper in synthetic_papers(n_papers):
+        baseline.add(section_chunks(paper))
+    baseline.stop()
+    print("\nOne chunk per section:")
+    print(baseline.format_histogram())
+
+    for count in processes:
+        stats = ChunkStats()
+        for _ in chunk_papers(synthetic_papers(n_papers), max_tokens, overlap, min_tokens,
+                              processes=count, stats=stats):
+            pass
+        if count == processes[0]:
+            print("\nSentence windows:")
+            print(stats.format_histogram())
+            print(f"\n  {'scheme':18s} {'chunks':>8s} {'tokens':>10s} {'p50':>5s} {'p95':>5s} "
+                  f"{'max':>6s}")
+            for name, s in (("section", baseline.summary()), ("sentence windows", stats.summary())):
+                print(f"  {name:18s} {s['chunks']:8d} {s['tokens']:10d} {s['p50_tokens']:5d} "
+                      f"{s['p95_tokens']:5d} {s['max_tokens']:6d}")
+            print(f"\n  {'processes':>9s} {'papers/s':>9s} {'chunks/s':>9s} {'MB/s':>6s}")
+        s = stats.summary()
+        print(f"  {count:9d} {s['papers_per_sec']:9.0f} {s['chunks_per_sec']:9.0f} {s['mb_per_sec']:6.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sentence-window chunking for paper ingestion")
+    parser.add_argument("--bench", action="store_true", help="chunk-size histograms and throughput")
+    parser.add_argument("--papers", type=int, default=2000)
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--max-tokens", type=int, default=DEFAULT_MAX_TOKENS)
+    parser.add_argument("--overlap", type=int, default=DEFAULT_OVERLAP)
+    parser.add_argument("--min-tokens", type=int, default=DEFAULT_MIN_TOKENS)
+    args = parser.parse_args()
+
+    if args.bench:
+        benchmark(args.papers, args.processes, args.max_tokens, args.overlap, args.min_tokens)
+    else:
+        parser.print_help()
@@ -5,14 +5,29 @@ This demo builds a simple RAG system to answer questions about
 genomics research papers.
 """
 
-from litellm import completion, embedding
 import chromadb
 from chromadb.config import Settings
 import dotenv
 import os
+import sys
+import time
+from pathlib import Path
 from typing import List, Dict
 import uuid
 
+# Shared helpers live in lectures/
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from llm_stream import format_metrics, print_metrics, stream_completion
+
+from ann_index import hnsw_from_env
+from answer_cache import DEFAULT_THRESHOLD, SemanticAnswerCache
+from chunker import DEFAULT_MAX_TOKENS, DEFAULT_OVERLAP, ChunkStats, chunk_papers
+from hybrid_search import BM25Index, HybridRetriever
+from metadata_index import ChromaFilteredSearch, MetadataIndex
+from rag_index import collection_version, open_collection, resolve_embedder, save_manifest, sync_chunks
+from rag_prompt import assemble_context
+from reranker import DEFAULT_CANDIDATES, load_reranker
+
 dotenv.load_dotenv()
 
 print("=" * 80)
@@ -130,27 +145,24 @@ papers = [
 
 print("\n--- Step 1: Chunking Papers ---\n")
 
-chunks = []
-for paper in papers:
-    for section_name, section_text in paper["sections"].items():
-        chunk = {
-            "id": f"{paper['id']}_{section_name}",
-            "text": section_text.strip(),
-            "metadata": {
-                "paper_id": paper["id"],
-                "title": paper["title"],
-                "authors": paper["authors"],
-                "year": paper["year"],
-                "section": section_name,
-            },
-        }
-        chunks.append(chunk)
+# Each section is split on sentence boundaries into windows of at most
+# PAPER_QA_CHUNK_TOKENS tokens, overlapping by PAPER_QA_CHUNK_OVERLAP tokens
+# (see chunker.py). These sample sections are short, so each fits in one chunk.
+chunk_stats = ChunkStats()
+chunks = list(chunk_papers(
+    papers,
+    max_tokens=int(os.environ.get("PAPER_QA_CHUNK_TOKENS", DEFAULT_MAX_TOKENS)),
+    overlap=int(os.environ.get("PAPER_QA_CHUNK_OVERLAP", DEFAULT_OVERLAP)),
+    stats=chunk_stats,
+))
 
 print(f"Created {len(chunks)} chunks from {len(papers)} papers")
 print("\nExample chunk:")
 print(f"ID: {chunks[0]['id']}")
 print(f"Section: {chunks[0]['metadata']['section']}")
 print(f"Text preview: {chunks[0]['text'][:100]}...")
+print("\nChunk sizes:")
+print(chunk_stats.format_histogram(width=20))
 
 input("\n[Press Enter to continue to Step 2: Embeddings...]")
 
@@ -160,44 +172,77 @@ input("\n[Press Enter to continue to Step 2: Embeddings...]")
 
 print("\n--- Step 2: Generating Embeddings & Storing in Vector DB ---\n")
 
-# Initialize ChromaDB (in-memory for demo)
-client = chromadb.Client(Settings(anonymized_telemetry=False, is_persistent=False))
+# Initialize ChromaDB. In-memory by default; set PAPER_QA_DB=<dir> to keep a
+# persistent index that only re-embeds new or changed chunks on later runs.
+PERSIST_DIR = os.environ.get("PAPER_QA_DB")
+
+# Note: Using text-embedding-ada-002 as an example. Set
+# PAPER_QA_EMBED_MODEL=local to embed on CPU with the ONNX engine in
+# local_embedder.py (no network). If the remote model is unavailable the
+# local engine is used, then ChromaDB's default embedder as a last resort.
+EMBED_MODEL = os.environ.get("PAPER_QA_EMBED_MODEL", "text-embedding-ada-002")
+embed_fn, embedding_model = resolve_embedder(EMBED_MODEL)
 
-# Create collection
-collection = client.create_collection(
-    name="genomics_papers", metadata={"description": "Genomics research papers"}
+
+# HNSW graph parameters (cosine distance); override with PAPER_QA_HNSW_M,
+# PAPER_QA_HNSW_EF_CONSTRUCTION and PAPER_QA_HNSW_EF_SEARCH. See ann_index.py.
+HNSW = hnsw_from_env()
+
+# A persistent index built with another embedding model or HNSW graph is only
+# deleted and re-embedded with PAPER_QA_REBUILD=1; otherwise this is an error.
+collection, manifest = open_collection(
+    PERSIST_DIR, "genomics_papers", embedding_model=embedding_model, hnsw=HNSW,
+    rebuild=bool(os.environ.get("PAPER_QA_REBUILD")),
 )
 
 print("Generating embeddings for chunks...")
 
-# For this demo, we'll use a simple embedding approach
-# In production, use sentence-transformers or similar
-for i, chunk in enumerate(chunks):
-    print(f"  Processing chunk {i + 1}/{len(chunks)}: {chunk['id']}")
-
-    # Generate embedding using litellm
-    # Note: Using text-embedding-ada-002 as an example
-    # You may want to use open-source alternatives like sentence-transformers
-    try:
-        response = embedding(model="text-embedding-ada-002", input=[chunk["text"]])
-        embed = response["data"][0]["embedding"]
-    except Exception as e:
-        print(f"    Warning: Using mock embedding due to: {e}")
-        # Fallback: Use ChromaDB's default embedding function
-        embed = None  # ChromaDB will generate one
-
-    # Add to collection
-    collection.add(
-        ids=[chunk["id"]],
-        documents=[chunk["text"]],
-        metadatas=[chunk["metadata"]],
-        embeddings=[embed] if embed else None,
-    )
+# Chunks are embedded in token-budgeted batches (one embedding() call per
+# batch) and written with one bulk upsert per batch. Chunks whose content
+# hash is already stored are skipped, and chunks no longer present are deleted.
+sync_summary = sync_chunks(collection, chunks, embed_fn=embed_fn)
+if PERSIST_DIR:
+    save_manifest(PERSIST_DIR, manifest, collection)
 
 print(f"\n✅ Indexed {len(chunks)} chunks in vector database")
+print(f"   Embedding model: {embedding_model}")
+print(f"   {sync_summary['added']} added, {sync_summary['updated']} updated, "
+      f"{sync_summary['deleted']} deleted, {sync_summary['unchanged']} unchanged")
 print(f"   Collection: {collection.name}")
+print(f"   HNSW: M={HNSW['M']}, ef_construction={HNSW['ef_construction']}, "
+      f"ef_search={HNSW['ef_search']} ({HNSW['space']})")
 print(f"   Total items: {collection.count()}")
 
+# Keyword index over the same chunks: exact terms (gene symbols, platform
+# names) are looked up here, and fused with the vector ranking otherwise.
+bm25 = BM25Index.from_collection(collection)
+retriever = HybridRetriever(collection, bm25, embed_fn=embed_fn)
+print(f"   BM25 index: {len(bm25)} chunks, {len(bm25.postings)} terms")
+
+# Secondary indexes on paper_id / year / section / authors resolve where=
+# filters to chunk IDs before the vector search (see metadata_index.py)
+metadata_index = MetadataIndex.from_collection(collection)
+filtered_search = ChromaFilteredSearch(collection, metadata_index, embed_fn=embed_fn)
+
+# Answers to repeated or paraphrased questions are served from a cache tied
+# to the collection version (PAPER_QA_CACHE_THRESHOLD sets the cosine cutoff)
+answer_cache = SemanticAnswerCache(
+    embed_fn,
+    version_fn=lambda: collection_version(collection),
+    threshold=float(os.environ.get("PAPER_QA_CACHE_THRESHOLD", DEFAULT_THRESHOLD)),
+)
+
+# Optional cross-encoder reranking (PAPER_QA_RERANK=1, needs a local ONNX
+# cross-encoder, see reranker.py): retrieve PAPER_QA_RERANK_CANDIDATES chunks
+# and keep the best top_k; skipped when PAPER_QA_RERANK_BUDGET seconds would be exceeded
+reranker = None
+if os.environ.get("PAPER_QA_RERANK"):
+    budget = os.environ.get("PAPER_QA_RERANK_BUDGET")
+    reranker = load_reranker(
+        candidates=int(os.environ.get("PAPER_QA_RERANK_CANDIDATES", DEFAULT_CANDIDATES)),
+        budget=float(budget) if budget else None,
+    )
+
 input("\n[Press Enter to continue to Step 3: Query...]")
 
 # ============================================================================
@@ -207,58 +252,78 @@ input("\n[Press Enter to continue to Step 3: Query...]")
 print("\n--- Step 3: Querying the RAG System ---\n")
 
 
+LLM_MODEL = "anthropic/claude-sonnet-4-20250514"
+
+
 def rag_query(question: str, top_k: int = 3) -> str:
     """
     Perform a RAG query: retrieve relevant chunks and generate answer.
     """
     print(f"Question: {question}\n")
-
-    # Retrieve relevant chunks
-    print(f"Searching for top-{top_k} relevant chunks...")
-    results = collection.query(query_texts=[question], n_results=top_k)
+    start = time.perf_counter()
+
+    lookup = answer_cache.lookup(question)
+    if lookup.hit:
+        cached = lookup.hit
+        print(f"Answer cache hit ({lookup.match}, similarity {lookup.similarity:.3f}) "
+              f"for: {cached.question}")
+        for source in cached.sources:
+            print(f"    Source: {source['title']} - {source['section']}")
+        print("\n" + "-" * 80)
+        print("ANSWER (cached):")
+        print(cached.answer)
+        print(answer_cache.format_stats())
+        return cached.answer
+
+    # Retrieve relevant chunks: exact-term lookup if the question names a
+    # known symbol, otherwise vector + BM25 rankings fused with RRF
+    candidates = reranker.candidates if reranker is not None else top_k
+    print(f"Searching for top-{candidates} relevant chunks...")
+    results = retriever.retrieve(question, top_k=candidates, embedding=lookup.embedding)
+
+    # Rescore the wider candidate set with the cross-encoder and keep top_k
+    if reranker is not None:
+        results = reranker.rerank(question, results, top_n=top_k)
+        if results["reranked"]:
+            print(f"Reranked {results['candidates']} candidates in "
+                  f"{results['rerank_seconds'] * 1000:.0f} ms")
+        elif results["candidates"] > 1:
+            print(f"Reranking skipped (over the {reranker.budget * 1000:.0f} ms budget)")
 
     # Display retrieved chunks
-    print(f"\nRetrieved {len(results['documents'][0])} chunks:")
-    for i, (doc, metadata, distance) in enumerate(
-        zip(results["documents"][0], results["metadatas"][0], results["distances"][0]),
+    print(f"\nRetrieved {len(results['documents'])} chunks ({results['route']} route):")
+    for i, (doc, metadata, score) in enumerate(
+        zip(results["documents"], results["metadatas"], results["scores"]),
         1,
     ):
         print(f"\n  Chunk {i}:")
         print(f"    Paper: {metadata['title']}")
         print(f"    Section: {metadata['section']}")
-        print(f"    Similarity: {1 - distance:.3f}")
+        print(f"    Score: {score:.3f}")
         print(f"    Text: {doc[:150]}...")
 
-    # Build augmented context
-    context_parts = [
-        "You are a genomics research expert. Answer based on the provided paper excerpts. Cite sources.\n"
-    ]
-    context_parts.append("Retrieved Information:\n")
-
-    for i, (doc, metadata) in enumerate(
-        zip(results["documents"][0], results["metadatas"][0]), 1
-    ):
-        context_parts.append(
-            f"\n[Source {i}] {metadata['title']} ({metadata['authors']}, {metadata['year']}) - {metadata['section'].title()}:"
-        )
-        context_parts.append(doc)
-
-    context_parts.append(f"\n\nQuestion: {question}")
-    context_parts.append(
-        "\nAnswer based on the sources above. Include citations like [Source 1]."
+    # Build augmented context: numbered, cited excerpts + the question, with
+    # near-duplicate passages dropped and the rest packed into a token budget
+    full_context, packing = assemble_context(
+        question, results["documents"], results["metadatas"], model=LLM_MODEL
     )
+    print(f"\nPrompt: {packing['tokens']} tokens, {packing['passages']} of "
+          f"{packing['retrieved']} passages ({packing['duplicates']} duplicates, "
+          f"{packing['over_budget']} over budget)")
 
-    full_context = "\n".join(context_parts)
-
-    # Generate answer
+    # Generate answer, printing tokens as they stream in
     print("\nGenerating answer with LLM...")
-    response = completion(
-        model="anthropic/claude-sonnet-4-20250514",
+    print("\n" + "-" * 80)
+    print("ANSWER:")
+    result = stream_completion(
+        model=LLM_MODEL,
         messages=[{"role": "user", "content": full_context}],
     )
+    print(format_metrics(result))
 
-    answer = response["choices"][0]["message"]["content"]
-    return answer
+    sources = [{"title": m["title"], "section": m["section"]} for m in results["metadatas"]]
+    answer_cache.store(lookup, result.text, sources, seconds=time.perf_counter() - start)
+    return result.text
 
 
 # Example queries
@@ -266,18 +331,20 @@ queries = [
     "What sequencing methods were used in these studies?",
     "How many variants were identified per individual?",
     "What are the advantages of long-read sequencing?",
+    "Which medically relevant genes like CYP2D6 had structural variants?",
+    "Which sequencing methods were used in these studies?",  # answered from the cache
 ]
 
 for query in queries:
     print("\n" + "=" * 80)
     answer = rag_query(query, top_k=3)
-    print("\n" + "-" * 80)
-    print("ANSWER:")
-    print(answer)
     print("=" * 80)
 
     input("\n[Press Enter for next question...]")
 
+if reranker is not None:
+    print(reranker.format_stats())
+
 # ============================================================================
 # Step 4: Demonstrate metadata filtering
 # ============================================================================
@@ -287,13 +354,13 @@ print("\n--- Step 4: Metadata Filtering ---\n")
 print("Query with metadata filter: Only papers from 2023\n")
 
 question = "What sequencing platforms were used?"
-results = collection.query(
-    query_texts=[question],
+results = filtered_search.query(
+    question,
     n_results=5,
     where={"year": 2023},  # Filter by year
 )
 
-print(f"Retrieved {len(results['documents'][0])} chunks from 2023:")
+print(f"Retrieved {len(results['documents'][0])} chunks from 2023 ({results['plan']}):")
 for doc, metadata in zip(results["documents"][0], results["metadatas"][0]):
     print(f"\n  - {metadata['title']} ({metadata['year']})")
     print(f"    Section: {metadata['section']}")
@@ -304,6 +371,7 @@ print("Summary: RAG Pipeline Demonstrated")
 print("=" * 80)
 print("✅ Indexed 3 papers with 12 chunks")
 print("✅ Generated embeddings for semantic search")
+print("✅ Resolved exact terms (gene symbols) with a BM25 keyword index")
 print("✅ Retrieved relevant chunks based on queries")
 print("✅ Augmented context with retrieved information")
 print("✅ Generated answers with source citations")
@@ -311,3 +379,5 @@ print("✅ Applied metadata filtering")
 print("\n💡 Key advantage: Can scale to thousands of papers without")
 print("   exceeding context window limits")
 print("=" * 80)
+
+print_metrics()
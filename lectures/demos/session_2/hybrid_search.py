@@ -0,0 +1,397 @@
+"""
+Hybrid keyword + vector retrieval for the paper Q&A index.
+
+Embedding similarity alone misses exact-term questions: a gene symbol
+(`HBA1`, `CYP2D6`) or a platform name (`NovaSeq`) carries little meaning
+for the embedding model, so the chunk that names it may not rank at all.
+This module keeps a BM25 inverted index over the same chunks as the
+Chroma collection and retrieves in two ways:
+
+- term pre-filter: if the question contains identifier-like terms (digits,
+  inner capitals or all caps: HBA1, NovaSeq, GATK) that the index knows,
+  the chunks containing all of them are ranked by BM25 and returned
+  directly, without an embedding call or a vector search
+- hybrid: otherwise the vector search and BM25 each produce a candidate
+  list and the two rankings are merged with reciprocal rank fusion (RRF),
+  score(d) = sum over lists of 1 / (rrf_k + rank of d)
+
+    bm25 = BM25Index.from_collection(collection)
+    retriever = HybridRetriever(collection, bm25, embed_fn=embed_fn)
+    hits = retriever.retrieve("Which SVs were found in CYP2D6?", top_k=3)
+    hits["route"], hits["ids"], hits["documents"], hits["metadatas"], hits["scores"]
+
+Benchmark (latency per route and hit rate, synthetic corpus):
+
+    python hybrid_search.py --bench --chunks 50000
+"""
+
+import argparse
+import math
+import re
+import time
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:[.+\-][a-z0-9]+)*\+?")
+_WORD = re.compile(r"[A-Za-z0-9][A-Za-z0-9.+\-]*")
+_IDENTIFIER = re.compile(r"(?=.*[A-Za-z])(?=.*\d)|[a-z][A-Z]|^[A-Z]{2,}")
+STOPWORDS = frozenset(
+    "a about an and are as at be by did do does for from had has have how in is it its "
+    "of on or that the their these this those to used using was were what when where "
+    "which who why with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased terms; hyphenated compounds also yield their parts (bwa-mem -> bwa, mem)."""
+    terms = []
+    for term in _TOKEN.findall(text.lower()):
+        if term in STOPWORDS:
+            continue
+        terms.append(term)
+        if "-" in term:
+            terms.extend(part for part in term.split("-") if part and part not in STOPWORDS)
+    return terms
+
+
+def identifier_terms(question: str) -> List[str]:
+    """Terms that look like symbols rather than words: HBA1, CYP2D6, NovaSeq, GATK."""
+    terms = []
+    for word in _WORD.findall(question):
+        word = word.rstrip(".-")
+        if not word.isdigit() and _IDENTIFIER.search(word):
+            terms.extend(tokenize(word)[:1])
+    return terms
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[str]], rrf_k: int = 60
+) -> List[Tuple[str, float]]:
+    """Merge ranked id lists; ids ranked high by several lists come first."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(scores.items(), key=lambda item: -item[1])
+
+
+class BM25Index:
+    """
+    In-memory inverted index: term -> {chunk row: term frequency}.
+
+    Chunk texts and metadata are kept alongside, so keyword-only results
+    need no round trip to the collection.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.ids: List[str] = []
+        self.documents: List[str] = []
+        self.metadatas: List[Dict] = []
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self._lengths: List[int] = []
+        self._norm: Optional[np.ndarray] = None  # k1 * (1 - b + b * len / avg len), per row
+        self._arrays: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}  # posting as (rows, tf)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, ids: Iterable[str], documents: Iterable[str], metadatas: Iterable[Dict]):
+        for chunk_id, text, metadata in zip(ids, documents, metadatas):
+            row = len(self.ids)
+            self.ids.append(chunk_id)
+            self.documents.append(text)
+            self.metadatas.append(metadata or {})
+            terms = tokenize(text)
+            self._lengths.append(len(terms))
+            for term, tf in Counter(terms).items():
+                self.postings.setdefault(term, {})[row] = tf
+        self._norm = None
+        self._arrays.clear()
+
+    @classmethod
+    def from_collection(cls, collection, page_size: int = 5000, **kwargs) -> "BM25Index":
+        """Index every chunk stored in a Chroma collection."""
+        index = cls(**kwargs)
+        offset = 0
+        while True:
+            page = collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+            index.add(page["ids"], page["documents"], page["metadatas"])
+            if len(page["ids"]) < page_size:
+                return index
+            offset += page_size
+
+    @classmethod
+    def from_chunks(cls, chunks: Iterable[Dict], **kwargs) -> "BM25Index":
+        index = cls(**kwargs)
+        chunks = list(chunks)
+        index.add([c["id"] for c in chunks], [c["text"] for c in chunks],
+                  [c["metadata"] for c in chunks])
+        return index
+
+    def _length_norm(self) -> np.ndarray:
+        if self._norm is None:
+            lengths = np.asarray(self._lengths, dtype=np.float32)
+            average = lengths.mean() if len(lengths) else 1.0
+            self._norm = self.k1 * (1 - self.b + self.b * lengths / (average or 1.0))
+        return self._norm
+
+    def idf(self, term: str) -> float:
+        df = len(self.postings.get(term, ()))
+        return math.log(1 + (len(self.ids) - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, top_k: int = 10,
+               rows: Optional[Iterable[int]] = None) -> List[Tuple[int, float]]:
+        """(row, BM25 score) pairs, best first; `rows` limits scoring to those chunks."""
+        norm = self._length_norm()
+        terms = [t for t in set(tokenize(query)) if t in self.postings]
+        if rows is not None:
+            rows = list(rows)
+            scores = dict.fromkeys(rows, 0.0)
+            for term in terms:
+                idf, posting = self.idf(term), self.postings[term]
+                for row in rows:
+                    tf = posting.get(row)
+                    if tf:
+                        scores[row] += idf * tf * (self.k1 + 1) / (tf + norm[row])
+            return sorted(scores.items(), key=lambda item: -item[1])[:top_k]
+
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        for term in terms:
+            if term not in self._arrays:
+                posting = self.postings[term]
+                self._arrays[term] = (
+                    np.fromiter(posting.keys(), dtype=np.int64, count=len(posting)),
+                    np.fromiter(posting.values(), dtype=np.float32, count=len(posting)),
+                )
+            hit, tf = self._arrays[term]
+            scores[hit] += self.idf(term) * tf * (self.k1 + 1) / (tf + norm[hit])
+        matched = np.flatnonzero(scores)
+        if len(matched) > top_k:
+            matched = matched[np.argpartition(-scores[matched], top_k - 1)[:top_k]]
+        matched = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(int(row), float(scores[row])) for row in matched]
+
+    def exact_rows(self, question: str, max_rows: int = 100) -> Optional[List[int]]:
+        """
+        Rows containing every identifier term of the question, or None when
+        the question has none, one is unknown to the index (a typo or a
+        term only the embedding can place), or too many chunks match.
+        """
+        terms = identifier_terms(question)
+        if not terms or any(t not in self.postings for t in terms):
+            return None
+        postings = sorted((self.postings[t] for t in set(terms)), key=len)
+        rows = set(postings[0])
+        for posting in postings[1:]:
+            rows.intersection_update(posting)
+        if not rows or len(rows) > max_rows:
+            return None
+        return list(rows)
+
+
+class HybridRetriever:
+    """Term pre-filter, then BM25 + vector search fused with RRF."""
+
+    def __init__(
+        self,
+        collection,
+        bm25: BM25Index,
+        embed_fn: Optional[Callable[[List[str]], List[List[float]]]] = None,
+        candidates: int = 20,
+        rrf_k: int = 60,
+        max_exact: int = 100,
+    ):
+        self.collection = collection
+        self.bm25 = bm25
+        self.embed_fn = embed_fn
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+        self.max_exact = max_exact
+
+    def _hits(self, route: str, ranked: List[Tuple[str, float]], found: Dict) -> Dict:
+        return {
+            "route": route,
+            "ids": [doc_id for doc_id, _ in ranked],
+            "documents": [found[doc_id][0] for doc_id, _ in ranked],
+            "metadatas": [found[doc_id][1] for doc_id, _ in ranked],
+            "scores": [score for _, score in ranked],
+        }
+
+    def _keyword_hits(self, route: str, ranked_rows: List[Tuple[int, float]]) -> Dict:
+        bm25 = self.bm25
+        found = {bm25.ids[row]: (bm25.documents[row], bm25.metadatas[row]) for row, _ in ranked_rows}
+        return self._hits(route, [(bm25.ids[row], score) for row, score in ranked_rows], found)
+
+    def vector(self, question: str, n_results: int, embedding: Optional[List[float]] = None) -> Dict:
+        if embedding is not None:
+            query = {"query_embeddings": [embedding]}
+        elif self.embed_fn is None:
+            query = {"query_texts": [question]}
+        else:
+            query = {"query_embeddings": self.embed_fn([question])}
+        return self.collection.query(**query, n_results=n_results,
+                                     include=["documents", "metadatas", "distances"])
+
+    def retrieve(self, question: str, top_k: int = 3, route: str = "auto",
+                 embedding: Optional[List[float]] = None) -> Dict:
+        """
+        `route="auto"` tries the term pre-filter, then hybrid; "hybrid",
+        "keyword" and "vector" force one path (for comparisons). A given
+        `embedding` of the question saves the embedding call.
+        """
+        if route in ("auto", "exact"):
+            rows = self.bm25.exact_rows(question, self.max_exact)
+            if rows is not None:
+                return self._keyword_hits("exact", self.bm25.search(question, top_k, rows))
+        if route == "keyword":
+            return self._keyword_hits("keyword", self.bm25.search(question, top_k))
+
+        depth = max(self.candidates, top_k)
+        results = self.vector(question, top_k if route == "vector" else depth, embedding)
+        if route == "vector":
+            found = {doc_id: (doc, metadata) for doc_id, doc, metadata in
+                     zip(results["ids"][0], results["documents"][0], results["metadatas"][0])}
+            similarities = [1 - d for d in results["distances"][0]]
+            return self._hits("vector", list(zip(results["ids"][0], similarities)), found)
+        return self._fuse(question, results, 0, top_k)
+
+    def _fuse(self, question: str, results: Dict, i: int, top_k: int) -> Dict:
+        """RRF of the `i`-th vector ranking in `results` with the BM25 ranking."""
+        vector_ids = results["ids"][i]
+        found = {doc_id: (doc, metadata) for doc_id, doc, metadata in
+                 zip(vector_ids, results["documents"][i], results["metadatas"][i])}
+        keyword_rows = self.bm25.search(question, max(self.candidates, top_k))
+        for row, _ in keyword_rows:
+            found.setdefault(self.bm25.ids[row], (self.bm25.documents[row], self.bm25.metadatas[row]))
+        fused = reciprocal_rank_fusion(
+            [vector_ids, [self.bm25.ids[row] for row, _ in keyword_rows]], self.rrf_k
+        )
+        return self._hits("hybrid", fused[:top_k], found)
+
+    def retrieve_many(self, questions: List[str], top_k: int = 3,
+                      embeddings: Optional[List[List[float]]] = None) -> List[Dict]:
+        """
+        `retrieve(route="auto")` for several questions, with one multi-query
+        vector search for all of those that do not take the exact-term route.
+        """
+        hits: List[Optional[Dict]] = [None] * len(questions)
+        fuse = []
+        for i, question in enumerate(questions):
+            rows = self.bm25.exact_rows(question, self.max_exact)
+            if rows is not None:
+                hits[i] = self._keyword_hits("exact", self.bm25.search(question, top_k, rows))
+            else:
+                fuse.append(i)
+        if fuse:
+            if embeddings is not None:
+                query = {"query_embeddings": [embeddings[i] for i in fuse]}
+            elif self.embed_fn is None:
+                query = {"query_texts": [questions[i] for i in fuse]}
+            else:
+                query = {"query_embeddings": self.embed_fn([questions[i] for i in fuse])}
+            results = self.collection.query(**query, n_results=max(self.candidates, top_k),
+                                            include=["documents", "metadatas", "distances"])
+            for j, i in enumerate(fuse):
+                hits[i] = self._fuse(questions[i], results, j, top_k)
+        return hits
+
+
+GENE_FAMILIES = ["HBA", "SMN", "CYP2D", "BRCA", "TP", "KRAS", "EGFR", "APOE", "HLA-DRB", "MYH"]
+
+
+def scaled_corpus(n: int, seed: int = 0) -> Tuple[List[Dict], List[str]]:
+    """
+    Synthetic paper sections, each reporting variants in one gene symbol
+    that no other chunk mentions. Returns (chunks, symbol per chunk).
+    """
+    import random
+
+    from rag_ingest import synthetic_chunks
+
+    rng = random.Random(seed)
+    chunks = synthetic_chunks(n, seed)
+    symbols = []
+    for i, chunk in enumerate(chunks):
+        symbol = f"{GENE_FAMILIES[i % len(GENE_FAMILIES)]}{i // len(GENE_FAMILIES) + 1}"
+        words = chunk["text"].split()
+        words.insert(rng.randrange(len(words)), f"variants in {symbol} were")
+        chunk["text"] = " ".join(words)
+        symbols.append(symbol)
+    return chunks, symbols
+
+
+def benchmark(n_chunks: int = 50_000, queries: int = 200, top_k: int = 3, embed_latency: float = 0.05):
+    import random
+
+    import chromadb
+    from chromadb.config import Settings
+
+    from rag_ingest import StubEmbedder, ingest_chunks
+
+    chunks, symbols = scaled_corpus(n_chunks)
+    try:
+        from local_embedder import OnnxEmbedder
+
+        embed_fn, embedder = OnnxEmbedder(), "local ONNX model"
+        ingest_fn = embed_fn
+    except (FileNotFoundError, ImportError):
+        # Hash-seeded random vectors: the vector route's hit rate is a floor
+        ingest_fn = StubEmbedder(latency=0)
+        embed_fn = StubEmbedder(latency=embed_latency)
+        embedder = f"stub embedder, {embed_latency * 1000:.0f} ms/call"
+
+    client = chromadb.Client(Settings(anonymized_telemetry=False, is_persistent=False))
+    collection = client.create_collection("bench_hybrid", configuration={"hnsw": {"space": "cosine"}})
+    ingest_chunks(collection, chunks, embed_fn=ingest_fn, verbose=False)
+    start = time.perf_counter()
+    bm25 = BM25Index.from_collection(collection)
+    build = time.perf_counter() - start
+    retriever = HybridRetriever(collection, bm25, embed_fn=embed_fn)
+
+    rng = random.Random(1)
+    targets = rng.sample(range(n_chunks), queries)
+    exact_questions = [(f"Which genomes carried variants in {symbols[i]}?", chunks[i]["id"])
+                       for i in targets]
+    topics = ["sequencing coverage", "variant calling pipelines", "tumor cell clusters",
+              "library preparation", "alignment to GRCh38 with BWA", "expression pathways"]
+    topic_questions = [(f"What do the papers report about {topics[i % len(topics)]}?", None)
+                       for i in range(queries)]
+
+    print(f"{n_chunks} chunks ({len(bm25.postings)} terms, BM25 index built in {build:.1f}s), "
+          f"{queries} questions per set, top {top_k}, {embedder}")
+    print(f"  {'route':8s} {'questions':10s} {'hit rate':>8s} {'p50 ms':>9s} {'p95 ms':>9s}  routes")
+    for name, questions in (("symbol", exact_questions), ("topic", topic_questions)):
+        for route in ("vector", "keyword", "hybrid", "auto"):
+            timings, hits, routes = [], 0, Counter()
+            for question, target in questions:
+                start = time.perf_counter()
+                result = retriever.retrieve(question, top_k, route=route)
+                timings.append((time.perf_counter() - start) * 1000)
+                hits += target in result["ids"]
+                routes[result["route"]] += 1
+            timings.sort()
+            hit_rate = f"{hits / len(questions):.3f}" if name == "symbol" else "-"
+            print(f"  {route:8s} {name:10s} {hit_rate:>8s} {timings[len(timings) // 2]:9.3f} "
+                  f"{timings[int(len(timings) * 0.95)]:9.3f}  "
+                  f"{', '.join(f'{r} {c}' for r, c in routes.items())}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hybrid BM25 + vector retrieval")
+    parser.add_argument("--bench", action="store_true",
+                        help="latency and hit rate per route on a synthetic corpus")
+    parser.add_argument("--chunks", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--embed-latency", type=float, default=0.05,
+                        help="stub seconds per query embedding call")
+    args = parser.parse_args()
+
+    if args.bench:
+        benchmark(args.chunks, args.queries, args.top_k, args.embed_latency)
+    else:
+        parser.print_help()
@@ -0,0 +1,158 @@
+"""
+Local CPU embedding engine for paper chunks (ONNX Runtime).
+
+Runs a sentence-transformer-class model (all-MiniLM-L6-v2 by default, the
+same model ChromaDB uses for `query_texts`) without any network calls:
+
+- texts are tokenized in one parallel `encode_batch` call
+- sequences are sorted by length and cut into buckets, so each batch is only
+  padded to the longest sequence in that bucket instead of the global max
+- each bucket is one ONNX Runtime call using `threads` intra-op threads
+- outputs are mean-pooled over the attention mask and L2-normalized
+
+The model directory must contain `model.onnx` and `tokenizer.json`. On a
+machine with internet access ChromaDB downloads them on first use to
+~/.cache/chroma/onnx_models/all-MiniLM-L6-v2/onnx; copy that directory to
+offline HPC nodes and set LOCAL_EMBED_MODEL_DIR to point at it.
+
+Benchmark:
+
+    python local_embedder.py --bench --chunks 2000 --threads 8
+"""
+
+import argparse
+import os
+import random
+import time
+from typing import List, Optional
+
+import numpy as np
+
+DEFAULT_MODEL_DIR = os.path.join(
+    os.path.expanduser("~"), ".cache", "chroma", "onnx_models", "all-MiniLM-L6-v2", "onnx"
+)
+MODEL_NAME = "local/all-MiniLM-L6-v2"
+
+
+class OnnxEmbedder:
+    """Length-bucketed, multi-threaded ONNX sentence embedder."""
+
+    def __init__(
+        self,
+        model_dir: Optional[str] = None,
+        threads: Optional[int] = None,
+        batch_size: int = 64,
+        max_length: int = 256,
+    ):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.model_dir = model_dir or os.environ.get("LOCAL_EMBED_MODEL_DIR", DEFAULT_MODEL_DIR)
+        if not os.path.exists(os.path.join(self.model_dir, "model.onnx")):
+            raise FileNotFoundError(
+                f"No model.onnx in {self.model_dir}; set LOCAL_EMBED_MODEL_DIR "
+                "to a directory containing model.onnx and tokenizer.json"
+            )
+        self.threads = threads or os.cpu_count() or 1
+        self.batch_size = batch_size
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(self.model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.no_padding()
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = self.threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            os.path.join(self.model_dir, "model.onnx"),
+            sess_options=options,
+            providers=["CPUExecutionProvider"],
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def _run(self, ids: np.ndarray, mask: np.ndarray) -> np.ndarray:
+        feeds = {"input_ids": ids, "attention_mask": mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.zeros_like(ids)
+        hidden = self.session.run(None, feeds)[0]
+        # Mean pooling over real (non-padding) tokens, then L2 normalize
+        weights = mask[..., None].astype(np.float32)
+        pooled = (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def embed(self, texts: List[str], bucketed: bool = True) -> np.ndarray:
+        """Embed `texts` and return a float32 array in input order."""
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        encodings = self.tokenizer.encode_batch(list(texts))
+        lengths = np.array([len(e.ids) for e in encodings])
+        order = np.argsort(lengths, kind="stable") if bucketed else np.arange(len(texts))
+
+        output = None
+        for start in range(0, len(order), self.batch_size):
+            idx = order[start:start + self.batch_size]
+            width = int(lengths[idx].max())
+            ids = np.zeros((len(idx), width), dtype=np.int64)
+            mask = np.zeros((len(idx), width), dtype=np.int64)
+            for row, i in enumerate(idx):
+                n = lengths[i]
+                ids[row, :n] = encodings[i].ids
+                mask[row, :n] = 1
+            vectors = self._run(ids, mask)
+            if output is None:
+                output = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+            output[idx] = vectors
+        return output
+
+    def __call__(self, texts: List[str]) -> List[List[float]]:
+        """Embed function signature used by `rag_ingest.ingest_chunks`."""
+        return self.embed(texts).tolist()
+
+
+def benchmark(n_chunks: int, threads: int, batch_size: int):
+    from rag_ingest import synthetic_chunks
+
+    rng = random.Random(1)
+    texts = []
+    for chunk in synthetic_chunks(n_chunks):
+        # Mix short abstracts with long methods sections
+        words = chunk["text"].split()
+        texts.append(" ".join(words[: rng.choice([20, 60, 120, 250])]))
+
+    embedder = OnnxEmbedder(threads=threads, batch_size=batch_size)
+    embedder.embed(texts[:batch_size])  # warm up
+
+    sample = texts[: min(200, len(texts))]
+    t0 = time.perf_counter()
+    for text in sample:
+        embedder.embed([text])
+    single = len(sample) / (time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    embedder.embed(texts, bucketed=False)
+    padded = len(texts) / (time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    embedder.embed(texts, bucketed=True)
+    bucketed = len(texts) / (time.perf_counter() - t0)
+
+    print(f"Model dir:          {embedder.model_dir}")
+    print(f"Threads:            {embedder.threads}, batch size {batch_size}")
+    print(f"One chunk per call: {single:8.1f} chunks/sec")
+    print(f"Unsorted batches:   {padded:8.1f} chunks/sec")
+    print(f"Length-bucketed:    {bucketed:8.1f} chunks/sec")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local ONNX embedding engine")
+    parser.add_argument("--bench", action="store_true", help="run the throughput benchmark")
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=None, help="default: all cores")
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    if args.bench:
+        benchmark(args.chunks, args.threads, args.batch_size)
+    else:
+        parser.print_help()
@@ -0,0 +1,449 @@
+"""
+Secondary metadata indexes for filtered vector search over the paper corpus.
+
+`collection.query(where={"year": 2023})` leaves the filter to the vector
+store. This module resolves the filter first, from in-memory inverted
+indexes on chunk metadata (`paper_id`, `year`, `section`, `authors`:
+value -> sorted array of chunk rows), and then picks a plan by selectivity:
+
+- pre-filter: few chunks match, so the nearest neighbours are searched among
+  exactly those (Chroma `ids=...`; an exact scan or a filtered HNSW search
+  for the hnswlib backend)
+- post-filter: most chunks match, so an unfiltered ANN search over-fetches
+  about k / selectivity candidates and drops the non-matching ones (with a
+  pre-filter retry if too few survive)
+
+`where` uses the Chroma syntax: {"year": 2023}, {"year": {"$gte": 2020}},
+{"section": {"$in": [...]}}, "$ne", "$nin", "$gt", "$lt", "$lte", "$and", "$or".
+A filter on a field without an index (e.g. "chunk_index") cannot be resolved
+here; `ChromaFilteredSearch` then passes it to Chroma as `where=` unchanged
+(plan "where").
+
+    metadata = MetadataIndex.from_collection(collection)
+    search = ChromaFilteredSearch(collection, metadata, embed_fn)
+    results = search.query("Which platforms were used?", n_results=5, where={"year": 2023})
+    results["plan"]   # "pre-filter" or "post-filter"
+
+Benchmark (hnswlib backend, 1M synthetic chunks; Chroma backend, smaller):
+
+    python metadata_index.py --bench --chunks 1000000
+"""
+
+import argparse
+import json
+import math
+import operator
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+FIELDS = ("paper_id", "year", "section", "authors")
+PREFILTER_ROWS = 10_000  # pre-filter when at most this many chunks match
+PREFILTER_SELECTIVITY = 0.02  # ...or so few that post-filtering would over-fetch k / 0.02
+OVERFETCH = 3.0
+RESOLVED_CACHE = 256  # recently resolved filters kept
+
+_RANGE = {"$gt": operator.gt, "$gte": operator.ge, "$lt": operator.lt, "$lte": operator.le}
+_EMPTY = np.zeros(0, dtype=np.int64)
+
+
+class MetadataIndex:
+    """Inverted indexes field -> value -> sorted chunk rows, plus row <-> chunk id maps."""
+
+    def __init__(self, fields: Sequence[str] = FIELDS):
+        self.fields = tuple(fields)
+        self.ids: List[str] = []
+        self.rows: Dict[str, int] = {}
+        self._lists: Dict[str, Dict] = {f: {} for f in self.fields}
+        self._arrays: Dict[str, Dict] = {}
+        self._resolved: "OrderedDict[str, Optional[np.ndarray]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, ids: Iterable[str], metadatas: Iterable[Dict]):
+        for chunk_id, metadata in zip(ids, metadatas):
+            row = len(self.ids)
+            self.ids.append(chunk_id)
+            self.rows[chunk_id] = row
+            for field in self.fields:
+                value = (metadata or {}).get(field)
+                if value is not None:
+                    self._lists[field].setdefault(value, []).append(row)
+        self._arrays = {}
+        self._resolved.clear()
+
+    @classmethod
+    def from_collection(cls, collection, fields: Sequence[str] = FIELDS,
+                        page_size: int = 5000) -> "MetadataIndex":
+        index = cls(fields)
+        offset = 0
+        while True:
+            page = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+            index.add(page["ids"], page["metadatas"])
+            if len(page["ids"]) < page_size:
+                return index
+            offset += page_size
+
+    def _postings(self, field: str) -> Dict:
+        if field not in self._arrays:
+            self._arrays[field] = {value: np.asarray(rows, dtype=np.int64)
+                                   for value, rows in self._lists[field].items()}
+        return self._arrays[field]
+
+    def values(self, field: str) -> List:
+        return list(self._lists[field])
+
+    def _union(self, arrays: List[np.ndarray]) -> np.ndarray:
+        arrays = [a for a in arrays if len(a)]
+        if not arrays:
+            return _EMPTY
+        if len(arrays) == 1:
+            return arrays[0]
+        if sum(len(a) for a in arrays) * 32 < len(self.ids):
+            return np.unique(np.concatenate(arrays))
+        mask = np.zeros(len(self.ids), dtype=bool)  # large unions: a bitmap beats sorting
+        for a in arrays:
+            mask[a] = True
+        return np.flatnonzero(mask)
+
+    @staticmethod
+    def _intersect(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        """Intersection of sorted row arrays, by binary search of the smaller in the larger."""
+        if len(a) > len(b):
+            a, b = b, a
+        if len(a) == 0:
+            return _EMPTY
+        at = np.minimum(np.searchsorted(b, a), len(b) - 1)
+        return a[b[at] == a]
+
+    def _field(self, field: str, condition) -> np.ndarray:
+        if field not in self._lists:
+            raise KeyError(f"No metadata index on {field!r} (indexed: {', '.join(self.fields)})")
+        postings = self._postings(field)
+        if not isinstance(condition, dict):
+            return postings.get(condition, _EMPTY)
+        result = None
+        for op, operand in condition.items():
+            if op == "$eq":
+                rows = postings.get(operand, _EMPTY)
+            elif op == "$in":
+                rows = self._union([postings.get(v, _EMPTY) for v in operand])
+            elif op in ("$ne", "$nin"):
+                excluded = [operand] if op == "$ne" else list(operand)
+                rows = self._union([a for v, a in postings.items() if v not in excluded])
+            elif op in _RANGE:
+                rows = self._union([a for v, a in postings.items()
+                                    if type(v) is not str and _RANGE[op](v, operand)])
+            else:
+                raise ValueError(f"Unsupported operator {op!r}")
+            result = rows if result is None else self._intersect(result, rows)
+        return _EMPTY if result is None else result
+
+    def covers(self, where: Optional[Dict]) -> bool:
+        """True if every field `where` filters on has an index."""
+        for key, condition in (where or {}).items():
+            if key in ("$and", "$or"):
+                if not all(self.covers(c) for c in condition):
+                    return False
+            elif key not in self._lists:
+                return False
+        return True
+
+    def resolve(self, where: Optional[Dict]) -> Optional[np.ndarray]:
+        """Sorted rows matching `where`; None means no filter (every row)."""
+        if not where:
+            return None
+        key = json.dumps(where, sort_keys=True)
+        if key in self._resolved:
+            self._resolved.move_to_end(key)
+            return self._resolved[key]
+        rows = self._resolve(where)
+        self._resolved[key] = rows
+        if len(self._resolved) > RESOLVED_CACHE:
+            self._resolved.popitem(last=False)
+        return rows
+
+    def _resolve(self, where: Dict) -> np.ndarray:
+        result = None
+        for key, condition in where.items():
+            if key == "$and":
+                parts = [self._resolve(c) for c in condition]
+                rows = parts[0]
+                for part in parts[1:]:
+                    rows = self._intersect(rows, part)
+            elif key == "$or":
+                rows = self._union([self._resolve(c) for c in condition])
+            else:
+                rows = self._field(key, condition)
+            result = rows if result is None else self._intersect(result, rows)
+        return result
+
+
+def choose_plan(matching: int, total: int) -> str:
+    if matching <= PREFILTER_ROWS or matching <= PREFILTER_SELECTIVITY * total:
+        return "pre-filter"
+    return "post-filter"
+
+
+class FilteredSearch(ABC):
+    """Filter resolution and plan choice; subclasses supply the vector searches."""
+
+    def __init__(self, metadata: MetadataIndex):
+        self.metadata = metadata
+        self.plans: Dict[str, int] = {}
+
+    @abstractmethod
+    def _search(self, query, k: int) -> Tuple[List[int], List[float]]:
+        """Unfiltered ANN search: (rows, similarities)."""
+
+    @abstractmethod
+    def _search_rows(self, query, k: int, rows: np.ndarray) -> Tuple[List[int], List[float]]:
+        """Nearest neighbours among `rows` only."""
+
+    def search(self, query, k: int, where: Optional[Dict] = None,
+               plan: str = "auto") -> Tuple[List[int], List[float], str]:
+        """
+        (rows, similarities, plan used). `plan` forces "pre-filter" or
+        "post-filter" instead of choosing by selectivity.
+        """
+        rows = self.metadata.resolve(where)
+        if rows is None:
+            found, scores = self._search(query, k)
+            return found, scores, "unfiltered"
+        if len(rows) == 0:
+            return [], [], "empty"
+        total = len(self.metadata)
+        if plan == "auto":
+            plan = choose_plan(len(rows), total)
+        if plan == "post-filter":
+            fetch = min(total, math.ceil(k * total / len(rows) * OVERFETCH) + k)
+            found, scores = self._search(query, fetch)
+            at = np.minimum(np.searchsorted(rows, found), len(rows) - 1)
+            allowed = rows[at] == np.asarray(found, dtype=np.int64)
+            kept = [(r, s) for r, s, ok in zip(found, scores, allowed) if ok][:k]
+            if len(kept) < min(k, len(rows)):
+                plan = "pre-filter"  # too few survived: fall back
+            else:
+                self.plans[plan] = self.plans.get(plan, 0) + 1
+                return [r for r, _ in kept], [s for _, s in kept], plan
+        self.plans[plan] = self.plans.get(plan, 0) + 1
+        found, scores = self._search_rows(query, k, rows)
+        return found, scores, plan
+
+
+class ChromaFilteredSearch(FilteredSearch):
+    """Filtered queries against a Chroma collection; the index is rebuilt if the collection changes."""
+
+    def __init__(self, collection, metadata: Optional[MetadataIndex] = None,
+                 embed_fn: Optional[Callable[[List[str]], List[List[float]]]] = None):
+        from rag_index import collection_version
+
+        self._version_of = collection_version
+        self.collection = collection
+        self.embed_fn = embed_fn
+        self.version = collection_version(collection)
+        super().__init__(metadata or MetadataIndex.from_collection(collection))
+
+    def _query(self, query, k: int, ids: Optional[List[str]] = None,
+               where: Optional[Dict] = None) -> Tuple[List[int], List[float]]:
+        args = {"query_texts": [query]} if isinstance(query, str) else {"query_embeddings": [query]}
+        if ids is not None:
+            args["ids"] = ids
+        if where is not None:
+            args["where"] = where
+        result = self.collection.query(**args, n_results=k, include=["distances"])
+        rows = [self.metadata.rows[i] for i in result["ids"][0]]
+        return rows, [1 - d for d in result["distances"][0]]
+
+    def _search(self, query, k):
+        return self._query(query, k)
+
+    def _search_rows(self, query, k, rows):
+        return self._query(query, k, [self.metadata.ids[r] for r in rows])
+
+    def search(self, query, k, where=None, plan="auto"):
+        if where and not self.metadata.covers(where):
+            # Unindexed field: Chroma filters on its stored metadata instead
+            self.plans["where"] = self.plans.get("where", 0) + 1
+            found, scores = self._query(query, k, where=where)
+            return found, scores, "where"
+        return super().search(query, k, where, plan)
+
+    def query(self, question: str, n_results: int = 5, where: Optional[Dict] = None,
+              plan: str = "auto") -> Dict:
+        """Like `collection.query` for one question, plus the plan that was used."""
+        if self._version_of(self.collection) != self.version:
+            self.metadata = MetadataIndex.from_collection(self.collection, self.metadata.fields)
+            self.version = self._version_of(self.collection)
+        query = self.embed_fn([question])[0] if self.embed_fn is not None else question
+        rows, similarities, plan = self.search(query, n_results, where, plan)
+        ids = [self.metadata.ids[r] for r in rows]
+        found = self.collection.get(ids=ids, include=["documents", "metadatas"]) if ids else None
+        by_id = {} if found is None else {
+            i: (doc, meta) for i, doc, meta in zip(found["ids"], found["documents"], found["metadatas"])
+        }
+        return {
+            "plan": plan,
+            "ids": [ids],
+            "documents": [[by_id[i][0] for i in ids]],
+            "metadatas": [[by_id[i][1] for i in ids]],
+            "distances": [[1 - s for s in similarities]],
+        }
+
+
+class HnswFilteredSearch(FilteredSearch):
+    """
+    Filtered search over an `ann_index.HnswIndex` whose labels are metadata
+    rows, with the normalized vectors kept for exact scans of small sets.
+    """
+
+    def __init__(self, vectors: np.ndarray, hnsw, metadata: MetadataIndex, exact_rows: int = 50_000):
+        super().__init__(metadata)
+        self.vectors = vectors
+        self.hnsw = hnsw
+        self.exact_rows = exact_rows
+
+    def _search(self, query, k):
+        labels, distances = self.hnsw.index.knn_query(query, k=k)
+        return labels[0].tolist(), (1 - distances[0]).tolist()
+
+    def _search_rows(self, query, k, rows):
+        if len(rows) <= self.exact_rows:
+            scores = self.vectors[rows] @ query
+            k = min(k, len(rows))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return rows[top].tolist(), scores[top].tolist()
+        allowed = np.zeros(len(self.metadata), dtype=bool)
+        allowed[rows] = True
+        labels, distances = self.hnsw.index.knn_query(
+            query, k=k, filter=lambda label: bool(allowed[label]))
+        return labels[0].tolist(), (1 - distances[0]).tolist()
+
+
+def synthetic_metadata(n: int, seed: int = 0) -> List[Dict]:
+    """Chunk metadata shaped like the paper corpus: ~20 chunks per paper, 25 years, 8 sections."""
+    rng = np.random.default_rng(seed)
+    sections = ["abstract", "introduction", "methods", "results", "discussion",
+                "figures", "supplement", "references"]
+    papers = np.arange(n) // 20
+    years = 2000 + rng.integers(0, 25, size=papers[-1] + 1)
+    authors = rng.integers(0, max(1, n // 100), size=papers[-1] + 1)
+    section = rng.choice(len(sections), size=n, p=[.1, .1, .2, .2, .15, .1, .1, .05])
+    return [{"paper_id": f"paper{p}", "year": int(years[p]), "authors": f"Author{authors[p]} et al.",
+             "section": sections[s]} for p, s in zip(papers.tolist(), section.tolist())]
+
+
+BENCH_FILTERS = [
+    ("none", None),
+    ("paper_id", {"paper_id": "paper123"}),
+    ("authors", {"authors": "Author7 et al."}),
+    ("year+section", {"$and": [{"year": 2023}, {"section": "methods"}]}),
+    ("year", {"year": 2023}),
+    ("section", {"section": "methods"}),
+    ("year >= 2012", {"year": {"$gte": 2012}}),
+]
+
+
+def _timed(fn, queries) -> Tuple[float, list]:
+    results, timings = [], []
+    for q in queries:
+        start = time.perf_counter()
+        results.append(fn(q))
+        timings.append(time.perf_counter() - start)
+    return sorted(timings)[len(timings) // 2] * 1000, results
+
+
+def _recall(found: List[List[int]], truth: List[List[int]]) -> float:
+    return float(np.mean([len(set(f) & set(t)) / max(1, len(t)) for f, t in zip(found, truth)]))
+
+
+def benchmark(n: int = 1_000_000, dim: int = 64, queries: int = 50, k: int = 10,
+              chroma_chunks: int = 20_000):
+    from ann_index import HnswIndex, normalize, synthetic_vectors
+
+    print(f"{n} chunks x {dim} dims, {queries} queries, top {k}")
+    start = time.perf_counter()
+    vectors = synthetic_vectors(n, dim)
+    metadata = MetadataIndex()
+    metadatas = synthetic_metadata(n)
+    metadata.add([f"chunk{i}" for i in range(n)], metadatas)
+    print(f"  metadata index built in {time.perf_counter() - start:.1f}s "
+          f"({', '.join(f'{f}: {len(metadata.values(f))} values' for f in FIELDS)})")
+    start = time.perf_counter()
+    hnsw = HnswIndex(dim, n, {"ef_construction": 100})
+    for i in range(0, n, 100_000):
+        hnsw.add(vectors[i:i + 100_000])
+    print(f"  HNSW built in {time.perf_counter() - start:.0f}s")
+    search = HnswFilteredSearch(vectors, hnsw, metadata)
+    rng = np.random.default_rng(1)
+    noise = rng.standard_normal((queries, dim), dtype=np.float32) * (0.5 / np.sqrt(dim))
+    query_vectors = normalize(vectors[rng.integers(n, size=queries)] + noise)
+
+    print(f"  {'filter':13s} {'matches':>9s} {'resolve ms':>10s} {'plan':>12s} {'ms':>6s} "
+          f"{'recall':>6s} {'naive ms':>8s} {'recall':>6s}")
+    for name, where in BENCH_FILTERS:
+        metadata.resolve(where)  # builds the posting arrays for the field
+        start = time.perf_counter()
+        rows = metadata._resolve(where) if where else None
+        resolve = (time.perf_counter() - start) * 1000
+        rows = np.arange(n) if rows is None else rows
+        allowed = np.zeros(n, dtype=bool)
+        allowed[rows] = True
+        truth = []
+        for q in query_vectors:
+            scores = vectors[rows] @ q
+            top = np.argpartition(-scores, min(k, len(rows)) - 1)[:k]
+            truth.append(rows[top].tolist())
+        auto_ms, auto = _timed(lambda q: search.search(q, k, where), query_vectors)
+        # Naive post-filtering: a fixed 10x over-fetch from the graph, then drop non-matches
+        naive_ms, naive = _timed(lambda q: [r for r in search._search(q, 10 * k)[0] if allowed[r]][:k],
+                                 query_vectors)
+        print(f"  {name:13s} {len(rows):9d} {resolve:10.2f} {auto[0][2]:>12s} {auto_ms:6.2f} "
+              f"{_recall([r[0] for r in auto], truth):6.3f} {naive_ms:8.2f} {_recall(naive, truth):6.3f}")
+
+    if chroma_chunks:
+        _benchmark_chroma(vectors[:chroma_chunks], metadatas[:chroma_chunks], query_vectors, k)
+
+
+def _benchmark_chroma(vectors: np.ndarray, metadatas: List[Dict], query_vectors: np.ndarray, k: int):
+    import chromadb
+    from chromadb.config import Settings
+
+    client = chromadb.Client(Settings(anonymized_telemetry=False, is_persistent=False))
+    collection = client.create_collection("bench_metadata", configuration={"hnsw": {"space": "cosine"}})
+    ids = [f"chunk{i}" for i in range(len(vectors))]
+    for i in range(0, len(vectors), 5000):
+        collection.add(ids=ids[i:i + 5000], embeddings=vectors[i:i + 5000],
+                       metadatas=metadatas[i:i + 5000])
+    search = ChromaFilteredSearch(collection)
+    print(f"\nChroma collection, {len(vectors)} chunks: where= vs metadata index")
+    print(f"  {'filter':13s} {'matches':>9s} {'plan':>12s} {'index ms':>9s} {'where= ms':>10s}")
+    for name, where in BENCH_FILTERS:
+        matches = len(vectors) if where is None else len(search.metadata.resolve(where))
+        ours_ms, ours = _timed(lambda q: search.search(q.tolist(), k, where), query_vectors)
+        theirs_ms, _ = _timed(lambda q: collection.query(query_embeddings=[q.tolist()], n_results=k,
+                                                         where=where, include=["distances"]),
+                              query_vectors)
+        print(f"  {name:13s} {matches:9d} {ours[0][2]:>12s} {ours_ms:9.2f} {theirs_ms:10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Metadata-filtered vector search")
+    parser.add_argument("--bench", action="store_true", help="filtered vs unfiltered query latency")
+    parser.add_argument("--chunks", type=int, default=1_000_000)
+    parser.add_argument("--dim", type=int, default=64)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--chroma-chunks", type=int, default=20_000,
+                        help="size of the Chroma comparison (0 to skip)")
+    args = parser.parse_args()
+
+    if args.bench:
+        benchmark(args.chunks, args.dim, args.queries, args.k, args.chroma_chunks)
+    else:
+        parser.print_help()
@@ -0,0 +1,220 @@
+"""
+Persistent, incrementally updated ChromaDB collection for the paper corpus.
+
+Every chunk is stored with a `content_hash` in its metadata. Re-ingesting a
+corpus compares those hashes against the incoming chunks and only embeds
+chunks that are new or changed; chunks that disappeared are deleted. Any
+change also gives the collection a new `content_version` (collection
+metadata), which answer caches use to drop stale answers. A
+`manifest.json` next to the database records which embedding model and
+HNSW build parameters (see ann_index.py) built the vectors. Asking for a
+different model or graph is an error unless the caller opts in to a
+rebuild (`rebuild=True`), which deletes and re-embeds the collection.
+
+    collection, manifest = open_collection("paper_index", "genomics_papers",
+                                           embedding_model="text-embedding-ada-002")
+    summary = sync_chunks(collection, chunks, embed_fn=...)
+    save_manifest("paper_index", manifest, collection)
+"""
+
+import hashlib
+import json
+import os
+import time
+import uuid
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import chromadb
+from chromadb.config import Settings
+
+from ann_index import BUILD_PARAMS, hnsw_configuration, hnsw_params, set_ef_search
+from local_embedder import MODEL_NAME as LOCAL_MODEL_NAME, OnnxEmbedder
+from rag_ingest import ingest_chunks, litellm_embedder
+
+DEFAULT_EMBEDDER = "chromadb-default"
+LOCAL_MODEL_ALIAS = "local"
+MANIFEST_NAME = "manifest.json"
+VERSION_KEY = "content_version"
+
+
+def content_hash(chunk: Dict) -> str:
+    """Hash of the chunk text and metadata (excluding the hash itself)."""
+    metadata = {k: v for k, v in chunk["metadata"].items() if k != "content_hash"}
+    blob = json.dumps({"text": chunk["text"], "metadata": metadata}, sort_keys=True)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def resolve_embedder(model: str, fallback: bool = True) -> Tuple[Optional[Callable], str]:
+    """
+    Pick the embedding function for the whole index.
+
+    `model="local"` uses the on-CPU ONNX engine directly. Any other model is
+    probed once; if it is unreachable the local engine is used instead, and
+    only if no local model is installed does it return
+    `(None, "chromadb-default")`, so the whole index is built with one model.
+
+    With `fallback=False` (querying an existing index) an unavailable model
+    raises RuntimeError instead of being replaced.
+    """
+    if model == DEFAULT_EMBEDDER:
+        return None, DEFAULT_EMBEDDER
+    if model not in (LOCAL_MODEL_ALIAS, LOCAL_MODEL_NAME):
+        embed_fn = litellm_embedder(model)
+        try:
+            embed_fn(["probe"])
+            return embed_fn, model
+        except Exception as e:
+            if not fallback:
+                raise RuntimeError(f"Embedding model {model} unavailable ({e})") from e
+            print(f"    Warning: {model} unavailable ({e}); trying the local embedder")
+    if not fallback:
+        try:
+            return OnnxEmbedder(), LOCAL_MODEL_NAME
+        except (FileNotFoundError, ImportError) as e:
+            raise RuntimeError(f"Local embedder unavailable ({e})") from e
+    try:
+        return OnnxEmbedder(), LOCAL_MODEL_NAME
+    except (FileNotFoundError, ImportError) as e:
+        print(f"    Warning: local embedder unavailable ({e}); using ChromaDB's default embedder")
+        return None, DEFAULT_EMBEDDER
+
+
+def load_manifest(persist_dir: str) -> Dict:
+    path = os.path.join(persist_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(persist_dir: str, manifest: Dict, collection):
+    manifest = dict(manifest, chunks=collection.count(), updated=time.time())
+    with open(os.path.join(persist_dir, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def open_collection(
+    persist_dir: Optional[str],
+    name: str,
+    embedding_model: str,
+    metadata: Optional[Dict] = None,
+    hnsw: Optional[Dict] = None,
+    rebuild: bool = False,
+) -> Tuple["chromadb.Collection", Dict]:
+    """
+    Open (or create) the collection.
+
+    With `persist_dir=None` this is the original throwaway in-memory client.
+    Otherwise the collection lives on disk. If the manifest shows it was
+    embedded with a different model, or `hnsw` asks for different build
+    parameters (space, M, ef_construction), it is dropped and recreated
+    with `rebuild=True` and RuntimeError is raised otherwise. A new
+    `ef_search` alone is applied in place. With `hnsw=None` an existing
+    collection keeps whatever graph it was built with.
+    """
+    metadata = metadata or {"description": "Genomics research papers"}
+    if persist_dir is None:
+        client = chromadb.Client(Settings(anonymized_telemetry=False, is_persistent=False))
+        hnsw = hnsw_params(**(hnsw or {}))
+        collection = client.create_collection(
+            name=name, metadata=metadata, configuration=hnsw_configuration(hnsw)
+        )
+        return collection, {"collection": name, "embedding_model": embedding_model, "hnsw": hnsw}
+
+    os.makedirs(persist_dir, exist_ok=True)
+    client = chromadb.PersistentClient(
+        path=persist_dir, settings=Settings(anonymized_telemetry=False)
+    )
+    manifest = load_manifest(persist_dir)
+    previous = manifest.get("embedding_model")
+    previous_hnsw = manifest.get("hnsw")
+    changed = None
+    if previous and previous != embedding_model:
+        changed = f"Embedding model changed ({previous} -> {embedding_model})"
+    elif previous and hnsw is not None:
+        old = {k: (previous_hnsw or {}).get(k) for k in BUILD_PARAMS}
+        new = {k: hnsw_params(**hnsw)[k] for k in BUILD_PARAMS}
+        if old != new:
+            changed = f"HNSW parameters changed ({old} -> {new})"
+    if changed and not rebuild:
+        raise RuntimeError(f"{changed} in {persist_dir}; pass rebuild=True to re-embed the collection")
+    if changed:
+        print(f"    {changed}; rebuilding index")
+        try:
+            client.delete_collection(name)
+        except Exception:
+            pass
+    if hnsw is None:
+        hnsw = previous_hnsw if previous and not changed else hnsw_params()
+    else:
+        hnsw = hnsw_params(**hnsw)
+    collection = client.get_or_create_collection(
+        name=name, metadata=metadata,
+        configuration=hnsw_configuration(hnsw) if hnsw else None,
+    )
+    current = (collection.configuration or {}).get("hnsw") or {}
+    if hnsw and current.get("ef_search") != hnsw["ef_search"]:
+        set_ef_search(collection, hnsw["ef_search"])
+    manifest = {"collection": name, "embedding_model": embedding_model, "hnsw": hnsw}
+    return collection, manifest
+
+
+def collection_version(collection) -> str:
+    """Token that changes whenever `sync_chunks` changes the collection's contents."""
+    return (collection.metadata or {}).get(VERSION_KEY, "")
+
+
+def stored_hashes(collection, page_size: int = 5000) -> Dict[str, str]:
+    """Map of chunk id -> content_hash for everything in the collection."""
+    hashes = {}
+    offset = 0
+    while True:
+        page = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+        for chunk_id, metadata in zip(page["ids"], page["metadatas"]):
+            hashes[chunk_id] = (metadata or {}).get("content_hash")
+        if len(page["ids"]) < page_size:
+            return hashes
+        offset += page_size
+
+
+def sync_chunks(
+    collection,
+    chunks: Iterable[Dict],
+    embed_fn: Optional[Callable[[List[str]], List[List[float]]]] = None,
+    verbose: bool = True,
+    **ingest_kwargs,
+) -> Dict:
+    """
+    Make the collection match `chunks`, embedding only what changed.
+
+    Returns counts of added, updated, deleted and unchanged chunks.
+    """
+    existing = stored_hashes(collection)
+    seen = set()
+    to_embed = []
+    summary = {"added": 0, "updated": 0, "deleted": 0, "unchanged": 0}
+
+    for chunk in chunks:
+        digest = content_hash(chunk)
+        seen.add(chunk["id"])
+        if existing.get(chunk["id"]) == digest:
+            summary["unchanged"] += 1
+            continue
+        summary["updated" if chunk["id"] in existing else "added"] += 1
+        to_embed.append({**chunk, "metadata": {**chunk["metadata"], "content_hash": digest}})
+
+    removed = [chunk_id for chunk_id in existing if chunk_id not in seen]
+    for i in range(0, len(removed), 5000):
+        collection.delete(ids=removed[i:i + 5000])
+    summary["deleted"] = len(removed)
+
+    if to_embed:
+        stats = ingest_chunks(
+            collection, to_embed, embed_fn=embed_fn, upsert=True, verbose=verbose, **ingest_kwargs
+        )
+        summary["chunks_per_sec"] = stats["chunks_per_sec"]
+    if to_embed or removed:
+        # Answers cached against the old contents (answer_cache.py) are now stale
+        collection.modify(metadata={**(collection.metadata or {}), VERSION_KEY: uuid.uuid4().hex})
+    summary["version"] = collection_version(collection)
+    return summary
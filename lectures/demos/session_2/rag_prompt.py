@@ -0,0 +1,236 @@
+"""
+Prompt assembly for the paper Q&A RAG pipeline.
+
+Shared by `rag_query()` in the demo and by the concurrent query service so
+both send the model exactly the same context for the same retrieved chunks.
+
+Retrieved passages are not pasted in verbatim. `assemble_context()`:
+
+1. drops near-duplicates of a higher-ranked passage (MinHash estimate of
+   word 3-gram Jaccard similarity >= `dedup_threshold`)
+2. counts tokens with the target model's tokenizer (`litellm.token_counter`)
+3. packs passages in retrieval order into `max_tokens` for the whole
+   prompt, skipping those that no longer fit (a single passage larger than
+   the budget is cut to fit)
+
+Benchmark (prompt tokens and end-to-end latency vs k, local mock LLM):
+
+    python rag_prompt.py --bench
+"""
+
+import argparse
+import re
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import litellm
+import numpy as np
+
+DEFAULT_MODEL = "anthropic/claude-sonnet-4-20250514"
+DEFAULT_MAX_TOKENS = 4000
+DEFAULT_DEDUP_THRESHOLD = 0.8
+
+SYSTEM_INSTRUCTIONS = (
+    "You are a genomics research expert. Answer based on the provided paper "
+    "excerpts. Cite sources.\n"
+)
+
+# MinHash: NUM_PERM universal hashes (a * h + b) mod p over 32-bit shingle hashes
+NUM_PERM = 64
+_PRIME = (1 << 61) - 1
+_rng = np.random.default_rng(20240501)
+_A = _rng.integers(1, 1 << 31, NUM_PERM, dtype=np.uint64)[:, None]
+_B = _rng.integers(0, 1 << 31, NUM_PERM, dtype=np.uint64)[:, None]
+_WORDS = re.compile(r"\w+")
+
+
+def count_tokens(text: str, model: str = DEFAULT_MODEL) -> int:
+    return litellm.token_counter(model=model, text=text)
+
+
+def minhash(text: str, shingle: int = 3) -> np.ndarray:
+    """MinHash signature of the text's lowercased word n-grams."""
+    words = _WORDS.findall(text.lower())
+    grams = {" ".join(words[i:i + shingle]) for i in range(max(1, len(words) - shingle + 1))}
+    hashes = np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams),
+                         dtype=np.uint64, count=len(grams))
+    return ((_A * hashes + _B) % _PRIME).min(axis=1)
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of two MinHash signatures."""
+    return float(np.mean(a == b))
+
+
+def source_label(i: int, metadata: Dict) -> str:
+    return (
+        f"[Source {i}] {metadata['title']} ({metadata['authors']}, {metadata['year']})"
+        f" - {metadata['section'].title()}:"
+    )
+
+
+def render_context(question: str, documents: List[str], metadatas: List[Dict]) -> str:
+    """Numbered, cited excerpts followed by the question."""
+    context_parts = [SYSTEM_INSTRUCTIONS]
+    context_parts.append("Retrieved Information:\n")
+
+    for i, (doc, metadata) in enumerate(zip(documents, metadatas), 1):
+        context_parts.append("\n" + source_label(i, metadata))
+        context_parts.append(doc)
+
+    context_parts.append(f"\n\nQuestion: {question}")
+    context_parts.append(
+        "\nAnswer based on the sources above. Include citations like [Source 1]."
+    )
+    return "\n".join(context_parts)
+
+
+def _truncate(text: str, max_tokens: int, model: str) -> str:
+    """Longest word prefix of `text` within `max_tokens`."""
+    words = text.split()
+    low, high = 0, len(words)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if count_tokens(" ".join(words[:mid]), model) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return " ".join(words[:low])
+
+
+def assemble_context(
+    question: str,
+    documents: List[str],
+    metadatas: List[Dict],
+    model: str = DEFAULT_MODEL,
+    max_tokens: Optional[int] = DEFAULT_MAX_TOKENS,
+    dedup_threshold: Optional[float] = DEFAULT_DEDUP_THRESHOLD,
+) -> Tuple[str, Dict]:
+    """
+    Deduplicated, token-budgeted prompt for `documents` (best first).
+
+    Returns (prompt, stats) with the number of passages kept, dropped as
+    duplicates and dropped for the budget, and the prompt's token count.
+    `max_tokens=None` or `dedup_threshold=None` turn either step off.
+    """
+    stats = {"retrieved": len(documents), "duplicates": 0, "over_budget": 0, "truncated": 0}
+    kept_docs, kept_meta, signatures = [], [], []
+    used = count_tokens(render_context(question, [], []), model)
+    for doc, metadata in zip(documents, metadatas):
+        if dedup_threshold is not None:
+            signature = minhash(doc)
+            if any(similarity(signature, s) >= dedup_threshold for s in signatures):
+                stats["duplicates"] += 1
+                continue
+        if max_tokens is not None:
+            label = source_label(len(kept_docs) + 1, metadata)
+            # Each passage adds "\n" + label, "\n", doc and a joining newline
+            cost = count_tokens(f"\n{label}\n{doc}\n", model)
+            if used + cost > max_tokens:
+                room = max_tokens - used - count_tokens(f"\n{label}\n\n", model)
+                if kept_docs or room <= 0:
+                    stats["over_budget"] += 1
+                    continue
+                doc = _truncate(doc, room, model)
+                cost = count_tokens(f"\n{label}\n{doc}\n", model)
+                stats["truncated"] += 1
+            used += cost
+        kept_docs.append(doc)
+        kept_meta.append(metadata)
+        if dedup_threshold is not None:
+            signatures.append(signature)
+
+    prompt = render_context(question, kept_docs, kept_meta)
+    stats.update(passages=len(kept_docs), tokens=count_tokens(prompt, model))
+    return prompt, stats
+
+
+def build_context(question: str, documents: List[str], metadatas: List[Dict],
+                  model: str = DEFAULT_MODEL, max_tokens: Optional[int] = DEFAULT_MAX_TOKENS) -> str:
+    """The prompt from `assemble_context()`, without the stats."""
+    return assemble_context(question, documents, metadatas, model, max_tokens)[0]
+
+
+def retrieved_passages(k: int, seed: int = 0, duplicate_rate: float = 0.3) -> Tuple[List[str], List[Dict]]:
+    """
+    Top-k passages as a paper index returns them: section-sized chunks, a
+    share of which are near-copies of a higher-ranked one (the same section
+    from a preprint and the published version, or re-ingested files).
+    """
+    import random
+
+    from rag_ingest import synthetic_chunks
+
+    rng = random.Random(seed)
+    chunks = synthetic_chunks(k, seed)
+    documents, metadatas = [], []
+    for chunk in chunks:
+        if documents and rng.random() < duplicate_rate:
+            words = rng.choice(documents).split()
+            for _ in range(max(1, len(words) // 50)):  # a few edited words
+                words[rng.randrange(len(words))] = rng.choice(words)
+            documents.append(" ".join(words))
+        else:
+            documents.append(chunk["text"])
+        metadatas.append(chunk["metadata"])
+    return documents, metadatas
+
+
+def benchmark(ks=(3, 5, 10, 20, 40), max_tokens: int = DEFAULT_MAX_TOKENS, repeats: int = 3,
+              latency: float = 0.3, prefill: float = 0.1):
+    """Verbatim vs packed prompts over a local mock LLM whose latency grows with prompt size."""
+    import sys
+    import threading
+    from pathlib import Path
+
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))  # lectures/mock_llm_server.py
+    import mock_llm_server
+
+    server = mock_llm_server.serve(port=0, latency=latency, jitter=0.0, prefill=prefill)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    completion = {"model": "openai/mock", "api_key": "mock",
+                  "api_base": f"http://127.0.0.1:{server.server_address[1]}/v1"}
+    question = "What sequencing platforms and variant callers were used?"
+    # Load the tokenizer and open the connection before timing anything
+    count_tokens(question)
+    litellm.completion(messages=[{"role": "user", "content": question}], **completion)
+
+    print(f"Budget {max_tokens} tokens ({DEFAULT_MODEL} tokenizer); mock LLM "
+          f"{latency * 1000:.0f} ms + {prefill * 1000:.0f} ms per 1k prompt tokens")
+    print(f"  {'k':>3s} {'verbatim tok':>12s} {'packed tok':>10s} {'kept':>5s} {'dups':>5s} "
+          f"{'over':>4s} {'assemble ms':>11s} {'verbatim s':>10s} {'packed s':>9s}")
+    for k in ks:
+        documents, metadatas = retrieved_passages(k)
+        verbatim = render_context(question, documents, metadatas)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            packed, stats = assemble_context(question, documents, metadatas, max_tokens=max_tokens)
+        assemble = (time.perf_counter() - start) / repeats
+        totals = []
+        for prompt, extra in ((verbatim, 0.0), (packed, assemble)):
+            start = time.perf_counter()
+            for _ in range(repeats):
+                litellm.completion(messages=[{"role": "user", "content": prompt}], **completion)
+            totals.append((time.perf_counter() - start) / repeats + extra)
+        print(f"  {k:3d} {count_tokens(verbatim):12d} {stats['tokens']:10d} {stats['passages']:5d} "
+              f"{stats['duplicates']:5d} {stats['over_budget']:4d} {assemble * 1000:11.1f} "
+              f"{totals[0]:10.2f} {totals[1]:9.2f}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="RAG prompt assembly")
+    parser.add_argument("--bench", action="store_true",
+                        help="prompt tokens and latency vs k against a local mock LLM")
+    parser.add_argument("--k", type=int, nargs="+", default=[3, 5, 10, 20, 40])
+    parser.add_argument("--max-tokens", type=int, default=DEFAULT_MAX_TOKENS)
+    parser.add_argument("--latency", type=float, default=0.3, help="mock LLM seconds per call")
+    parser.add_argument("--prefill", type=float, default=0.1,
+                        help="mock LLM seconds per 1000 prompt tokens")
+    args = parser.parse_args()
+
+    if args.bench:
+        benchmark(args.k, args.max_tokens, latency=args.latency, prefill=args.prefill)
+    else:
+        parser.print_help()
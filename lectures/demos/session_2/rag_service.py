@@ -0,0 +1,520 @@
+"""
+Concurrent query service for the paper Q&A RAG index.
+
+`rag_query()` in the demo answers one question at a time. This service lets
+a whole workshop room ask questions at once:
+
+- questions arriving within a few milliseconds of each other are grouped,
+  embedded with one embedding call and retrieved with one multi-query
+  `collection.query` call
+- retrieval is the demo's: `HybridRetriever` (exact-term route, or vector +
+  BM25 fused with RRF) and, with `--rerank`, the cross-encoder reranker;
+  `--dense-only` uses the vector ranking alone
+- answers are generated with `acompletion(stream=True)` and streamed back
+  to the caller as tokens arrive
+- retrieval time, time-to-first-token and total latency are recorded per
+  question and reported as p50/p95/p99
+- with `--answer-cache`, repeated and paraphrased questions are answered
+  from `answer_cache.SemanticAnswerCache` (looked up with the embeddings
+  the retrieval batch computes anyway) and skip retrieval and generation
+
+Serve a persistent index built by the demo (`PAPER_QA_DB=paper_index`):
+
+    python rag_service.py --serve --db paper_index --port 8765 --answer-cache
+    curl -N -d '{"question": "What sequencing platforms were used?"}' localhost:8765/ask
+    curl localhost:8765/stats
+
+Load test against a synthetic index and the mock LLM server in lectures/:
+
+    python ../../mock_llm_server.py --port 8080 &
+    python rag_service.py --bench --users 40 --questions 400 \\
+        --model openai/mock --api-base http://127.0.0.1:8080/v1 --api-key mock
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+import litellm
+
+from answer_cache import DEFAULT_THRESHOLD as CACHE_THRESHOLD, SemanticAnswerCache
+from rag_prompt import build_context
+from reranker import DEFAULT_CANDIDATES as RERANK_CANDIDATES
+
+DEFAULT_MODEL = "anthropic/claude-sonnet-4-20250514"
+
+
+class LatencyTracker:
+    """Collects named latency samples and reports percentiles."""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+
+    def record(self, name: str, seconds: float):
+        self.samples.setdefault(name, []).append(seconds)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        report = {}
+        for name, values in self.samples.items():
+            if len(values) >= 2:
+                cuts = statistics.quantiles(values, n=100, method="inclusive")
+                p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+            else:
+                p50 = p95 = p99 = values[0]
+            report[name] = {
+                "count": len(values),
+                "mean": statistics.fmean(values),
+                "p50": p50,
+                "p95": p95,
+                "p99": p99,
+            }
+        return report
+
+    def format(self) -> str:
+        lines = []
+        for name, s in self.summary().items():
+            lines.append(
+                f"  {name:<14} n={s['count']:<5} mean={s['mean'] * 1000:8.1f}ms "
+                f"p50={s['p50'] * 1000:8.1f}ms p95={s['p95'] * 1000:8.1f}ms "
+                f"p99={s['p99'] * 1000:8.1f}ms"
+            )
+        return "\n".join(lines)
+
+
+class RetrievalBatcher:
+    """
+    Coalesces concurrent retrieval requests into multi-query calls.
+
+    The first waiting question opens a batch; it is flushed when `max_batch`
+    questions have arrived or `max_wait` seconds have passed.
+    """
+
+    def __init__(
+        self,
+        collection,
+        embed_fn: Optional[Callable[[List[str]], List[List[float]]]],
+        top_k: int = 3,
+        max_batch: int = 32,
+        max_wait: float = 0.005,
+        cache=None,
+        retriever=None,
+        reranker=None,
+    ):
+        self.collection = collection
+        self.embed_fn = embed_fn
+        self.cache = cache
+        self.retriever = retriever
+        self.reranker = reranker
+        self.top_k = top_k
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.batch_sizes: List[int] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def retrieve(self, question: str) -> Dict:
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((question, future))
+        return await future
+
+    def _query(self, questions: List[str]) -> List[Dict]:
+        """Per question: the retrieved chunks, or the answer cache hit (`lookup`)."""
+        embeddings = self.embed_fn(questions) if self.embed_fn is not None else None
+        results = [{"lookup": None} for _ in questions]
+        if self.cache is not None:
+            for i, question in enumerate(questions):
+                lookup = self.cache.lookup(question, embeddings[i] if embeddings else None)
+                results[i]["lookup"] = lookup
+        misses = [i for i, r in enumerate(results) if not (r["lookup"] and r["lookup"].hit)]
+        if not misses:
+            return results
+        asked = [questions[i] for i in misses]
+        vectors = [embeddings[i] for i in misses] if embeddings else None
+        if self.retriever is not None:
+            depth = self.reranker.candidates if self.reranker is not None else self.top_k
+            hits = self.retriever.retrieve_many(asked, depth, vectors)
+            if self.reranker is not None:
+                hits = [self.reranker.rerank(q, h, top_n=self.top_k) for q, h in zip(asked, hits)]
+        else:
+            query = {"query_texts": asked} if vectors is None else {"query_embeddings": vectors}
+            found = self.collection.query(**query, n_results=self.top_k)
+            hits = [{"route": "vector", "documents": found["documents"][j],
+                     "metadatas": found["metadatas"][j],
+                     "scores": [1 - d for d in found["distances"][j]]} for j in range(len(misses))]
+        for hit, i in zip(hits, misses):
+            results[i].update(
+                documents=hit["documents"], metadatas=hit["metadatas"],
+                scores=hit["scores"], route=hit["route"],
+            )
+        return results
+
+    async def _loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            self.batch_sizes.append(len(batch))
+            questions = [q for q, _ in batch]
+            try:
+                results = await loop.run_in_executor(None, self._query, questions)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for result, (_, future) in zip(results, batch):
+                if not future.done():
+                    future.set_result(result)
+
+
+class RagService:
+    """Answers many questions concurrently with batched retrieval and streaming."""
+
+    def __init__(
+        self,
+        collection,
+        embed_fn: Optional[Callable[[List[str]], List[List[float]]]] = None,
+        model: str = DEFAULT_MODEL,
+        top_k: int = 3,
+        max_batch: int = 32,
+        max_wait: float = 0.005,
+        max_generations: int = 64,
+        cache=None,
+        retriever=None,
+        reranker=None,
+        **completion_kwargs,
+    ):
+        self.model = model
+        self.completion_kwargs = completion_kwargs
+        self.cache = cache
+        self.reranker = reranker
+        self.retriever = RetrievalBatcher(collection, embed_fn, top_k, max_batch, max_wait, cache,
+                                          retriever, reranker)
+        self.generations = asyncio.Semaphore(max_generations)
+        self.latency = LatencyTracker()
+
+    async def start(self):
+        self.retriever.start()
+
+    async def stop(self):
+        await self.retriever.stop()
+
+    async def ask(self, question: str) -> AsyncIterator[Dict]:
+        """
+        Answer `question`, yielding events as they happen:
+
+        {"type": "sources", "sources": [...]}, then {"type": "token", "text": ...}
+        for each streamed delta, then {"type": "done", "answer": ..., "timings": {...}}.
+        A cached answer arrives as a single token event and "cached": true.
+        """
+        start = time.perf_counter()
+        results = await self.retriever.retrieve(question)
+        retrieved = time.perf_counter()
+        self.latency.record("retrieval", retrieved - start)
+
+        lookup = results["lookup"]
+        if lookup is not None and lookup.hit:
+            self.latency.record("first_token", retrieved - start)
+            self.latency.record("total", retrieved - start)
+            yield {"type": "sources", "sources": lookup.hit.sources}
+            yield {"type": "token", "text": lookup.hit.answer}
+            timings = {"retrieval": retrieved - start, "first_token": retrieved - start,
+                       "total": retrieved - start}
+            yield {"type": "done", "answer": lookup.hit.answer, "timings": timings, "cached": True,
+                   "cached_question": lookup.hit.question, "similarity": lookup.similarity}
+            return
+
+        sources = [
+            {"title": m["title"], "section": m["section"], "year": m["year"], "score": score}
+            for m, score in zip(results["metadatas"], results["scores"])
+        ]
+        yield {"type": "sources", "sources": sources}
+
+        prompt = build_context(question, results["documents"], results["metadatas"], self.model)
+        parts = []
+        first_token = None
+        async with self.generations:
+            response = await litellm.acompletion(
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+                stream=True,
+                **self.completion_kwargs,
+            )
+            async for chunk in response:
+                text = chunk.choices[0].delta.content if chunk.choices else None
+                if not text:
+                    continue
+                if first_token is None:
+                    first_token = time.perf_counter()
+                    self.latency.record("first_token", first_token - start)
+                parts.append(text)
+                yield {"type": "token", "text": text}
+
+        finished = time.perf_counter()
+        self.latency.record("total", finished - start)
+        if lookup is not None:
+            self.cache.store(lookup, "".join(parts), sources, seconds=finished - start)
+        yield {
+            "type": "done",
+            "answer": "".join(parts),
+            "timings": {
+                "retrieval": retrieved - start,
+                "first_token": (first_token or finished) - start,
+                "total": finished - start,
+            },
+        }
+
+    async def answer(self, question: str) -> Dict:
+        """Non-streaming convenience wrapper returning the final event plus sources."""
+        sources = []
+        async for event in self.ask(question):
+            if event["type"] == "sources":
+                sources = event["sources"]
+            elif event["type"] == "done":
+                return dict(event, sources=sources)
+
+    def stats(self) -> Dict:
+        sizes = self.retriever.batch_sizes
+        stats = {
+            "latency": self.latency.summary(),
+            "retrieval_batches": len(sizes),
+            "mean_batch_size": statistics.fmean(sizes) if sizes else 0.0,
+        }
+        if self.cache is not None:
+            stats["answer_cache"] = self.cache.stats()
+        if self.reranker is not None:
+            stats["reranker"] = dict(self.reranker.counts)
+        return stats
+
+
+async def serve(service: RagService, host: str, port: int):
+    """Minimal HTTP/1.1 front end: POST /ask streams NDJSON, GET /stats."""
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = (await reader.readline()).decode("latin-1").split()
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1").strip()
+                if not line:
+                    break
+                key, _, value = line.partition(":")
+                headers[key.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get("content-length", 0)))
+            method, path = request_line[0], request_line[1]
+
+            if method == "GET" and path == "/stats":
+                payload = json.dumps(service.stats()).encode("utf-8")
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    + f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode()
+                    + payload
+                )
+            elif method == "POST" and path == "/ask":
+                question = json.loads(body or b"{}").get("question", "")
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\n"
+                    b"Transfer-Encoding: chunked\r\nConnection: close\r\n\r\n"
+                )
+                async for event in service.ask(question):
+                    line = (json.dumps(event) + "\n").encode("utf-8")
+                    writer.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+                    await writer.drain()
+                writer.write(b"0\r\n\r\n")
+            else:
+                writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            await writer.drain()
+        except Exception as e:
+            print(f"  Request failed: {e}")
+        finally:
+            writer.close()
+
+    await service.start()
+    server = await asyncio.start_server(handle, host, port)
+    print(f"RAG service listening on http://{host}:{port} (POST /ask, GET /stats)")
+    async with server:
+        await server.serve_forever()
+
+
+async def load_test(service: RagService, questions: List[str], users: int):
+    """`users` concurrent clients working through `questions`."""
+    await service.start()
+    queue: asyncio.Queue = asyncio.Queue()
+    for q in questions:
+        queue.put_nowait(q)
+
+    async def user():
+        while not queue.empty():
+            await service.answer(queue.get_nowait())
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(users)))
+    elapsed = time.perf_counter() - start
+    await service.stop()
+
+    stats = service.stats()
+    print(f"Answered {len(questions)} questions with {users} concurrent users "
+          f"in {elapsed:.1f}s ({len(questions) / elapsed:.1f} questions/sec)")
+    print(f"Retrieval batches: {stats['retrieval_batches']} "
+          f"(mean {stats['mean_batch_size']:.1f} questions per collection.query)")
+    print(service.latency.format())
+    if service.cache is not None:
+        print(service.cache.format_stats())
+    if service.reranker is not None:
+        print(service.reranker.format_stats())
+
+
+def benchmark_service(args, completion_kwargs):
+    import chromadb
+    from chromadb.config import Settings
+
+    from rag_ingest import StubEmbedder, ingest_chunks, synthetic_chunks
+
+    client = chromadb.Client(Settings(anonymized_telemetry=False, is_persistent=False))
+    collection = client.create_collection("bench_service")
+    ingest_chunks(collection, synthetic_chunks(args.chunks),
+                  embed_fn=StubEmbedder(latency=0), verbose=False)
+    embed_fn = StubEmbedder(latency=args.embed_latency)
+
+    topics = ["sequencing platforms", "variant counts", "long-read advantages",
+              "single-cell clustering", "structural variants", "library preparation"]
+    if args.answer_cache:
+        # A room asking the same few questions, worded a few ways
+        questions = [f"What do the papers say about {topics[i % len(topics)]}"
+                     + ("?" if i % 3 else ", briefly?") for i in range(args.questions)]
+    else:
+        questions = [f"What do the papers say about {topics[i % len(topics)]} ({i})?"
+                     for i in range(args.questions)]
+    cache = None
+    if args.answer_cache:
+        from rag_index import collection_version
+
+        cache = SemanticAnswerCache(version_fn=lambda: collection_version(collection),
+                                    threshold=args.cache_threshold, ttl=args.cache_ttl)
+    reranker = None
+    if args.rerank:
+        from reranker import Reranker, StubCrossEncoder
+
+        reranker = Reranker(StubCrossEncoder(), top_n=args.top_k, candidates=args.rerank_candidates,
+                            budget=args.rerank_budget)
+    service = RagService(collection, embed_fn, model=args.model, top_k=args.top_k,
+                         max_batch=args.max_batch, cache=cache,
+                         retriever=hybrid_retriever(collection, embed_fn, args), reranker=reranker,
+                         **completion_kwargs)
+    asyncio.run(load_test(service, questions, args.users))
+
+
+def hybrid_retriever(collection, embed_fn, args):
+    """The demo's `HybridRetriever` over `collection`, or None with --dense-only."""
+    if args.dense_only:
+        return None
+    from hybrid_search import BM25Index, HybridRetriever
+
+    return HybridRetriever(collection, BM25Index.from_collection(collection), embed_fn=embed_fn)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent RAG query service")
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--serve", action="store_true", help="serve a persistent index over HTTP")
+    mode.add_argument("--bench", action="store_true", help="load test against a synthetic index")
+    parser.add_argument("--db", default="paper_index", help="PAPER_QA_DB directory for --serve")
+    parser.add_argument("--ef-search", type=int, default=None,
+                        help="HNSW query candidate list size for --serve (recall vs latency)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--api-base", default=None)
+    parser.add_argument("--api-key", default=None)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--users", type=int, default=40)
+    parser.add_argument("--questions", type=int, default=400)
+    parser.add_argument("--chunks", type=int, default=5000)
+    parser.add_argument("--embed-latency", type=float, default=0.05,
+                        help="stub seconds per query embedding call")
+    parser.add_argument("--answer-cache", action="store_true",
+                        help="answer repeated and paraphrased questions from a semantic cache")
+    parser.add_argument("--cache-threshold", type=float, default=CACHE_THRESHOLD,
+                        help="cosine similarity for an answer cache hit")
+    parser.add_argument("--cache-ttl", type=float, default=3600, help="seconds a cached answer lives")
+    parser.add_argument("--dense-only", action="store_true",
+                        help="vector search only, without the BM25 index and RRF fusion of rag_query")
+    parser.add_argument("--rerank", action="store_true",
+                        help="rerank candidates with the cross-encoder (a stub for --bench)")
+    parser.add_argument("--rerank-candidates", type=int, default=RERANK_CANDIDATES,
+                        help="chunks retrieved for reranking")
+    parser.add_argument("--rerank-budget", type=float, default=None,
+                        help="skip reranking when its estimated cost exceeds this many seconds")
+    args = parser.parse_args()
+
+    completion_kwargs = {}
+    if args.api_base:
+        completion_kwargs["api_base"] = args.api_base
+    if args.api_key:
+        completion_kwargs["api_key"] = args.api_key
+
+    if args.bench:
+        benchmark_service(args, completion_kwargs)
+    else:
+        from rag_index import load_manifest, open_collection, resolve_embedder
+
+        # Serve the index exactly as built: same embedding model, no fallback
+        # to another model and never a rebuild
+        manifest = load_manifest(args.db)
+        if not manifest.get("embedding_model"):
+            parser.error(f"no {args.db}/manifest.json; build the index first "
+                         f"(PAPER_QA_DB={args.db} python demo_1_paper_qa.py)")
+        try:
+            embed_fn, embedding_model = resolve_embedder(manifest["embedding_model"], fallback=False)
+        except RuntimeError as e:
+            parser.error(f"cannot embed queries for {args.db}: {e}")
+        hnsw = None
+        if args.ef_search and manifest.get("hnsw"):
+            hnsw = dict(manifest["hnsw"], ef_search=args.ef_search)
+        collection, _ = open_collection(args.db, "genomics_papers", embedding_model, hnsw=hnsw)
+        cache = None
+        if args.answer_cache:
+            import chromadb
+            from chromadb.config import Settings
+
+            from rag_index import collection_version
+
+            # Re-read the version from disk: the demo may re-sync the index meanwhile
+            client = chromadb.PersistentClient(path=args.db, settings=Settings(anonymized_telemetry=False))
+            cache = SemanticAnswerCache(
+                version_fn=lambda: collection_version(client.get_collection(collection.name)),
+                threshold=args.cache_threshold, ttl=args.cache_ttl, version_check_interval=1.0,
+            )
+        reranker = None
+        if args.rerank:
+            from reranker import load_reranker
+
+            reranker = load_reranker(top_n=args.top_k, candidates=args.rerank_candidates,
+                                     budget=args.rerank_budget)
+        service = RagService(collection, embed_fn, model=args.model, top_k=args.top_k,
+                             max_batch=args.max_batch, cache=cache,
+                             retriever=hybrid_retriever(collection, embed_fn, args), reranker=reranker,
+                             **completion_kwargs)
+        asyncio.run(serve(service, args.host, args.port))
@@ -0,0 +1,326 @@
+"""
+Cross-encoder reranking between retrieval and generation for the paper Q&A demo.
+
+`rag_query()` used to send the retriever's top-k straight to the LLM. With a
+reranker it retrieves a wider candidate set (`candidates`, default 20),
+scores every (question, passage) pair with a local CPU cross-encoder and
+passes only the best `top_n` to the prompt, so the LLM reads 3 strong
+passages instead of 10 middling ones.
+
+- `OnnxCrossEncoder` runs an ms-marco MiniLM cross-encoder with ONNX Runtime,
+  in length-bucketed batches across all cores (like `local_embedder.py`)
+- `Reranker` keeps a running estimate of scoring cost per token and skips
+  reranking when the candidates would take longer than `budget` seconds,
+  falling back to the retriever's order
+
+The model directory must contain `model.onnx` and `tokenizer.json` for a
+sequence-classification cross-encoder (one relevance logit per pair), e.g.
+cross-encoder/ms-marco-MiniLM-L-6-v2 exported with `optimum-cli export onnx`.
+Set RERANK_MODEL_DIR to it.
+
+Benchmark (recall@3, rerank latency and LLM latency vs candidates; local mock LLM):
+
+    python reranker.py --bench --candidates 10 20 40 --budget 0.05
+"""
+
+import argparse
+import os
+import random
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+DEFAULT_MODEL_DIR = os.path.join(
+    os.path.expanduser("~"), ".cache", "rerank_models", "ms-marco-MiniLM-L-6-v2", "onnx"
+)
+MODEL_NAME = "local/ms-marco-MiniLM-L-6-v2"
+DEFAULT_CANDIDATES = 20
+DEFAULT_TOP_N = 3
+
+
+class OnnxCrossEncoder:
+    """Length-bucketed, multi-threaded ONNX cross-encoder: one relevance score per pair."""
+
+    def __init__(
+        self,
+        model_dir: Optional[str] = None,
+        threads: Optional[int] = None,
+        batch_size: int = 16,
+        max_length: int = 256,
+    ):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.model_dir = model_dir or os.environ.get("RERANK_MODEL_DIR", DEFAULT_MODEL_DIR)
+        if not os.path.exists(os.path.join(self.model_dir, "model.onnx")):
+            raise FileNotFoundError(
+                f"No model.onnx in {self.model_dir}; set RERANK_MODEL_DIR "
+                "to a directory containing model.onnx and tokenizer.json"
+            )
+        self.threads = threads or os.cpu_count() or 1
+        self.batch_size = batch_size
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(self.model_dir, "tokenizer.json"))
+        # Cut the passage, never the question, when a pair is too long
+        self.tokenizer.enable_truncation(max_length=max_length, strategy="only_second")
+        self.tokenizer.no_padding()
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = self.threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            os.path.join(self.model_dir, "model.onnx"),
+            sess_options=options,
+            providers=["CPUExecutionProvider"],
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def _encode(self, question: str, documents: List[str]):
+        return self.tokenizer.encode_batch([(question, doc) for doc in documents])
+
+    def tokens(self, question: str, documents: List[str]) -> int:
+        """Tokens the model will read for these pairs (after truncation)."""
+        return sum(len(e.ids) for e in self._encode(question, documents))
+
+    def score(self, question: str, documents: List[str]) -> np.ndarray:
+        """Relevance logits for (question, document) pairs, in input order."""
+        scores = np.zeros(len(documents), dtype=np.float32)
+        if not documents:
+            return scores
+        encodings = self._encode(question, documents)
+        lengths = np.array([len(e.ids) for e in encodings])
+        order = np.argsort(lengths, kind="stable")
+        for start in range(0, len(order), self.batch_size):
+            idx = order[start:start + self.batch_size]
+            width = int(lengths[idx].max())
+            ids = np.zeros((len(idx), width), dtype=np.int64)
+            mask = np.zeros((len(idx), width), dtype=np.int64)
+            types = np.zeros((len(idx), width), dtype=np.int64)
+            for row, i in enumerate(idx):
+                n = lengths[i]
+                ids[row, :n] = encodings[i].ids
+                mask[row, :n] = 1
+                types[row, :n] = encodings[i].type_ids
+            feeds = {"input_ids": ids, "attention_mask": mask}
+            if "token_type_ids" in self.input_names:
+                feeds["token_type_ids"] = types
+            scores[idx] = self.session.run(None, feeds)[0][:, 0]
+        return scores
+
+
+class Reranker:
+    """
+    Rescore retrieved candidates and keep the best `top_n`, within a latency budget.
+
+    `budget` (seconds, None for no limit) is checked against an estimate:
+    the pairs' token count times the running average cost per token. The
+    scorer is warmed up on construction so the first measurement is not a
+    cold start; the first call is always scored, to measure that cost, and
+    after `probe_every` skips in a row one call is scored anyway so the
+    estimate can recover from a slow outlier.
+    """
+
+    def __init__(self, scorer, top_n: int = DEFAULT_TOP_N, candidates: int = DEFAULT_CANDIDATES,
+                 budget: Optional[float] = None, probe_every: int = 10):
+        self.scorer = scorer
+        self.top_n = top_n
+        self.candidates = candidates
+        self.budget = budget
+        self.probe_every = probe_every
+        self.seconds_per_token: Optional[float] = None
+        self.counts = {"reranked": 0, "skipped": 0}
+        self.seconds = 0.0
+        self._skipped_in_row = 0
+        # Session creation, allocator and kernel selection happen on the first run
+        self.scorer.score("warm up", ["warm up the cross-encoder"] * 2)
+
+    def estimate(self, tokens: int) -> Optional[float]:
+        return None if self.seconds_per_token is None else tokens * self.seconds_per_token
+
+    def rerank(self, question: str, results: Dict, top_n: Optional[int] = None) -> Dict:
+        """
+        `results` as returned by `HybridRetriever.retrieve()`, best first.
+        Returns the same keys cut to `top_n`, plus `reranked` (bool),
+        `rerank_seconds` and `candidates` (how many were considered).
+        """
+        top_n = top_n or self.top_n
+        documents = results["documents"]
+        keep = list(range(min(top_n, len(documents))))
+        reranked, seconds = False, 0.0
+        if len(documents) > 1:
+            tokens = self.scorer.tokens(question, documents)
+            estimate = self.estimate(tokens)
+            probe = self._skipped_in_row >= self.probe_every
+            if self.budget is None or estimate is None or estimate <= self.budget or probe:
+                start = time.perf_counter()
+                scores = self.scorer.score(question, documents)
+                seconds = time.perf_counter() - start
+                per_token = seconds / max(1, tokens)
+                # A probe replaces the estimate that kept reranking off
+                self.seconds_per_token = per_token if self.seconds_per_token is None or probe else (
+                    0.8 * self.seconds_per_token + 0.2 * per_token)
+                keep = [int(i) for i in np.argsort(-scores, kind="stable")[:top_n]]
+                results = {**results, "scores": [float(s) for s in scores]}
+                reranked = True
+            self._skipped_in_row = 0 if reranked else self._skipped_in_row + 1
+            self.counts["reranked" if reranked else "skipped"] += 1
+            self.seconds += seconds
+        out = {key: [value[i] for i in keep] for key, value in results.items() if isinstance(value, list)}
+        out.update({key: value for key, value in results.items() if not isinstance(value, list)})
+        out.update(reranked=reranked, rerank_seconds=seconds, candidates=len(documents))
+        return out
+
+    def format_stats(self) -> str:
+        total = self.counts["reranked"] + self.counts["skipped"]
+        mean = self.seconds / self.counts["reranked"] * 1000 if self.counts["reranked"] else 0.0
+        return (f"Reranker: {self.counts['reranked']}/{total} queries reranked "
+                f"({self.counts['skipped']} skipped for the budget), {mean:.1f} ms mean")
+
+
+def load_reranker(**kwargs) -> Optional[Reranker]:
+    """A `Reranker` over the local ONNX cross-encoder, or None if it is not installed."""
+    try:
+        return Reranker(OnnxCrossEncoder(), **kwargs)
+    except (FileNotFoundError, ImportError) as e:
+        print(f"    Note: reranking disabled ({e})")
+        return None
+
+
+class StubCrossEncoder:
+    """
+    Benchmark stand-in when no cross-encoder is installed: scores pairs by
+    question-term overlap and sleeps `latency` seconds per 1000 tokens.
+    """
+
+    def __init__(self, latency: float = 0.01):
+        from hybrid_search import tokenize
+
+        self._tokenize = tokenize
+        self.latency = latency
+
+    def tokens(self, question: str, documents: List[str]) -> int:
+        from rag_ingest import count_tokens
+
+        return sum(count_tokens(question) + count_tokens(doc) for doc in documents)
+
+    def score(self, question: str, documents: List[str]) -> np.ndarray:
+        time.sleep(self.latency * self.tokens(question, documents) / 1000)
+        terms = set(self._tokenize(question))
+        return np.array([len(terms & set(self._tokenize(doc))) / (1 + len(terms)) for doc in documents],
+                        dtype=np.float32)
+
+
+def first_stage(corpus: List[Dict], relevant: int, depth: int, rng: random.Random,
+                top3: float = 0.55) -> List[int]:
+    """
+    Candidate rows as an imperfect retriever ranks them: the relevant chunk
+    is in the top 3 with probability `top3`, otherwise anywhere down to 40
+    (or missed), and the rest are random other chunks.
+    """
+    rank = rng.randrange(3) if rng.random() < top3 else rng.randrange(3, 45)
+    others = [i for i in rng.sample(range(len(corpus)), depth + 1) if i != relevant][:depth]
+    if rank < depth:
+        others.insert(rank, relevant)
+    return others[:depth]
+
+
+def benchmark(candidate_counts=(10, 20, 40), queries: int = 100, top_n: int = DEFAULT_TOP_N,
+              budget: float = 0.05, latency: float = 0.3, prefill: float = 0.1,
+              rerank_latency: float = 0.01):
+    import sys
+    import threading
+    from pathlib import Path
+
+    import litellm
+
+    from hybrid_search import scaled_corpus
+    from rag_prompt import count_tokens, render_context
+
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))  # lectures/mock_llm_server.py
+    import mock_llm_server
+
+    try:
+        scorer, name = OnnxCrossEncoder(), f"ONNX cross-encoder ({MODEL_NAME})"
+    except (FileNotFoundError, ImportError):
+        scorer = StubCrossEncoder(rerank_latency)
+        name = f"stub cross-encoder (term overlap, {rerank_latency * 1000:.0f} ms per 1k tokens)"
+
+    server = mock_llm_server.serve(port=0, latency=latency, jitter=0.0, prefill=prefill)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    completion = {"model": "openai/mock", "api_key": "mock",
+                  "api_base": f"http://127.0.0.1:{server.server_address[1]}/v1"}
+    litellm.completion(messages=[{"role": "user", "content": "warm up"}], **completion)
+
+    chunks, symbols = scaled_corpus(2000)
+    rng = random.Random(0)
+    picks = [rng.randrange(len(chunks)) for _ in range(queries)]
+    questions = [f"Which variants in {symbols[i]} were reported, and how were they sequenced?"
+                 for i in picks]
+    rankings = [first_stage(chunks, i, max(max(candidate_counts), 10), random.Random(q))
+                for q, i in enumerate(picks)]
+    sample = range(0, queries, max(1, queries // 10))  # LLM calls on a sample
+
+    def results_for(rows: List[int]) -> Dict:
+        return {"ids": [chunks[r]["id"] for r in rows], "documents": [chunks[r]["text"] for r in rows],
+                "metadatas": [chunks[r]["metadata"] for r in rows], "scores": [0.0] * len(rows)}
+
+    def llm_seconds(question: str, results: Dict) -> float:
+        start = time.perf_counter()
+        litellm.completion(messages=[{"role": "user", "content": render_context(
+            question, results["documents"], results["metadatas"])}], **completion)
+        return time.perf_counter() - start
+
+    print(f"{queries} questions, {name}; mock LLM {latency * 1000:.0f} ms + "
+          f"{prefill * 1000:.0f} ms per 1k prompt tokens")
+    print(f"  {'pipeline':24s} {'recall@k':>8s} {'prompt tok':>10s} {'rerank p50':>10s} "
+          f"{'p95 ms':>7s} {'skipped':>7s} {'answer s':>8s}")
+
+    def report(label: str, runs: List[Dict], relevant: List[int], llm: List[float], times: List[float]):
+        recall = np.mean([chunks[r]["id"] in out["ids"] for out, r in zip(runs, relevant)])
+        tokens = np.mean([count_tokens(render_context(questions[i], runs[i]["documents"],
+                                                      runs[i]["metadatas"])) for i in sample])
+        ordered = sorted(times) or [0.0]
+        skipped = sum(not out.get("reranked", True) for out in runs)
+        print(f"  {label:24s} {recall:8.2f} {tokens:10.0f} {ordered[len(ordered) // 2] * 1000:10.1f} "
+              f"{ordered[int(0.95 * (len(ordered) - 1))] * 1000:7.1f} {skipped:7d} "
+              f"{np.mean(llm) + (np.mean(times) if times else 0.0):8.2f}")
+
+    for k in (top_n, 10):
+        runs = [results_for(rows[:k]) for rows in rankings]
+        report(f"top-{k}, no rerank", runs, picks,
+               [llm_seconds(questions[i], runs[i]) for i in sample], [])
+    for budget_s in (None, budget):
+        for n in candidate_counts:
+            reranker = Reranker(scorer, top_n=top_n, candidates=n, budget=budget_s)
+            runs, times = [], []
+            for question, rows in zip(questions, rankings):
+                out = reranker.rerank(question, results_for(rows[:n]))
+                runs.append(out)
+                if out["reranked"]:
+                    times.append(out["rerank_seconds"])
+            label = f"rerank {n} -> {top_n}" + ("" if budget_s is None else f", {budget_s * 1000:.0f} ms")
+            report(label, runs, picks, [llm_seconds(questions[i], runs[i]) for i in sample], times)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cross-encoder reranking for RAG")
+    parser.add_argument("--bench", action="store_true", help="recall and latency vs candidate count")
+    parser.add_argument("--candidates", type=int, nargs="+", default=[10, 20, 40])
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-n", type=int, default=DEFAULT_TOP_N)
+    parser.add_argument("--budget", type=float, default=0.05, help="rerank budget in seconds")
+    parser.add_argument("--latency", type=float, default=0.3, help="mock LLM seconds per call")
+    parser.add_argument("--prefill", type=float, default=0.1,
+                        help="mock LLM seconds per 1000 prompt tokens")
+    parser.add_argument("--rerank-latency", type=float, default=0.01,
+                        help="stub cross-encoder seconds per 1000 tokens")
+    args = parser.parse_args()
+
+    if args.bench:
+        benchmark(args.candidates, args.queries, args.top_n, args.budget, args.latency,
+                  args.prefill, args.rerank_latency)
+    else:
+        parser.print_help()
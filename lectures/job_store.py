@@ -0,0 +1,234 @@
+"""
+Resumable, checkpointed job store for long LLM batch runs.
+
+Every job (e.g. one gene set to classify) is a row in a SQLite database in
+WAL mode with its status, prompt hash, raw response and parsed result:
+
+    pending -> running -> done
+                       -> failed  (retry_failed() moves these back to pending)
+
+Because the state lives on disk, a run that crashes or is aborted at job
+3,000 picks up where it stopped, a follow-up run can retry only the
+failures, and adding new jobs leaves completed ones alone. A job whose
+prompt hash changed (different prompt or model) is reset to pending.
+
+Several worker processes can share one store: `claim()` marks a batch of
+pending jobs as running inside a single write transaction, so no job is
+handed to two workers. Jobs left running by a worker that died are claimed
+by another worker once their lease expires.
+
+    store = JobStore("jobs.sqlite")
+    store.add((job_id, prompt_hash, messages) for ...)
+    for job_id, messages in store.iter_claims(worker_id="w1"):
+        ...
+        store.complete(job_id, response_text, {"category": ...})
+
+    python job_store.py jobs.sqlite             # status counts
+    python job_store.py jobs.sqlite retry       # failed -> pending
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+STATUSES = ("pending", "running", "done", "failed")
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class JobStore:
+    """SQLite (WAL) job table shared by one or more worker processes."""
+
+    def __init__(self, path: str, lease_seconds: float = 600):
+        self.path = path
+        self.lease = lease_seconds
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.db = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None, timeout=30
+        )
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                prompt_hash TEXT NOT NULL,
+                messages TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                response TEXT,
+                result TEXT,
+                error TEXT,
+                worker TEXT,
+                claimed_at REAL,
+                updated REAL NOT NULL
+            )
+            """
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS idx_status ON jobs(status, claimed_at)")
+
+    def _write(self, sql_calls):
+        """Run `sql_calls(db)` in one immediate (write-locked) transaction."""
+        with self._lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                result = sql_calls(self.db)
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+        return result
+
+    def add(self, jobs: Iterable[Tuple[str, str, list]]) -> Dict[str, int]:
+        """
+        Register `(job_id, prompt_hash, messages)` jobs.
+
+        New jobs are pending; existing jobs are left alone unless their prompt
+        hash changed, in which case they are reset to pending.
+        """
+        jobs = list(jobs)
+        now = time.time()
+
+        def add_all(db):
+            known = {}
+            ids = [job_id for job_id, _, _ in jobs]
+            for i in range(0, len(ids), 500):
+                part = ids[i:i + 500]
+                known.update(db.execute(
+                    f"SELECT id, prompt_hash FROM jobs WHERE id IN ({','.join('?' * len(part))})",
+                    part,
+                ).fetchall())
+            counts = {"added": 0, "changed": 0, "unchanged": 0}
+            new_rows, changed_rows = [], []
+            for job_id, prompt_hash, messages in jobs:
+                if job_id not in known:
+                    new_rows.append((job_id, prompt_hash, json.dumps(messages), now))
+                    counts["added"] += 1
+                elif known[job_id] != prompt_hash:
+                    changed_rows.append((prompt_hash, json.dumps(messages), now, job_id))
+                    counts["changed"] += 1
+                else:
+                    counts["unchanged"] += 1
+            db.executemany(
+                "INSERT INTO jobs (id, prompt_hash, messages, updated) VALUES (?, ?, ?, ?)",
+                new_rows,
+            )
+            db.executemany(
+                """
+                UPDATE jobs SET prompt_hash = ?, messages = ?, status = 'pending',
+                    attempts = 0, response = NULL, result = NULL, error = NULL,
+                    worker = NULL, claimed_at = NULL, updated = ?
+                WHERE id = ?
+                """,
+                changed_rows,
+            )
+            return counts
+
+        return self._write(add_all)
+
+    def claim(self, worker_id: str, limit: int = 1) -> List[Tuple[str, list]]:
+        """Atomically mark up to `limit` runnable jobs as running for `worker_id`."""
+        now = time.time()
+
+        def claim_some(db):
+            rows = db.execute(
+                """
+                SELECT id, messages FROM jobs
+                WHERE status = 'pending'
+                   OR (status = 'running' AND claimed_at < ? AND worker != ?)
+                ORDER BY status DESC, id LIMIT ?
+                """,
+                (now - self.lease, worker_id, limit),
+            ).fetchall()
+            db.executemany(
+                """
+                UPDATE jobs SET status = 'running', worker = ?, claimed_at = ?,
+                    attempts = attempts + 1, updated = ?
+                WHERE id = ?
+                """,
+                [(worker_id, now, now, job_id) for job_id, _ in rows],
+            )
+            return [(job_id, json.loads(messages)) for job_id, messages in rows]
+
+        return self._write(claim_some)
+
+    def iter_claims(
+        self, worker_id: Optional[str] = None, batch_size: int = 16
+    ) -> Iterator[Tuple[str, list]]:
+        """Yield claimed jobs, claiming the next batch only when this one is used up."""
+        worker_id = worker_id or default_worker_id()
+        while True:
+            batch = self.claim(worker_id, batch_size)
+            if not batch:
+                return
+            yield from batch
+
+    def _finish(self, job_id: str, status: str, response, result, error):
+        now = time.time()
+        blob = json.dumps(result, ensure_ascii=False) if result is not None else None
+        self._write(lambda db: db.execute(
+            """
+            UPDATE jobs SET status = ?, response = ?, result = ?, error = ?,
+                claimed_at = NULL, updated = ?
+            WHERE id = ?
+            """,
+            (status, response, blob, error, now, job_id),
+        ))
+
+    def complete(self, job_id: str, response: str, result: Optional[Dict] = None):
+        self._finish(job_id, "done", response, result, None)
+
+    def fail(self, job_id: str, error: str, response: Optional[str] = None,
+             result: Optional[Dict] = None):
+        self._finish(job_id, "failed", response, result, error)
+
+    def retry_failed(self) -> int:
+        """Move every failed job back to pending; returns how many."""
+        return self._write(lambda db: db.execute(
+            "UPDATE jobs SET status = 'pending', error = NULL, updated = ? "
+            "WHERE status = 'failed'",
+            (time.time(),),
+        ).rowcount)
+
+    def counts(self) -> Dict[str, int]:
+        counts = dict.fromkeys(STATUSES, 0)
+        counts.update(self.db.execute(
+            "SELECT status, COUNT(*) FROM jobs GROUP BY status"
+        ).fetchall())
+        return counts
+
+    def results(self, status: str = "done") -> Iterator[Dict]:
+        """Stored jobs with the given status, with `result` decoded."""
+        for job_id, response, result, error, attempts in self.db.execute(
+            "SELECT id, response, result, error, attempts FROM jobs WHERE status = ? ORDER BY id",
+            (status,),
+        ):
+            yield {"id": job_id, "response": response, "error": error, "attempts": attempts,
+                   **(json.loads(result) if result else {})}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("usage: python job_store.py STORE [status|retry|export]")
+        sys.exit(1)
+    store = JobStore(sys.argv[1])
+    command = sys.argv[2] if len(sys.argv) > 2 else "status"
+    if command == "status":
+        for status, n in store.counts().items():
+            print(f"{status}: {n}")
+    elif command == "retry":
+        print(f"{store.retry_failed()} failed jobs moved back to pending")
+    elif command == "export":
+        for record in store.results():
+            print(json.dumps(record, ensure_ascii=False))
+    else:
+        print(f"Unknown command: {command} (expected status, retry or export)")
+        sys.exit(1)
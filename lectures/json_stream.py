@@ -0,0 +1,160 @@
+"""
+Incremental JSON extraction from streamed LLM output.
+
+Model responses mix prose, markdown code fences and one or more JSON values.
+Instead of waiting for the full text and then splitting on ```json or running
+a greedy `\\{[\\s\\S]*\\}` regex, `JsonStreamParser` consumes the text a chunk
+at a time and returns each JSON value the moment its closing bracket arrives:
+
+- prose and code fences between values are skipped
+- several top-level objects in one response (e.g. four motif
+  classifications) are returned one by one
+- with `unwrap_arrays=True`, the elements of a top-level array are returned
+  individually as each one completes (objects and arrays on their closing
+  bracket, scalars on the following comma or `]`), so downstream processing
+  can start on element 1 while the model is still writing element 2
+
+Candidates that look like JSON but do not parse (e.g. "[Source 1]" in
+prose) are re-read from the character after their opening bracket, so a
+real value nested inside or following them is still found. The re-read is a
+loop, not a recursive call, so long runs of unbalanced brackets are safe.
+
+    parser = JsonStreamParser()
+    for token in stream:
+        for value in parser.feed(token):
+            handle(value)
+"""
+
+import json
+from typing import Any, Iterable, Iterator, List, Optional
+
+OPENERS = {"{": "}", "[": "]"}
+CLOSERS = {"}", "]"}
+
+
+class JsonStreamParser:
+    def __init__(self, unwrap_arrays: bool = False):
+        self.unwrap_arrays = unwrap_arrays
+        self.values: List[Any] = []
+        self._buf: List[str] = []      # text of the current top-level candidate
+        self._stack: List[str] = []    # expected closing brackets
+        self._in_string = False
+        self._escape = False
+        self._element_start: Optional[int] = None
+        self._element_count = 0
+
+    def _reset(self):
+        self._buf = []
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._element_start = None
+        self._element_count = 0
+
+    def _emit(self, text: str, out: List[Any], unwrap: bool = False) -> bool:
+        try:
+            value = json.loads(text)
+        except json.JSONDecodeError:
+            return False
+        values = value if unwrap and isinstance(value, list) else [value]
+        self.values.extend(values)
+        out.extend(values)
+        return True
+
+    def _unwrapping(self) -> bool:
+        return self.unwrap_arrays and self._buf[0] == "["
+
+    def _emit_element(self, end: int, out: List[Any]):
+        element = "".join(self._buf[self._element_start:end])
+        if self._emit(element, out):
+            self._element_count += 1
+        self._element_start = None
+
+    def feed(self, text: str) -> List[Any]:
+        """Consume more text; return the values completed by it."""
+        out: List[Any] = []
+        i = 0
+        while i < len(text):
+            ch = text[i]
+            i += 1
+            if not self._stack:
+                # Outside any value: skip prose until an opening bracket
+                if ch in OPENERS:
+                    self._stack.append(OPENERS[ch])
+                    self._buf = [ch]
+                continue
+
+            self._buf.append(ch)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if (len(self._stack) == 1 and self._element_start is None
+                    and self._unwrapping() and not ch.isspace() and ch not in ",]"):
+                self._element_start = len(self._buf) - 1  # first character of an element
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in OPENERS:
+                self._stack.append(OPENERS[ch])
+            elif ch == "," and len(self._stack) == 1 and self._element_start is not None:
+                self._emit_element(-1, out)  # scalar element ends at the comma
+            elif ch in CLOSERS:
+                if ch != self._stack[-1]:
+                    # mismatched brackets: not JSON after all
+                    text, i = self._rescan() + text[i:], 0
+                    continue
+                self._stack.pop()
+                if len(self._stack) == 1 and self._element_start is not None:
+                    self._emit_element(len(self._buf), out)
+                elif not self._stack:
+                    if self._element_start is not None:
+                        self._emit_element(-1, out)  # last element was a scalar
+                    if self._element_count or self._emit("".join(self._buf), out, self._unwrapping()):
+                        self._reset()
+                    else:
+                        text, i = self._rescan() + text[i:], 0
+        return out
+
+    def _rescan(self) -> str:
+        """Drop the failed candidate's opening bracket; return the text to re-read."""
+        # An array whose elements were already returned is dropped whole:
+        # re-reading it would return them again
+        rest = "" if self._element_count else "".join(self._buf[1:])
+        self._reset()
+        return rest
+
+    def close(self) -> List[Any]:
+        """Signal end of stream and recover values from an unterminated candidate."""
+        out: List[Any] = []
+        while self._stack:
+            out.extend(self.feed(self._rescan()))
+        return out
+
+
+def iter_json(chunks: Iterable[str], unwrap_arrays: bool = False) -> Iterator[Any]:
+    """Yield JSON values from an iterable of text chunks as they complete."""
+    parser = JsonStreamParser(unwrap_arrays=unwrap_arrays)
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.close()
+
+
+def extract_all_json(text: str, unwrap_arrays: bool = False) -> List[Any]:
+    """All JSON values in `text`, in order."""
+    return list(iter_json([text], unwrap_arrays=unwrap_arrays))
+
+
+def extract_json(text: str) -> Optional[Any]:
+    """
+    The JSON value the response is about: the last complete top-level value
+    (chain-of-thought answers put the final JSON after their reasoning), or
+    None if the text contains no parseable JSON.
+    """
+    values = extract_all_json(text)
+    return values[-1] if values else None
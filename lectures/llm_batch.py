@@ -0,0 +1,228 @@
+"""
+Concurrent batch runner for LLM completion jobs.
+
+Runs many independent completion requests through litellm's async API
+(`acompletion`) instead of one blocking `completion()` call at a time:
+
+- a fixed pool of workers bounds the number of requests in flight
+- token buckets keep us under the provider's requests/min and tokens/min quotas
+- 429 and 5xx errors are retried with jittered exponential backoff
+- every finished job is appended to a JSON Lines file as soon as it completes,
+  so an interrupted run keeps everything it already paid for
+
+Example:
+
+    jobs = [("job-1", [{"role": "user", "content": "Hi"}]), ...]
+    stats = asyncio.run(run_batch(jobs, model="anthropic/claude-sonnet-4-20250514",
+                                  out_path="results.jsonl", max_concurrency=16))
+    print(stats.summary())
+"""
+
+import asyncio
+import json
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import litellm
+from llm_cache import acompletion, forget
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+
+
+class TokenBucket:
+    """
+    Async token bucket refilled continuously at `rate_per_minute`.
+
+    `acquire(n)` waits until `n` tokens are available. Requests larger than
+    the bucket capacity are allowed once the bucket is full, so a single
+    oversized prompt cannot deadlock the run.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1.0):
+        async with self._lock:
+            while True:
+                self._refill()
+                needed = min(amount, self.capacity)
+                if self.tokens >= needed:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((needed - self.tokens) / self.rate)
+
+    def debit(self, amount: float):
+        """Charge (or refund, if negative) tokens after the fact."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+
+@dataclass
+class BatchStats:
+    submitted: int = 0
+    completed: int = 0
+    failed: int = 0
+    retries: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    started: float = field(default_factory=time.monotonic)
+    finished: Optional[float] = None
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def throughput(self) -> float:
+        return self.completed / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"{self.completed}/{self.submitted} completed, {self.failed} failed, "
+            f"{self.retries} retries in {self.elapsed:.1f}s "
+            f"({self.throughput:.2f} jobs/sec, "
+            f"{self.prompt_tokens} prompt + {self.completion_tokens} completion tokens)"
+        )
+
+
+def is_retryable(exc: Exception) -> bool:
+    """True for rate limits, timeouts, connection drops and 5xx responses."""
+    if isinstance(
+        exc,
+        (
+            litellm.RateLimitError,
+            litellm.InternalServerError,
+            litellm.ServiceUnavailableError,
+            litellm.APIConnectionError,
+            litellm.Timeout,
+        ),
+    ):
+        return True
+    status = getattr(exc, "status_code", None)
+    return status in RETRYABLE_STATUS
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 60.0) -> float:
+    """Full-jitter exponential backoff: uniform(0, min(cap, base * 2**attempt))."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def estimate_tokens(model: str, messages: List[Dict], max_tokens: int) -> int:
+    try:
+        prompt = litellm.token_counter(model=model, messages=messages)
+    except Exception:
+        prompt = sum(len(m.get("content") or "") for m in messages) // 4
+    return prompt + max_tokens
+
+
+async def run_batch(
+    jobs: Iterable[Tuple[str, List[Dict]]],
+    model: str,
+    out_path: str,
+    max_concurrency: int = 8,
+    requests_per_minute: Optional[float] = None,
+    tokens_per_minute: Optional[float] = None,
+    max_retries: int = 6,
+    max_tokens: int = 512,
+    on_result: Optional[Callable[[str, Optional[str], Optional[str]], Dict]] = None,
+    progress_every: int = 50,
+    **completion_kwargs,
+) -> BatchStats:
+    """
+    Run `(job_id, messages)` pairs concurrently and stream results to `out_path`.
+
+    Each output line is `{"id", "content", "error", "attempts", "latency"}`
+    merged with whatever `on_result(job_id, content, error)` returns, which is
+    where callers parse the response into their own fields. If that sets an
+    "error" for a reply that did arrive (e.g. malformed JSON), the reply is
+    evicted from the response cache so a retry asks the model again.
+    """
+    # Retries are owned by this scheduler, not the provider SDK.
+    completion_kwargs.setdefault("max_retries", 0)
+    stats = BatchStats()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max_concurrency * 2)
+    rpm = TokenBucket(requests_per_minute) if requests_per_minute else None
+    tpm = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+    out = open(out_path, "a", encoding="utf-8")
+
+    def write(record: Dict):
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        out.flush()
+
+    async def call(job_id: str, messages: List[Dict]) -> Dict:
+        estimate = estimate_tokens(model, messages, max_tokens) if tpm else 0
+        start = time.monotonic()
+        for attempt in range(max_retries + 1):
+            if rpm:
+                await rpm.acquire(1)
+            if tpm:
+                await tpm.acquire(estimate)
+            try:
+                response = await acompletion(
+                    model=model, messages=messages, max_tokens=max_tokens, **completion_kwargs
+                )
+            except Exception as e:
+                if attempt < max_retries and is_retryable(e):
+                    stats.retries += 1
+                    await asyncio.sleep(backoff_delay(attempt))
+                    continue
+                return {"id": job_id, "content": None, "error": f"{type(e).__name__}: {e}",
+                        "attempts": attempt + 1, "latency": time.monotonic() - start}
+
+            usage = getattr(response, "usage", None)
+            if usage:
+                stats.prompt_tokens += usage.prompt_tokens or 0
+                stats.completion_tokens += usage.completion_tokens or 0
+                if tpm:
+                    tpm.debit((usage.total_tokens or 0) - estimate)
+            return {"id": job_id, "content": response["choices"][0]["message"]["content"],
+                    "error": None, "attempts": attempt + 1, "latency": time.monotonic() - start}
+
+    async def worker():
+        while True:
+            item = await queue.get()
+            if item is None:
+                queue.task_done()
+                return
+            job_id, messages = item
+            record = await call(job_id, messages)
+            if on_result:
+                record.update(on_result(job_id, record["content"], record["error"]) or {})
+                if record["error"] and record["content"] is not None:
+                    forget(model, messages, max_tokens=max_tokens, **completion_kwargs)
+            write(record)
+            if record["error"]:
+                stats.failed += 1
+            else:
+                stats.completed += 1
+            done = stats.completed + stats.failed
+            if progress_every and done % progress_every == 0:
+                print(f"  [{done}/{stats.submitted}] {stats.throughput:.2f} jobs/sec")
+            queue.task_done()
+
+    workers = [asyncio.create_task(worker()) for _ in range(max_concurrency)]
+    try:
+        for job in jobs:
+            stats.submitted += 1
+            await queue.put(job)
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+    finally:
+        for w in workers:
+            w.cancel()
+        out.close()
+        stats.finished = time.monotonic()
+    return stats
@@ -0,0 +1,258 @@
+"""
+Content-addressed on-disk cache for LLM completions.
+
+Responses are stored in a SQLite database keyed by a SHA256 hash of the
+model, the messages and the sampling parameters, so an identical request
+is answered from disk instead of the provider. Drop it into a script by
+changing the import:
+
+    from litellm import completion      # before
+    from llm_cache import completion    # after
+
+Configuration (environment variables):
+
+    LLM_CACHE=0                 disable the cache entirely
+    LLM_CACHE_PATH=...          database file (default ~/.cache/bu_workshops/llm_cache.sqlite)
+    LLM_CACHE_MAX_AGE_DAYS=30   entries older than this are evicted
+    LLM_CACHE_MAX_MB=512        least recently used entries are evicted above this size
+
+Inspect or clean the cache from the command line:
+
+    python llm_cache.py stats
+    python llm_cache.py evict
+    python llm_cache.py clear
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import litellm
+
+# Arguments that change how a request is sent but not what the model returns
+NON_SEMANTIC_KWARGS = {
+    "api_key",
+    "timeout",
+    "request_timeout",
+    "max_retries",
+    "num_retries",
+    "metadata",
+    "stream",
+    "stream_options",
+    "cache",
+}
+
+DEFAULT_PATH = os.path.join(
+    os.path.expanduser("~"), ".cache", "bu_workshops", "llm_cache.sqlite"
+)
+
+
+def cache_key(model: str, messages: Any, **params) -> str:
+    """Stable hash of everything that determines the model's answer."""
+    payload = {
+        "model": model,
+        "messages": messages,
+        "params": {k: v for k, v in params.items() if k not in NON_SEMANTIC_KWARGS},
+    }
+    blob = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """SQLite-backed response store with age and size based eviction."""
+
+    def __init__(
+        self,
+        path: str = DEFAULT_PATH,
+        max_age_days: float = 30,
+        max_mb: float = 512,
+    ):
+        self.path = path
+        self.max_age = max_age_days * 86400
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._writes_since_evict = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON responses(last_access)")
+
+    def get(self, key: str) -> Optional[Dict]:
+        now = time.time()
+        with self._lock:
+            row = self.db.execute(
+                "SELECT response, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.max_age:
+                self.misses += 1
+                return None
+            self.db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, model: str, response: Dict):
+        blob = json.dumps(response, ensure_ascii=False, default=str)
+        now = time.time()
+        with self._lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, blob, len(blob), now, now),
+            )
+            self._writes_since_evict += 1
+            if self._writes_since_evict >= 100:
+                self._evict_locked()
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            return self.db.execute("DELETE FROM responses WHERE key = ?", (key,)).rowcount > 0
+
+    def evict(self) -> int:
+        """Drop expired entries, then least recently used ones until under size."""
+        with self._lock:
+            return self._evict_locked()
+
+    def _evict_locked(self) -> int:
+        self._writes_since_evict = 0
+        removed = self.db.execute(
+            "DELETE FROM responses WHERE created < ?", (time.time() - self.max_age,)
+        ).rowcount
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total > self.max_bytes:
+            excess = total - self.max_bytes
+            freed = 0
+            doomed = []
+            for key, size in self.db.execute(
+                "SELECT key, size FROM responses ORDER BY last_access"
+            ):
+                doomed.append((key,))
+                freed += size
+                if freed >= excess:
+                    break
+            self.db.executemany("DELETE FROM responses WHERE key = ?", doomed)
+            removed += len(doomed)
+        return removed
+
+    def clear(self):
+        with self._lock:
+            self.db.execute("DELETE FROM responses")
+            self.db.execute("VACUUM")
+
+    def stats(self) -> Dict:
+        entries, size = self.db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "entries": entries,
+            "size_mb": size / 1024 / 1024,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+_cache: Optional[ResponseCache] = None
+
+
+def get_cache() -> Optional[ResponseCache]:
+    """Process-wide cache configured from the environment (None if disabled)."""
+    global _cache
+    if os.environ.get("LLM_CACHE", "1") == "0":
+        return None
+    if _cache is None:
+        _cache = ResponseCache(
+            path=os.environ.get("LLM_CACHE_PATH", DEFAULT_PATH),
+            max_age_days=float(os.environ.get("LLM_CACHE_MAX_AGE_DAYS", 30)),
+            max_mb=float(os.environ.get("LLM_CACHE_MAX_MB", 512)),
+        )
+    return _cache
+
+
+def to_dict(response) -> Dict:
+    if hasattr(response, "model_dump"):
+        return response.model_dump()
+    return dict(response)
+
+
+def lookup(model: str, messages: list, kwargs: Dict):
+    """Return `(cache, key, cached ModelResponse or None)` for a request."""
+    cache = get_cache()
+    if cache is None or kwargs.get("stream") or kwargs.get("cache") is False:
+        return cache, None, None
+    key = cache_key(model, messages, **kwargs)
+    cached = cache.get(key)
+    if cached is not None:
+        return cache, key, litellm.ModelResponse(**cached)
+    return cache, key, None
+
+
+def completion(model: str, messages: list, **kwargs):
+    """Drop-in replacement for `litellm.completion` that consults the cache."""
+    cache, key, hit = lookup(model, messages, kwargs)
+    if hit is not None:
+        return hit
+    kwargs.pop("cache", None)
+    response = litellm.completion(model=model, messages=messages, **kwargs)
+    if key is not None:
+        cache.put(key, model, to_dict(response))
+    return response
+
+
+async def acompletion(model: str, messages: list, **kwargs):
+    """Async counterpart of `completion` for `litellm.acompletion` callers."""
+    cache, key, hit = lookup(model, messages, kwargs)
+    if hit is not None:
+        return hit
+    kwargs.pop("cache", None)
+    response = await litellm.acompletion(model=model, messages=messages, **kwargs)
+    if key is not None:
+        cache.put(key, model, to_dict(response))
+    return response
+
+
+def forget(model: str, messages: list, **kwargs) -> bool:
+    """Drop the cached response for a request, e.g. one whose reply did not parse."""
+    cache = get_cache()
+    if cache is None:
+        return False
+    return cache.delete(cache_key(model, messages, **kwargs))
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    cache = get_cache()
+    if cache is None:
+        print("Cache disabled (LLM_CACHE=0)")
+    elif command == "stats":
+        for name, value in cache.stats().items():
+            print(f"{name}: {value}")
+    elif command == "evict":
+        print(f"Evicted {cache.evict()} entries")
+    elif command == "clear":
+        cache.clear()
+        print(f"Cleared {cache.path}")
+    else:
+        print(f"Unknown command: {command} (expected stats, evict or clear)")
+        sys.exit(1)
@@ -0,0 +1,175 @@
+"""
+Streaming completion output with latency metrics.
+
+`stream_completion()` calls the model with `stream=True`, prints tokens as
+they arrive, and still returns the assembled text for code that parses the
+full response. Every call records:
+
+- ttft: time to first token (what an audience perceives as "waiting")
+- total: time until the last token
+- tokens/sec: completion tokens divided by the generation time after the
+  first token
+
+Responses go through the same on-disk cache as `llm_cache.completion`; a
+cache hit is printed immediately and recorded with `cached=True`.
+
+    result = stream_completion(model=..., messages=[...])
+    data = json.loads(result.text)
+    print_metrics()
+
+Set LLM_METRICS_PATH to also append every call's metrics to a JSON Lines file.
+"""
+
+import json
+import os
+import sys
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, List, Optional
+
+import litellm
+
+from llm_cache import lookup, to_dict
+
+
+@dataclass
+class StreamResult:
+    text: str
+    model: str
+    ttft: float
+    total: float
+    completion_tokens: int
+    cached: bool = False
+
+    @property
+    def tokens_per_sec(self) -> float:
+        generation = self.total - self.ttft
+        return self.completion_tokens / generation if generation > 0 else 0.0
+
+
+METRICS: List[StreamResult] = []
+
+
+def _record(result: StreamResult):
+    METRICS.append(result)
+    path = os.environ.get("LLM_METRICS_PATH")
+    if path:
+        with open(path, "a", encoding="utf-8") as f:
+            record = asdict(result)
+            record.pop("text")
+            record["tokens_per_sec"] = result.tokens_per_sec
+            record["time"] = time.time()
+            f.write(json.dumps(record) + "\n")
+
+
+def stream_completion(
+    model: str,
+    messages: list,
+    echo: bool = True,
+    out=None,
+    on_token: Optional[Callable[[str], Any]] = None,
+    **kwargs,
+) -> StreamResult:
+    """
+    Stream a completion to `out` (stdout) and return text plus metrics.
+
+    `on_token` is called with every text delta as it arrives (once with the
+    whole text on a cache hit), e.g. `JsonStreamParser.feed`.
+    """
+    out = out or sys.stdout
+    start = time.perf_counter()
+
+    cache, key, hit = lookup(model, messages, kwargs)
+    if hit is not None:
+        text = hit["choices"][0]["message"]["content"] or ""
+        if echo:
+            out.write(text + "\n")
+            out.flush()
+        if on_token:
+            on_token(text)
+        usage = getattr(hit, "usage", None)
+        elapsed = time.perf_counter() - start
+        result = StreamResult(
+            text=text,
+            model=model,
+            ttft=elapsed,
+            total=elapsed,
+            completion_tokens=(usage.completion_tokens if usage else 0) or 0,
+            cached=True,
+        )
+        _record(result)
+        return result
+
+    kwargs.pop("cache", None)
+    response = litellm.completion(
+        model=model,
+        messages=messages,
+        stream=True,
+        stream_options={"include_usage": True},
+        **kwargs,
+    )
+
+    chunks = []
+    parts = []
+    first_token: Optional[float] = None
+    for chunk in response:
+        chunks.append(chunk)
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        if not delta:
+            continue
+        if first_token is None:
+            first_token = time.perf_counter()
+        parts.append(delta)
+        if echo:
+            out.write(delta)
+            out.flush()
+        if on_token:
+            on_token(delta)
+    end = time.perf_counter()
+    if echo:
+        out.write("\n")
+        out.flush()
+
+    text = "".join(parts)
+    assembled = litellm.stream_chunk_builder(chunks, messages=messages)
+    usage = getattr(assembled, "usage", None) if assembled is not None else None
+    completion_tokens = (usage.completion_tokens if usage else 0) or 0
+    if not completion_tokens:
+        completion_tokens = litellm.token_counter(model=model, text=text)
+
+    if key is not None and assembled is not None:
+        cache.put(key, model, to_dict(assembled))
+
+    result = StreamResult(
+        text=text,
+        model=model,
+        ttft=(first_token or end) - start,
+        total=end - start,
+        completion_tokens=completion_tokens,
+    )
+    _record(result)
+    return result
+
+
+def format_metrics(result: StreamResult) -> str:
+    source = "cache" if result.cached else result.model
+    return (
+        f"[{source}] TTFT {result.ttft * 1000:.0f} ms, total {result.total:.2f} s, "
+        f"{result.completion_tokens} tokens, {result.tokens_per_sec:.1f} tokens/sec"
+    )
+
+
+def print_metrics(results: Optional[List[StreamResult]] = None):
+    """One line per call plus a mean summary for the session."""
+    results = METRICS if results is None else results
+    if not results:
+        return
+    print("\nCompletion latency:")
+    for i, result in enumerate(results, 1):
+        print(f"  {i:2d}. {format_metrics(result)}")
+    live = [r for r in results if not r.cached]
+    if live:
+        mean_ttft = sum(r.ttft for r in live) / len(live)
+        mean_tps = sum(r.tokens_per_sec for r in live) / len(live)
+        print(f"  Mean over {len(live)} live calls: TTFT {mean_ttft * 1000:.0f} ms, "
+              f"{mean_tps:.1f} tokens/sec")
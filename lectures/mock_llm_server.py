@@ -0,0 +1,159 @@
+"""
+Local mock of an OpenAI-compatible chat completion endpoint.
+
+Lets the batch tooling be exercised and benchmarked offline: every request
+sleeps for a configurable latency (plus, optionally, a prefill time per
+1000 prompt tokens, so longer prompts answer more slowly) and returns a
+canned gene set category as JSON, streamed in small chunks when the
+request sets `stream=True`. A fraction of requests can be failed with
+429/503 to exercise retries.
+
+Run:
+
+    python mock_llm_server.py --port 8080 --latency 0.5 --error-rate 0.05
+
+and point litellm at it with `model="openai/mock"`,
+`api_base="http://127.0.0.1:8080/v1"`, `api_key="mock"`.
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CATEGORIES = [
+    "Inflammation",
+    "Cell cycle",
+    "Immune System",
+    "Cytoskeleton",
+    "Development",
+    "Metabolism",
+    "Transcription/Translation",
+    "Other",
+]
+
+
+class MockCompletionHandler(BaseHTTPRequestHandler):
+    latency = 0.2
+    jitter = 0.1
+    error_rate = 0.0
+    token_delay = 0.01
+    prefill = 0.0  # seconds per 1000 prompt tokens
+    counter = 0
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        with self.lock:
+            MockCompletionHandler.counter += 1
+
+        prompt_chars = sum(len(m.get("content") or "") for m in request.get("messages", []))
+        prefill = self.prefill * prompt_chars / 4000
+        time.sleep(max(0.0, random.gauss(self.latency, self.jitter)) + prefill)
+
+        if random.random() < self.error_rate:
+            status = random.choice([429, 503])
+            self._send_json(status, {"error": {"message": "mock overload", "type": "rate_limit"}})
+            return
+
+        content = json.dumps(
+            {"category": random.choice(CATEGORIES), "rationale": "mock response"}
+        )
+        usage = {
+            "prompt_tokens": prompt_chars // 4,
+            "completion_tokens": len(content) // 4,
+            "total_tokens": prompt_chars // 4 + len(content) // 4,
+        }
+        if request.get("stream"):
+            self._stream(request, content)
+            return
+        self._send_json(
+            200,
+            {
+                "id": f"chatcmpl-{uuid.uuid4().hex}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "mock"),
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": usage,
+            },
+        )
+
+    def _stream(self, request, content, chunk_chars=4):
+        """Server-sent events in the OpenAI `chat.completion.chunk` format."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        chunk_id = f"chatcmpl-{uuid.uuid4().hex}"
+        for i in range(0, len(content), chunk_chars):
+            chunk = {
+                "id": chunk_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request.get("model", "mock"),
+                "choices": [
+                    {
+                        "index": 0,
+                        "delta": {"content": content[i:i + chunk_chars]},
+                        "finish_reason": None,
+                    }
+                ],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            time.sleep(self.token_delay)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def serve(host="127.0.0.1", port=8080, latency=0.2, jitter=0.1, error_rate=0.0, prefill=0.0):
+    MockCompletionHandler.latency = latency
+    MockCompletionHandler.jitter = jitter
+    MockCompletionHandler.error_rate = error_rate
+    MockCompletionHandler.prefill = prefill
+    server = ThreadingHTTPServer((host, port), MockCompletionHandler)
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.2, help="mean seconds per request")
+    parser.add_argument("--jitter", type=float, default=0.1, help="latency std deviation")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of 429/503 replies")
+    parser.add_argument("--prefill", type=float, default=0.0,
+                        help="extra seconds per 1000 prompt tokens")
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port, args.latency, args.jitter, args.error_rate, args.prefill)
+    print(f"Mock completion server on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\nServed {MockCompletionHandler.counter} requests")
@@ -0,0 +1,22 @@
+from json_stream import JsonStreamParser, extract_all_json, iter_json
+
+
+def test_truncated_array_elements_are_not_repeated():
+    chunks = ["```json\n[{\"a\": 1}, ", "{\"b\": 2}, {\"c\": "]
+    assert list(iter_json(chunks, unwrap_arrays=True)) == [{"a": 1}, {"b": 2}]
+
+
+def test_close_after_truncated_array_returns_nothing():
+    parser = JsonStreamParser(unwrap_arrays=True)
+    assert parser.feed('```json\n[{"a":1}, {"b":2}, {"c": ') == [{"a": 1}, {"b": 2}]
+    assert parser.close() == []
+
+
+def test_unwrap_arrays_scalars_and_empty():
+    assert extract_all_json('[1, {"a": 2}]', unwrap_arrays=True) == [1, {"a": 2}]
+    assert extract_all_json("[]", unwrap_arrays=True) == []
+    assert extract_all_json("[]") == [[]]
+
+
+def test_unbalanced_brackets_do_not_recurse():
+    assert extract_all_json("[" * 2000 + "}") == []